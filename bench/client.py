@@ -0,0 +1,69 @@
+# This area is meant for calling the app in-process, without a server or an HTTP client library. Requests
+# go straight through the ASGI interface, middlewares included, so that measurements only leave out the
+# network and the HTTP parser.
+from typing import Any
+
+import asyncio
+import json
+
+
+class ASGIClient():
+    """
+    A minimal synchronous client for an ASGI app.
+
+    Args:
+        - app (Callable): The ASGI app.
+        - cookies (dict, optional): Cookies sent with every request.
+        - headers (dict, optional): Headers sent with every request.
+        - client (tuple, optional): The host and port the requests come from.
+
+    Methods:
+        - request: Sends a request and returns the status and body of the response.
+    """
+
+    def __init__(self, app, cookies: dict = None, headers: dict = None, client: tuple[str, int] = ('127.0.0.1', 50000)):
+        self.app = app
+        self.client = client
+        self.loop = asyncio.new_event_loop()
+
+        self.headers = [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in (headers or {}).items()]
+        if cookies:
+            self.headers.append((b'cookie', '; '.join(f'{key}={value}' for key, value in cookies.items()).encode('latin-1')))
+
+
+    async def _request(self, method: str, path: str, body: bytes, query_string: str) -> tuple[int, bytes]:
+        headers = [*self.headers, (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        scope = {
+            'type': 'http'
+            , 'asgi': {'version': '3.0'}
+            , 'http_version': '1.1'
+            , 'method': method
+            , 'scheme': 'http'
+            , 'path': path
+            , 'raw_path': path.encode()
+            , 'query_string': query_string.encode()
+            , 'root_path': ''
+            , 'headers': headers
+            , 'client': self.client
+            , 'server': ('testserver', 80)
+        }
+
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        response = {'status': None, 'body': b''}
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'] += message.get('body', b'')
+
+        await self.app(scope, receive, send)
+
+        return response['status'], response['body']
+
+
+    def request(self, method: str, path: str, payload: Any = None, query_string: str = '') -> tuple[int, bytes]:
+        body = json.dumps(payload).encode() if payload is not None else b''
+        return self.loop.run_until_complete(self._request(method, path, body, query_string))
@@ -0,0 +1,148 @@
+# This area is meant for providing the benchmarks with a database. Either an existing server is used, in
+# which case a dedicated database is (re)created on it, or a throwaway cluster is built with initdb and
+# removed once the run is over. Either way, the schema is loaded from setup.sql. Streaming replicas of the
+# server can be added to exercise the read routing of DBManager.
+from contextlib import contextmanager
+from typing import Iterator
+
+import subprocess
+import tempfile
+import psycopg2
+import shutil
+import socket
+import glob
+import os
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP_SQL = os.path.join(ROOT_DIR, 'setup.sql')
+
+
+def pg_bindir() -> str:
+    """
+    Finds the directory of PostgreSQL's server binaries: the PATH, then `pg_config --bindir`, then the
+    usual Debian location.
+    """
+    initdb = shutil.which('initdb')
+    if initdb:
+        return os.path.dirname(initdb)
+
+    pg_config = shutil.which('pg_config')
+    if pg_config:
+        bindir = subprocess.run([pg_config, '--bindir'], capture_output=True, text=True).stdout.strip()
+        if os.path.isfile(os.path.join(bindir, 'initdb')):
+            return bindir
+
+    candidates = sorted(glob.glob('/usr/lib/postgresql/*/bin/initdb'))
+    if candidates:
+        return os.path.dirname(candidates[-1])
+
+    raise RuntimeError("PostgreSQL's server binaries (initdb, pg_ctl) could not be found. Install them or point the benchmarks to an existing server with --host.")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def throwaway_cluster(port: int = None) -> Iterator[dict]:
+    """
+    Builds and starts a temporary cluster that trusts local connections. The cluster is stopped and its
+    directory removed on exit.
+
+    Args:
+        - port (int, optional): The port to listen on. Defaults to a free port.
+
+    Returns:
+        - Iterator[dict]: The connection parameters of the cluster's maintenance database.
+    """
+    bindir = pg_bindir()
+    directory = tempfile.mkdtemp(prefix='lmind_bench_')
+    data = os.path.join(directory, 'data')
+    port = port or free_port()
+
+    try:
+        subprocess.run([os.path.join(bindir, 'initdb'), '-D', data, '-U', 'postgres', '--auth=trust', '--encoding=UTF8']
+                       , check=True, capture_output=True)
+        subprocess.run([os.path.join(bindir, 'pg_ctl'), '-D', data, '-l', os.path.join(directory, 'postgres.log'), '-w'
+                        , '-o', f'-p {port} -k {directory} -c listen_addresses=127.0.0.1', 'start']
+                       , check=True, capture_output=True)
+
+        yield {'user': 'postgres', 'password': 'postgres', 'host': '127.0.0.1', 'port': str(port), 'database': 'postgres'}
+
+    finally:
+        if os.path.isfile(os.path.join(data, 'postmaster.pid')):
+            subprocess.run([os.path.join(bindir, 'pg_ctl'), '-D', data, '-m', 'fast', '-w', 'stop'], capture_output=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def throwaway_replica(primary: dict, port: int = None) -> Iterator[dict]:
+    """
+    Builds and starts a streaming replica of a server with pg_basebackup. The server must accept replication
+    connections from the user, which throwaway clusters do. The replica is stopped and removed on exit.
+
+    Args:
+        - primary (dict): The connection parameters of the server to be replicated.
+        - port (int, optional): The port to listen on. Defaults to a free port.
+
+    Returns:
+        - Iterator[dict]: The connection parameters of the replica's maintenance database.
+    """
+    bindir = pg_bindir()
+    directory = tempfile.mkdtemp(prefix='lmind_bench_replica_')
+    data = os.path.join(directory, 'data')
+    port = port or free_port()
+
+    try:
+        subprocess.run([os.path.join(bindir, 'pg_basebackup'), '-h', primary['host'], '-p', str(primary['port']), '-U', primary['user']
+                        , '-D', data, '-R', '-X', 'stream', '-c', 'fast']
+                       , check=True, capture_output=True, env={**os.environ, 'PGPASSWORD': primary['password']})
+        subprocess.run([os.path.join(bindir, 'pg_ctl'), '-D', data, '-l', os.path.join(directory, 'postgres.log'), '-w'
+                        , '-o', f'-p {port} -k {directory} -c listen_addresses=127.0.0.1', 'start']
+                       , check=True, capture_output=True)
+
+        yield {**primary, 'host': '127.0.0.1', 'port': str(port), 'database': 'postgres'}
+
+    finally:
+        if os.path.isfile(os.path.join(data, 'postmaster.pid')):
+            subprocess.run([os.path.join(bindir, 'pg_ctl'), '-D', data, '-m', 'fast', '-w', 'stop'], capture_output=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def create_database(server: dict, database: str) -> dict:
+    """
+    Drops and creates a database on the server, then loads setup.sql into it.
+
+    Args:
+        - server (dict): The connection parameters of a maintenance database.
+        - database (str): The name of the database to be created. Any existing database by that name is dropped.
+
+    Returns:
+        - dict: The connection parameters of the new database.
+    """
+    connection = psycopg2.connect(**server)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS "{database}"')
+        cursor.execute(f'CREATE DATABASE "{database}"')
+    connection.close()
+
+    params = {**server, 'database': database}
+
+    with open(SETUP_SQL) as file, psycopg2.connect(**params) as connection, connection.cursor() as cursor:
+        cursor.execute(file.read())
+    connection.close()
+
+    return params
+
+
+def server_version(params: dict) -> str:
+    with psycopg2.connect(**params) as connection, connection.cursor() as cursor:
+        cursor.execute('SHOW server_version')
+        version = cursor.fetchone()[0]
+    connection.close()
+
+    return version
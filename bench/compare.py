@@ -0,0 +1,64 @@
+# This area is meant for comparing two benchmark reports, usually of a base commit and of a change.
+#
+# Usage:
+#   python -m bench.compare bench-base.json bench-head.json --metric p95_ms --threshold 10
+#
+# Exits with status 1 when any benchmark got slower than the threshold allows.
+import argparse
+import json
+import sys
+
+
+LATENCY_METRICS = ['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms']
+
+
+def compare(base: dict, head: dict, metric: str = 'p95_ms', threshold: float = 10.0) -> list[dict]:
+    """
+    Compares the benchmarks present in both reports.
+
+    Args:
+        - base (dict): The reference report.
+        - head (dict): The report being evaluated.
+        - metric (str, optional): The latency metric to compare.
+        - threshold (float, optional): The increase, in percent, above which a benchmark counts as a regression.
+
+    Returns:
+        - list[dict]: One entry per benchmark, with both values, the change in percent and whether it regressed.
+    """
+    rows = []
+    for name in sorted(set(base['results']) & set(head['results'])):
+        before, after = base['results'][name][metric], head['results'][name][metric]
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append({'name': name, 'base': before, 'head': after, 'change': round(change, 2), 'regression': change > threshold})
+
+    return rows
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compares two benchmark reports.')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--metric', default='p95_ms', choices=LATENCY_METRICS)
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed increase, in percent.')
+    args = parser.parse_args(argv)
+
+    with open(args.base) as base_file, open(args.head) as head_file:
+        base, head = json.load(base_file), json.load(head_file)
+
+    for report in [base, head]:
+        if report['scale'] != base['scale'] or report['iterations'] != base['iterations']:
+            print("Warning: the reports were taken with different scales or iterations.", file=sys.stderr)
+            break
+
+    rows = compare(base, head, args.metric, args.threshold)
+
+    print(f"{args.metric}: {base['commit'][:8]} -> {head['commit'][:8]}{' (dirty)' if head.get('dirty') else ''}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<40} {row['base']:>10.2f} {row['head']:>10.2f} {row['change']:>+8.1f}%{flag}")
+
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
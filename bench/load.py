@@ -0,0 +1,231 @@
+# This area is meant for load testing. Virtual users replay a weighted mix of reads and writes, each one with
+# its own user, session and JWT cookie, against the app in-process or served by a local uvicorn. Unlike the
+# benchmarks in bench.run, requests overlap, which exposes how the shared DBManager session, the connection
+# pool and the thread pool behave under concurrency.
+#
+# Usage:
+#   python -m bench.load --concurrency 16 --duration 30
+#   python -m bench.load --serve --workers 2 --mix crud_select=60,upsert_routes=40
+#   python -m bench.load --oauth-stub --mix login=20,crud_select=80      # logins against bench.oauth_stub
+from contextlib import ExitStack
+from collections import defaultdict
+from typing import Callable
+
+from bench.run import add_database_arguments, prepare, summarize, git_commit
+from bench.cluster import free_port, server_version
+
+import subprocess
+import datetime
+import argparse
+import asyncio
+import random
+import httpx
+import json
+import time
+import sys
+import os
+
+
+DEFAULT_MIX = 'crud_select=40,users_me=15,auth_validate=25,upsert_tasks=12,upsert_routes=8'
+SERVER_STARTUP_TIMEOUT = 30
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """
+    Parses a traffic mix in the form `name=weight,name=weight`.
+    """
+    weights = {}
+    for entry in mix.split(','):
+        name, _, weight = entry.partition('=')
+        weights[name.strip()] = float(weight or 1)
+
+    return weights
+
+
+def build_traffic(counts: dict[str, int], rng: random.Random, google_ids: list[str]) -> dict[str, Callable[[], tuple[str, str, dict]]]:
+    """
+    Builds the request factories of the mix. Each factory returns the method, path and payload of a request.
+    Logins only succeed when the app is pointed to `bench.oauth_stub`.
+    """
+    from bench.seed import route_graph, random_name, WORDS
+
+    skill_ids = list(range(1, counts['tprod_skills'] + 1))
+    task_ids = list(range(1, counts['tprod_tasks'] + 1))
+    tag_ids = list(range(1, counts['tprod_producttags'] + 1))
+
+    def crud_select():
+        if rng.random() < 0.5:
+            return 'POST', '/crud/select', {'table_name': 'tprod_skills'}
+        return 'POST', '/crud/select', {'table_name': 'tsys_keywords', 'filters': {'and_': {'id_object': rng.sample(task_ids, 10), 'reference': ['tprod_tasks']}}}
+
+    def upsert_tasks():
+        task = {'name': random_name(rng), 'description': random_name(rng, 4), 'duration': rng.randint(1, 120), 'id_unit': 1, 'interruptible': False}
+        if rng.random() < 0.5: # reason: half of the writes update existing tasks
+            task['id'] = rng.choice(task_ids)
+        return 'POST', '/tprod/tasks/upsert', {'task': task, 'id_skill_list': rng.sample(skill_ids, 2), 'keyword_list': rng.sample(WORDS, 3)}
+
+    return {
+        'crud_select': crud_select
+        , 'users_me': lambda: ('GET', '/tsys/users/me', None)
+        , 'auth_validate': lambda: ('GET', '/auth/validate', None)
+        , 'upsert_tasks': upsert_tasks
+        , 'upsert_routes': lambda: ('POST', '/tprod/routes/upsert', route_graph(rng, rng.choice(tag_ids), task_ids))
+        , 'login': lambda: ('GET', f'/auth/callback?code={rng.choice(google_ids)}', None)
+    }
+
+
+async def virtual_user(client: httpx.AsyncClient, cookie: str, traffic: dict, weights: dict[str, float], rng: random.Random
+                       , deadline: float, samples: dict[str, list]):
+    """
+    Sends requests back to back until the deadline, recording the latency and outcome of each one.
+    """
+    from bench.seed import BENCH_USER_AGENT
+
+    headers = {'Cookie': f'jwt_s={cookie}', 'User-Agent': BENCH_USER_AGENT}
+    names, values = list(weights), list(weights.values())
+
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights=values)[0]
+        method, path, payload = traffic[name]()
+
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=payload, headers=headers)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+
+        samples[name].append((time.perf_counter() - start, ok))
+
+
+async def run_load(client: httpx.AsyncClient, cookies: list[str], traffic: dict, weights: dict[str, float], duration: float, seed: int) -> dict[str, list]:
+    samples = defaultdict(list)
+    deadline = time.perf_counter() + duration
+
+    await asyncio.gather(*[
+        virtual_user(client, cookie, traffic, weights, random.Random(seed + i), deadline, samples)
+        for i, cookie in enumerate(cookies)
+    ])
+
+    return samples
+
+
+def start_server(workers: int, log_path: str, app: str = 'src.main:app') -> tuple[subprocess.Popen, str]:
+    """
+    Serves an app with uvicorn on a free port, with the environment set by `prepare`, and waits until it responds.
+    """
+    port = free_port()
+    log = open(log_path, 'w')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app, '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+        , stdout=log, stderr=subprocess.STDOUT, env=os.environ.copy()
+    )
+    url = f'http://127.0.0.1:{port}'
+
+    deadline = time.time() + SERVER_STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited during startup, see {log_path}.")
+        try:
+            if httpx.get(f'{url}/health').status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError(f"The server did not respond within {SERVER_STARTUP_TIMEOUT}s, see {log_path}.")
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Replays a mix of traffic against the app and reports latency, throughput and errors per endpoint.')
+    add_database_arguments(parser)
+    parser.add_argument('--concurrency', type=int, default=8, help='The amount of virtual users, each with its own session.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weights of the endpoints. Defaults to {DEFAULT_MIX}.')
+    parser.add_argument('--serve', action='store_true', help='Serves the app with uvicorn instead of calling it in-process.')
+    parser.add_argument('--workers', type=int, default=1, help='Uvicorn workers, with --serve.')
+    parser.add_argument('--oauth-stub', action='store_true', help='Points the OAuth endpoints to bench.oauth_stub, which enables the login endpoint.')
+    parser.add_argument('--output', help='Where to write the report. Defaults to load-<commit>.json.')
+    args = parser.parse_args(argv)
+
+    weights = parse_mix(args.mix)
+    if 'login' in weights and not args.oauth_stub:
+        parser.error('The login endpoint requires --oauth-stub.')
+
+    with ExitStack() as stack:
+        if args.oauth_stub: # reason: must be set before src.oauth is imported
+            stub, stub_url = start_server(1, os.path.join(os.getcwd(), 'load-oauth-stub.log'), app='bench.oauth_stub:app')
+            stack.callback(stub.wait)
+            stack.callback(stub.terminate)
+            os.environ.update({'GOOGLE_TOKEN_URL': f'{stub_url}/token', 'GOOGLE_USERINFO_URL': f'{stub_url}/userinfo'})
+
+        params, counts, google_ids = prepare(args, stack, users=args.concurrency)
+
+        from src.start import db
+        from bench.seed import create_session
+
+        traffic = build_traffic(counts, random.Random(args.seed), google_ids)
+        unknown = [name for name in weights if name not in traffic]
+        if unknown:
+            parser.error(f"Unknown endpoints in --mix: {unknown}. Use any of: {', '.join(traffic)}.")
+
+        cookies = [create_session(db, google_id) for google_id in google_ids]
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+        if args.serve:
+            server, url = start_server(args.workers, os.path.join(os.getcwd(), 'load-server.log'))
+            stack.callback(server.wait)
+            stack.callback(server.terminate)
+            client = httpx.AsyncClient(base_url=url, limits=limits, timeout=60)
+        else:
+            from src.main import app
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False, client=('127.0.0.1', 50000)), base_url='http://bench', timeout=60)
+
+        async def load():
+            async with client:
+                return await run_load(client, cookies, traffic, weights, args.duration, args.seed)
+
+        start = time.perf_counter()
+        samples = asyncio.run(load())
+        elapsed = time.perf_counter() - start
+
+        results = {}
+        for name, entries in sorted(samples.items()):
+            if len(entries) < 2:
+                continue
+
+            errors = sum(not ok for _, ok in entries)
+            results[name] = {**summarize([timing for timing, _ in entries], elapsed, errors), 'error_rate': round(errors / len(entries), 4)}
+            print(f"{name:<16} {len(entries):>7} reqs   p50 {results[name]['p50_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms   "
+                  f"p99 {results[name]['p99_ms']:>9.2f} ms   {results[name]['throughput_ops']:>8.1f} req/s   {results[name]['error_rate']:>7.2%} errors", file=sys.stderr)
+
+        commit, dirty = git_commit()
+        report = {
+            'commit': commit
+            , 'dirty': dirty
+            , 'created_at': datetime.datetime.utcnow().isoformat()
+            , 'python': sys.version.split()[0]
+            , 'postgres': server_version(params)
+            , 'scale': args.scale
+            , 'concurrency': args.concurrency
+            , 'duration': round(elapsed, 2)
+            , 'mode': f'uvicorn ({args.workers} workers)' if args.serve else 'in-process'
+            , 'mix': weights
+            , 'seed': args.seed
+            , 'rows': counts
+            , 'total': {'requests': sum(len(entries) for entries in samples.values()), 'throughput': round(sum(len(entries) for entries in samples.values()) / elapsed, 2)}
+            , 'replicas': args.replicas
+            , 'pool': None if args.serve else db.pool_stats()
+            , 'results': results
+        }
+
+    output = args.output or f'load-{commit[:8]}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {output}.", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
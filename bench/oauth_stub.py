@@ -0,0 +1,64 @@
+# This area is meant for standing in for Google's OAuth endpoints, so that logins can be tested and load
+# tested without reaching the internet. Any authorization code is accepted and becomes the Google ID of the
+# user, whose email matches the roles created by `bench.seed.seed_users`; the code `invalid` is refused.
+#
+# Usage:
+#   python -m bench.oauth_stub --port 9000 --latency 50
+#   GOOGLE_TOKEN_URL=http://127.0.0.1:9000/token GOOGLE_USERINFO_URL=http://127.0.0.1:9000/userinfo uvicorn src.main:app
+from fastapi import FastAPI, Form, Header
+from fastapi.responses import JSONResponse
+
+import argparse
+import asyncio
+import uvicorn
+import os
+
+
+STUB_LATENCY = float(os.getenv('OAUTH_STUB_LATENCY_MS', 0)) / 1000
+FIRST_GOOGLE_ID = 100000000000 # reason: the Google ID of the first user created by bench.seed.seed_users
+
+app = FastAPI()
+
+
+@app.get('/health')
+async def health():
+    return JSONResponse(status_code=200, content={'message': 'healthy.'})
+
+
+@app.post('/token')
+async def token(code: str = Form(...), grant_type: str = Form(...)):
+    await asyncio.sleep(STUB_LATENCY)
+
+    if code == 'invalid' or grant_type != 'authorization_code':
+        return JSONResponse(status_code=400, content={'error': 'invalid_grant'})
+
+    return JSONResponse(status_code=200, content={'access_token': f'stub-{code}', 'token_type': 'Bearer', 'expires_in': 3600})
+
+
+@app.get('/userinfo')
+async def userinfo(authorization: str = Header(None)):
+    await asyncio.sleep(STUB_LATENCY)
+
+    if not authorization or not authorization.startswith('Bearer stub-'):
+        return JSONResponse(status_code=401, content={'error': 'invalid_token'})
+
+    google_id = authorization.removeprefix('Bearer stub-')
+    number = int(google_id) - FIRST_GOOGLE_ID if google_id.isdigit() else 0
+
+    return JSONResponse(status_code=200, content={
+        'id': google_id
+        , 'email': f'bench{number}@lmind.dev'
+        , 'picture': 'https://lmind.dev/picture.png'
+        , 'name': 'bench user'
+        , 'locale': 'en'
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves a stub of the OAuth token and user info endpoints.')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0, help='Milliseconds added to every response.')
+    args = parser.parse_args()
+
+    STUB_LATENCY = args.latency / 1000
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
@@ -0,0 +1,40 @@
+# This area is meant for checking the query plans of the API against a seeded database, so that a missing
+# index shows up as a failure before it shows up as a slow endpoint. The database is prepared like in
+# bench.run: created from setup.sql, migrated and seeded at the given scale. Exits with 1 if any statement
+# of `src.plans.plan_statements` needs a sequential scan.
+#
+# Usage:
+#   python -m bench.plans --scale 5                                 # throwaway cluster, requires initdb & pg_ctl
+#   python -m bench.plans --host localhost --port 5432 --min-rows 500
+from contextlib import ExitStack
+
+from bench.run import add_database_arguments, prepare
+
+import argparse
+import sys
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Fails if a statement of the API needs a sequential scan on a seeded database.')
+    add_database_arguments(parser)
+    parser.add_argument('--min-rows', type=int, help='Tables estimated to hold fewer rows may be scanned. Defaults to PLAN_MIN_ROWS.')
+    args = parser.parse_args(argv)
+
+    with ExitStack() as stack:
+        _, counts, _ = prepare(args, stack)
+
+        from src.start import db
+        from src.plans import verify_plans, PLAN_MIN_ROWS
+
+        violations = verify_plans(db, args.min_rows or PLAN_MIN_ROWS)
+
+    for violation in violations:
+        print(f"{violation.statement:<40} {violation.relation:<25} {violation.reason}", file=sys.stderr)
+
+    print(f"{len(violations)} sequential scans found with {sum(counts.values())} seeded rows.", file=sys.stderr)
+
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+# This area is meant for measuring the performance of DBManager and of the route handlers against a real
+# PostgreSQL. A database is created from setup.sql and migrations/, seeded with synthetic data and every
+# benchmark is timed for a fixed amount of iterations. Results are written as JSON, tagged with the commit
+# they were taken on, and can be compared with `python -m bench.compare`.
+#
+# Usage:
+#   python -m bench.run --scale 2 --iterations 300                 # throwaway cluster, requires initdb & pg_ctl
+#   python -m bench.run --host localhost --port 5432 --user postgres --password postgres
+#   python -m bench.run --replicas 2 --replica-policy least_connections   # reads routed to streaming replicas
+#
+# Write benchmarks on DBManager are rolled back after every iteration, so the dataset does not drift.
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import serialization
+from contextlib import ExitStack
+from typing import Callable
+
+from bench.cluster import throwaway_cluster, throwaway_replica, create_database, server_version
+
+import subprocess
+import statistics
+import datetime
+import tempfile
+import argparse
+import logging
+import random
+import json
+import time
+import sys
+import os
+import re
+
+
+DB_WRITE_BATCH = 100
+
+
+def summarize(timings: list[float], total: float, errors: int) -> dict:
+    """
+    Summarizes the timings of a benchmark: latency percentiles in milliseconds and throughput in operations per second.
+    """
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'iterations': len(timings)
+        , 'errors': errors
+        , 'throughput_ops': round(len(timings) / total, 2)
+        , 'mean_ms': round(statistics.fmean(timings) * 1000, 3)
+        , 'min_ms': round(min(timings) * 1000, 3)
+        , 'p50_ms': round(cuts[49] * 1000, 3)
+        , 'p95_ms': round(cuts[94] * 1000, 3)
+        , 'p99_ms': round(cuts[98] * 1000, 3)
+        , 'max_ms': round(max(timings) * 1000, 3)
+    }
+
+
+def measure(fn: Callable, iterations: int, warmup: int, setup: Callable = None) -> dict:
+    """
+    Times `fn` for `iterations` runs, after `warmup` untimed runs. Arguments are built by `setup`, outside of
+    the timer. Runs in which `fn` returns `False` are counted as errors.
+    """
+    timings, errors = [], 0
+    for i in range(warmup + iterations):
+        args = setup() if setup else ()
+
+        start = time.perf_counter()
+        ok = fn(*args)
+        elapsed = time.perf_counter() - start
+
+        if i >= warmup:
+            timings.append(elapsed)
+            errors += ok is False
+
+    return summarize(timings, sum(timings), errors)
+
+
+def write_jwt_keys(directory: str):
+    """
+    Writes a JWT key pair in the layout `src.security` expects.
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    with open(os.path.join(directory, 'jwt_private_key.pem'), 'wb') as file:
+        file.write(private_key.private_bytes(encoding=serialization.Encoding.PEM
+                                             , format=serialization.PrivateFormat.PKCS8
+                                             , encryption_algorithm=serialization.NoEncryption()))
+
+    with open(os.path.join(directory, 'jwt_public_key.pem'), 'wb') as file:
+        file.write(private_key.public_key().public_bytes(encoding=serialization.Encoding.DER
+                                                         , format=serialization.PublicFormat.SubjectPublicKeyInfo))
+
+
+def git_commit() -> tuple[str, bool]:
+    """
+    Returns the current commit and whether the working tree has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+    return commit, dirty
+
+
+def configure_environment(params: dict, vault: str, replicas: list[dict] = None, replica_policy: str = 'round_robin'):
+    """
+    Points `src.start` to the benchmark database and its replicas. Must run before anything from `src.start` is imported.
+    """
+    os.environ.update({
+        'DB_TYPE': 'postgresql'
+        , 'DB_USER': params['user']
+        , 'DB_PASSWORD': params['password']
+        , 'DB_HOST': params['host']
+        , 'DB_PORT': str(params['port'])
+        , 'DB_DATABASE': params['database']
+        , 'DB_NAME': 'public'
+        , 'DB_SLOW_QUERY_MS': '' # reason: slow query logs would be measured as well
+        , 'DB_REPEAT_THRESHOLD': ''
+        , 'VAULT_DIR': vault
+        , 'DB_REPLICA_HOSTS': ','.join(f"{replica['host']}:{replica['port']}" for replica in replicas or [])
+        , 'DB_REPLICA_POLICY': replica_policy
+    })
+
+
+def build_benchmarks(counts: dict, id_user: str, cookie: str, rng: random.Random) -> dict[str, tuple[Callable, Callable]]:
+    """
+    Builds the benchmarks, as pairs of a timed function and the setup of its arguments.
+    """
+    from starlette.requests import Request
+    from fastapi import Response
+
+    from src.start import db
+    from src.main import app
+    from src.auth import validate_session
+    from src.queries import QUERY_MAP
+    from src.schemas import WhereConditions
+    from src.models import TProdSkills, TSysKeywords
+
+    from bench.client import ASGIClient
+    from bench.seed import route_graph, random_name, BENCH_USER_AGENT, BENCH_CLIENT_IP
+
+    skill_ids = list(range(1, counts['tprod_skills'] + 1))
+    task_ids = list(range(1, counts['tprod_tasks'] + 1))
+    tag_ids = list(range(1, counts['tprod_producttags'] + 1))
+
+    client = ASGIClient(app, cookies={'jwt_s': cookie}, headers={'User-Agent': BENCH_USER_AGENT}, client=(BENCH_CLIENT_IP, 50000))
+
+    def rolled_back(fn: Callable) -> Callable:
+        def wrapper(*args):
+            try:
+                fn(*args)
+            finally:
+                db.session.rollback()
+        return wrapper
+
+    def new_skills():
+        now = datetime.datetime.utcnow()
+        return ([
+            {'name': random_name(rng), 'description': random_name(rng, 4), 'created_by': id_user, 'created_at': now, 'updated_by': id_user, 'updated_at': now}
+            for _ in range(DB_WRITE_BATCH)
+        ],)
+
+    def existing_skills():
+        return ([{**skill, 'id': id_skill} for skill, id_skill in zip(new_skills()[0], rng.sample(skill_ids, DB_WRITE_BATCH))],)
+
+    def session_request():
+        scope = {'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'', 'client': (BENCH_CLIENT_IP, 50000)
+                 , 'headers': [(b'user-agent', BENCH_USER_AGENT.encode())]}
+        return Response(), Request(scope), cookie
+
+    def route(method: str, path: str) -> Callable:
+        def fn(payload):
+            status, _ = client.request(method, path, payload)
+            return status < 400
+        return fn
+
+    benchmarks = {
+        'db.query.filters': (
+            lambda filters: db.query(TProdSkills, filters=filters)
+            , lambda: (WhereConditions(and_={'id': rng.sample(skill_ids, 10)}),)
+        )
+        , 'db.query.like': (
+            lambda filters: db.query(TProdSkills, filters=filters)
+            , lambda: (WhereConditions(like_={'name': [f'%{rng.choice(random_name(rng).split())}%']}),)
+        )
+        , 'db.insert': (rolled_back(lambda data: db.insert(TProdSkills, data)), new_skills)
+        , 'db.update': (rolled_back(lambda data: db.update(TProdSkills, data)), lambda: ([existing_skills()[0][0]],))
+        , 'db.upsert': (rolled_back(lambda data: db.upsert(TProdSkills, data)), existing_skills)
+        , 'db.delete': (
+            rolled_back(lambda filters: db.delete(TSysKeywords, filters))
+            , lambda: (WhereConditions(and_={'id_object': [rng.choice(task_ids)], 'reference': ['tprod_tasks']}),)
+        )
+        , 'auth.validate_session': (validate_session, session_request)
+        , 'route.crud_select.tsys_keywords': (
+            route('POST', '/crud/select')
+            , lambda: ({'table_name': 'tsys_keywords', 'filters': {'and_': {'id_object': rng.sample(task_ids, 10), 'reference': ['tprod_tasks']}}},)
+        )
+        , 'route.upsert_routes': (route('POST', '/tprod/routes/upsert'), lambda: (route_graph(rng, rng.choice(tag_ids), task_ids),))
+    }
+
+    for name, query in QUERY_MAP.items():
+        statement = query.statement() if callable(query.statement) else query.statement
+        benchmarks[f'db.query.{name}'] = (lambda statement=statement: db.query(None, statement=statement), None)
+        benchmarks[f'route.crud_select.{name}'] = (route('POST', '/crud/select'), lambda name=name: ({'table_name': name},))
+
+    return benchmarks
+
+
+def add_database_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--host', help='An existing server. A throwaway cluster is created when omitted.')
+    parser.add_argument('--port', type=int, help='The port of the existing server, or of the throwaway cluster.')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='postgres')
+    parser.add_argument('--database', default='lmind_bench', help='Dropped and recreated on every run.')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplies the amount of seeded rows.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--replicas', type=int, default=0, help='Streaming replicas to be built with pg_basebackup, for reads to be routed to.')
+    parser.add_argument('--replica-policy', default='round_robin', choices=['round_robin', 'least_connections'])
+
+
+def prepare(args: argparse.Namespace, stack: ExitStack, users: int = 1) -> tuple[dict, dict[str, int], list[str]]:
+    """
+    Provides a migrated and seeded database and points `src.start` to it. Everything is torn down when `stack` closes.
+
+    Args:
+        - args (argparse.Namespace): The arguments added by `add_database_arguments`.
+        - stack (ExitStack): Holds the cluster, its replicas, the key directory and the engine.
+        - users (int, optional): The amount of users to be created.
+
+    Returns:
+        - tuple[dict, dict, list]: The connection parameters, the amount of rows per table and the Google IDs of the users.
+    """
+    if args.host:
+        server = {'user': args.user, 'password': args.password, 'host': args.host, 'port': str(args.port or 5432), 'database': 'postgres'}
+    else:
+        server = stack.enter_context(throwaway_cluster(args.port))
+
+    params = create_database(server, args.database)
+    replicas = [stack.enter_context(throwaway_replica(server)) for _ in range(args.replicas)]
+
+    vault = stack.enter_context(tempfile.TemporaryDirectory(prefix='lmind_vault_'))
+    write_jwt_keys(vault)
+    configure_environment(params, vault, replicas, args.replica_policy)
+
+    from src.start import db, logger
+    from src.migrations import MigrationRunner
+    from bench.seed import seed, seed_users
+
+    logger.setLevel(logging.WARNING)
+    stack.callback(db.dispose)
+
+    MigrationRunner(db.engine, logger).upgrade()
+
+    google_ids = seed_users(db, users)
+    counts = seed(db, args.scale, google_ids[0], args.seed)
+
+    return params, counts, google_ids
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks DBManager and the route handlers against a local PostgreSQL.')
+    add_database_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--only', help='Only runs the benchmarks whose names match this regex.')
+    parser.add_argument('--output', help='Where to write the report. Defaults to bench-<commit>.json.')
+    args = parser.parse_args(argv)
+
+    if args.iterations < 2:
+        parser.error('--iterations must be at least 2.')
+
+    with ExitStack() as stack:
+        params, counts, (id_user,) = prepare(args, stack)
+
+        from src.start import db
+        from bench.seed import create_session
+
+        cookie = create_session(db, id_user)
+
+        benchmarks = build_benchmarks(counts, id_user, cookie, random.Random(args.seed))
+        pattern = re.compile(args.only) if args.only else None
+
+        results = {}
+        for name, (fn, setup) in benchmarks.items():
+            if pattern and not pattern.search(name):
+                continue
+
+            results[name] = measure(fn, args.iterations, args.warmup, setup)
+            print(f"{name:<40} p50 {results[name]['p50_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms   "
+                  f"p99 {results[name]['p99_ms']:>9.2f} ms   {results[name]['throughput_ops']:>9.1f} ops/s", file=sys.stderr)
+
+        commit, dirty = git_commit()
+        report = {
+            'commit': commit
+            , 'dirty': dirty
+            , 'created_at': datetime.datetime.utcnow().isoformat()
+            , 'python': sys.version.split()[0]
+            , 'postgres': server_version(params)
+            , 'scale': args.scale
+            , 'iterations': args.iterations
+            , 'warmup': args.warmup
+            , 'seed': args.seed
+            , 'rows': counts
+            , 'replicas': args.replicas
+            , 'results': results
+        }
+
+    output = args.output or f'bench-{commit[:8]}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {output}.", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
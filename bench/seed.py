@@ -0,0 +1,210 @@
+# This area is meant for filling the benchmark database with synthetic data. Amounts grow linearly with the
+# scale, and the same seed always yields the same rows, so that runs of different commits are comparable.
+from src.models import TSysRoles, TSysUsers, TSysSessions, TSysUnits, TSysKeywords, TSysNodes, TSysEdges\
+    , TProdSkills, TProdResources, TProdTasks, TProdResourceSkills, TProdTaskSkills, TProdProductTags, TProdRoutes, TProdProducts
+from src.security import generate_session_token, hash_plaintext, generate_jwt, session_payload
+from src.schemas import WhereConditions
+from src.views import MATERIALIZED_VIEWS
+
+from sqlalchemy import text
+
+import pandas as pd
+import datetime
+import random
+import base64
+import uuid
+import json
+
+
+ROWS_PER_SCALE = {
+    'tprod_skills': 500
+    , 'tprod_resources': 200
+    , 'tprod_tasks': 1000
+    , 'tprod_producttags': 100
+    , 'tprod_products': 500
+}
+SKILLS_PER_RESOURCE = 3
+SKILLS_PER_TASK = 2
+KEYWORDS_PER_OBJECT = 3
+ROUTE_NODES = 10
+
+BENCH_USER_AGENT = 'lmind-bench'
+BENCH_CLIENT_IP = '127.0.0.1'
+
+WORDS = [
+    'assembly', 'bending', 'cutting', 'drilling', 'finishing', 'grinding', 'inspection', 'lathe', 'milling', 'packing'
+    , 'painting', 'polishing', 'pressing', 'riveting', 'sanding', 'sawing', 'sewing', 'soldering', 'stamping', 'welding'
+]
+UNITS = [
+    {'id': 1, 'name': 'minute', 'abbreviation': 'min', 'type': 'time', 'created_by': 'system'}
+    , {'id': 2, 'name': 'hour', 'abbreviation': 'h', 'type': 'time', 'created_by': 'system'}
+    , {'id': 3, 'name': 'kilogram', 'abbreviation': 'kg', 'type': 'mass', 'created_by': 'system'}
+    , {'id': 4, 'name': 'liter', 'abbreviation': 'l', 'type': 'volume', 'created_by': 'system'}
+]
+
+
+def random_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def random_name(rng: random.Random, length: int = 2) -> str:
+    return ' '.join(rng.sample(WORDS, length))
+
+
+def route_graph(rng: random.Random, id_tag: int, task_ids: list[int], size: int = ROUTE_NODES) -> dict:
+    """
+    Builds a route graph shaped like the payload of `/tprod/routes/upsert`: a binary tree of `size` nodes, each
+    one assigned to a distinct task.
+
+    Returns:
+        - dict: The tag, nodes, edges and routes of the graph.
+    """
+    uuids = [random_uuid(rng) for _ in range(size)]
+    tasks = rng.sample(task_ids, size)
+
+    nodes = [
+        {
+            'type': 'default'
+            , 'uuid': node_uuid
+            , 'layer': (i + 1).bit_length()
+            , 'position': {'x': 200 * i, 'y': 100 * (i + 1).bit_length()}
+            , 'ancestors': [uuids[(i - 1) // 2]] if i else []
+        }
+        for i, node_uuid in enumerate(uuids)
+    ]
+    edges = [{'source_uuid': uuids[(i - 1) // 2], 'target_uuid': uuids[i], 'type': 'default'} for i in range(1, size)]
+    routes = [{'id_tag': id_tag, 'id_task': id_task, 'node_uuid': node_uuid} for id_task, node_uuid in zip(tasks, uuids)]
+
+    return {
+        'tag': {'id': id_tag, 'category': 'BEN', 'registry_counter': id_tag, 'produced_counter': 0, 'subcategory': 'SUB'}
+        , 'nodes': nodes
+        , 'edges': edges
+        , 'routes_data': routes
+    }
+
+
+def seed_users(db, amount: int) -> list[str]:
+    """
+    Creates `amount` roles and their users. Returns the Google IDs of the users.
+    """
+    now = datetime.datetime.utcnow()
+    roles = [{'id': i, 'email': f'bench{i}@lmind.dev', 'role': 'admin', 'level': 1} for i in range(1, amount + 1)]
+    users = [
+        {
+            'id_role': role['id']
+            , 'google_id': f'{100000000000 + role["id"]}'
+            , 'google_email': role['email']
+            , 'google_picture_url': 'https://lmind.dev/picture.png'
+            , 'google_access_token': generate_session_token()
+            , 'name': 'bench user'
+            , 'locale': 'en'
+            , 'created_at': now
+            , 'updated_at': now
+        }
+        for role in roles
+    ]
+
+    db.insert(TSysRoles, roles)
+    db.insert(TSysUsers, users)
+    db.session.commit()
+
+    return [user['google_id'] for user in users]
+
+
+def create_session(db, google_id: str, user_agent: str = BENCH_USER_AGENT, client_ip: str = BENCH_CLIENT_IP) -> str:
+    """
+    Creates a session the way `/auth/callback` does and returns the matching `jwt_s` cookie.
+    """
+    hashed_user_agent = base64.b64encode(hash_plaintext(json.dumps(user_agent))).decode('utf-8')
+    session_token = generate_session_token()
+
+    user = db.query(TSysUsers, filters=WhereConditions(and_={'google_id': [google_id]}), single=True)
+    db.upsert(TSysSessions, [{
+        'google_id': google_id
+        , 'id_role': user.id_role
+        , 'token': session_token
+        , 'user_agent': hashed_user_agent
+        , 'client_ip': client_ip
+    }])
+    db.session.commit()
+
+    return generate_jwt(session_payload(google_id, session_token, hashed_user_agent, client_ip))
+
+
+def seed(db, scale: int, id_user: str, seed: int = 0) -> dict[str, int]:
+    """
+    Loads the synthetic dataset through `DBManager.copy` and moves the sequences past the generated IDs.
+
+    Args:
+        - db (DBManager): The manager connected to the benchmark database.
+        - scale (int): Multiplies the amount of rows of every table.
+        - id_user (str): The Google ID stamped on the rows.
+        - seed (int, optional): The seed of the random generator.
+
+    Returns:
+        - dict[str, int]: The amount of rows per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    stamps = {'created_by': id_user, 'created_at': now, 'updated_by': id_user, 'updated_at': now}
+    amounts = {table: rows * scale for table, rows in ROWS_PER_SCALE.items()}
+
+    skill_ids = list(range(1, amounts['tprod_skills'] + 1))
+    resource_ids = list(range(1, amounts['tprod_resources'] + 1))
+    task_ids = list(range(1, amounts['tprod_tasks'] + 1))
+    tag_ids = list(range(1, amounts['tprod_producttags'] + 1))
+
+    tables = {
+        TSysUnits: UNITS
+        , TProdSkills: [{'id': i, 'name': random_name(rng), 'description': random_name(rng, 4), **stamps} for i in skill_ids]
+        , TProdResources: [{'id': i, 'name': random_name(rng), **stamps} for i in resource_ids]
+        , TProdTasks: [
+            {
+                'id': i, 'name': random_name(rng), 'description': random_name(rng, 4), 'duration': rng.randint(1, 120)
+                , 'id_unit': 1, 'interruptible': rng.random() < 0.5, 'error_margin': round(rng.random(), 2), **stamps
+            }
+            for i in task_ids
+        ]
+        , TProdResourceSkills: [{'id_resource': i, 'id_skill': id_skill} for i in resource_ids for id_skill in rng.sample(skill_ids, SKILLS_PER_RESOURCE)]
+        , TProdTaskSkills: [{'id_task': i, 'id_skill': id_skill} for i in task_ids for id_skill in rng.sample(skill_ids, SKILLS_PER_TASK)]
+        , TSysKeywords: [
+            {'id_object': i, 'reference': reference, 'keyword': keyword}
+            for reference, ids in [('tprod_resources', resource_ids), ('tprod_tasks', task_ids)]
+            for i in ids for keyword in rng.sample(WORDS, KEYWORDS_PER_OBJECT)
+        ]
+        , TProdProductTags: [{'id': i, 'category': 'BEN', 'registry_counter': i, 'produced_counter': 0, 'subcategory': 'SUB'} for i in tag_ids]
+        , TProdProducts: [
+            {
+                'id': i, 'id_tag': rng.choice(tag_ids), 'name': random_name(rng), 'description': random_name(rng, 4)
+                , 'weight': round(rng.uniform(0.1, 100), 2), 'id_unit_mass': 3, 'height': round(rng.uniform(1, 200), 2)
+                , 'width': round(rng.uniform(1, 200), 2), 'depth': round(rng.uniform(1, 200), 2), 'id_unit_volume': 4, **stamps
+            }
+            for i in range(1, amounts['tprod_products'] + 1)
+        ]
+    }
+
+    nodes, edges, routes = [], [], []
+    for id_tag in tag_ids:
+        graph = route_graph(rng, id_tag, task_ids)
+        nodes.extend({**node, 'id_object': id_tag, 'reference': 'tprod_producttags', 'position': json.dumps(node['position']), 'ancestors': json.dumps(node['ancestors'])} for node in graph['nodes'])
+        edges.extend({**edge, 'id_object': id_tag, 'reference': 'tprod_producttags'} for edge in graph['edges'])
+        routes.extend({**route, **stamps} for route in graph['routes_data'])
+
+    tables[TSysNodes] = [{'id': i, **node} for i, node in enumerate(nodes, start=1)]
+    tables[TSysEdges] = [{'id': i, **edge} for i, edge in enumerate(edges, start=1)]
+    tables[TProdRoutes] = routes
+
+    counts = {}
+    for table_cls, rows in tables.items():
+        df = pd.DataFrame(rows)
+        counts[table_cls.__tablename__] = db.copy(table_cls, [df], list(df.columns))
+
+        if 'id' in df.columns: # reason: later inserts must not collide with the generated IDs
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table_cls.__tablename__}', 'id'), {int(df['id'].max())})"))
+
+    for view in MATERIALIZED_VIEWS: # reason: the refresher of the server never sees the writes of the seed
+        db.session.execute(text(f'REFRESH MATERIALIZED VIEW {view}'))
+
+    db.session.commit()
+
+    return counts
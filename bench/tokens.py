@@ -0,0 +1,85 @@
+# This area is meant for comparing the JWT algorithms supported by `src.security.KeyManager` on the hardware
+# the benchmarks run on. Every session validation verifies a token and every login signs one, so verify
+# throughput is what matters most. No database is needed.
+#
+# Usage:
+#   python -m bench.tokens --iterations 2000
+#   python -m bench.compare jwt-base.json jwt-head.json
+from contextlib import ExitStack
+
+from bench.run import measure, git_commit
+
+import datetime
+import tempfile
+import argparse
+import json
+import sys
+
+
+def build_benchmarks(directory: str) -> dict:
+    """
+    Builds a sign and a verify benchmark per algorithm, each one with its own key manager and a payload
+    shaped like the session tokens of `/auth/callback`.
+    """
+    from src.security import KeyManager, generate_jwt_key, generate_session_token, JWT_ALGORITHMS
+
+    payload = {
+        'google_id': '100000000001'
+        , 'token': generate_session_token()
+        , 'user_agent': 'x' * 44
+        , 'client_ip': '127.0.0.1'
+    }
+
+    benchmarks = {}
+    for algorithm in JWT_ALGORITHMS:
+        generate_jwt_key(algorithm.lower(), algorithm, directory=f'{directory}/{algorithm}')
+        manager = KeyManager(f'{directory}/{algorithm}', legacy_directory=directory)
+        token = manager.sign(payload)
+
+        benchmarks[f'jwt.sign.{algorithm}'] = (lambda manager=manager: manager.sign(payload), None)
+        benchmarks[f'jwt.verify.{algorithm}'] = (lambda manager=manager, token=token: manager.verify(token), None)
+
+    return benchmarks
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compares the sign and verify throughput of the supported JWT algorithms.')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--output', help='Where to write the report. Defaults to jwt-<commit>.json.')
+    args = parser.parse_args(argv)
+
+    if args.iterations < 2:
+        parser.error('--iterations must be at least 2.')
+
+    with ExitStack() as stack:
+        directory = stack.enter_context(tempfile.TemporaryDirectory(prefix='lmind_jwt_'))
+
+        results = {}
+        for name, (fn, setup) in build_benchmarks(directory).items():
+            results[name] = measure(fn, args.iterations, args.warmup, setup)
+            print(f"{name:<24} p50 {results[name]['p50_ms']:>8.3f} ms   p99 {results[name]['p99_ms']:>8.3f} ms   "
+                  f"{results[name]['throughput_ops']:>10.1f} ops/s", file=sys.stderr)
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit
+        , 'dirty': dirty
+        , 'created_at': datetime.datetime.utcnow().isoformat()
+        , 'python': sys.version.split()[0]
+        , 'scale': None
+        , 'iterations': args.iterations
+        , 'warmup': args.warmup
+        , 'results': results
+    }
+
+    output = args.output or f'jwt-{commit[:8]}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {output}.", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
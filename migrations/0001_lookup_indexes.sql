@@ -0,0 +1,11 @@
+-- migrate:no-transaction
+-- Indexes for the lookups that have none besides primary keys and unique constraints: tasks referenced by
+-- routes (checked whenever a task is deleted), the nodes, edges and keywords of an object, and the links of
+-- a skill. Built CONCURRENTLY so that writes go on while they are built. A failed build leaves an INVALID
+-- index behind, which must be dropped before running this migration again.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tprod_routes_id_task_index ON tprod_routes (id_task);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tsys_nodes_object_index ON tsys_nodes (id_object, reference);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tsys_edges_object_index ON tsys_edges (id_object, reference);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tsys_keywords_reference_index ON tsys_keywords (reference, id_object);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tprod_taskskills_id_skill_index ON tprod_taskskills (id_skill);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tprod_resourceskills_id_skill_index ON tprod_resourceskills (id_skill);
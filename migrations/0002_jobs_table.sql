@@ -0,0 +1,14 @@
+-- The table behind background jobs, for databases created before it was added to setup.sql.
+CREATE TABLE IF NOT EXISTS tsys_jobs (
+    id VARCHAR(36) PRIMARY KEY
+    , name VARCHAR(100) NOT NULL
+    , status VARCHAR(20) NOT NULL DEFAULT 'queued' -- queued, running, finished, failed
+    , progress INTEGER DEFAULT 0
+    , total INTEGER
+    , status_code INTEGER
+    , message VARCHAR(255)
+    , result TEXT
+    , created_by VARCHAR(64)
+    , created_at TIMESTAMP DEFAULT NOW()
+    , updated_at TIMESTAMP DEFAULT NOW()
+);
@@ -0,0 +1,25 @@
+-- The catalog of products read by /crud/select, for databases created before it was added to setup.sql. Created
+-- populated; the unique index is required by REFRESH MATERIALIZED VIEW CONCURRENTLY (see src/views.py).
+CREATE MATERIALIZED VIEW IF NOT EXISTS tprod_products_catalog AS
+SELECT
+    tprod_products.id
+    , tprod_producttags.id AS id_tag
+    , tprod_producttags.category || tprod_producttags.registry_counter || tprod_producttags.subcategory AS tag
+    , tprod_products.name
+    , tprod_products.description
+    , tprod_products.weight
+    , unit_mass.id AS id_unit_mass
+    , unit_mass.name AS name_unit_mass
+    , tprod_products.height
+    , tprod_products.width
+    , tprod_products.depth
+    , unit_volume.id AS id_unit_volume
+    , unit_volume.name AS name_unit_volume
+    , tprod_products.version
+FROM tprod_products
+JOIN tprod_producttags ON tprod_products.id_tag = tprod_producttags.id
+JOIN tsys_units AS unit_mass ON tprod_products.id_unit_mass = unit_mass.id
+JOIN tsys_units AS unit_volume ON tprod_products.id_unit_volume = unit_volume.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS tprod_products_catalog_id_index ON tprod_products_catalog (id);
+CREATE INDEX IF NOT EXISTS tprod_products_catalog_name_index ON tprod_products_catalog (name);
@@ -4,7 +4,7 @@ create table tsys_roles (
 	, email varchar(45) not null
     , role varchar(20) not null
     , level int not null
-)
+);
 
 CREATE TABLE tsys_users (
     id_role SERIAL REFERENCES tsys_roles(id) PRIMARY KEY
@@ -16,6 +16,7 @@ CREATE TABLE tsys_users (
     , locale VARCHAR(8) NOT NULL
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_at TIMESTAMP DEFAULT NOW()
+    , version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE tsys_sessions (
@@ -26,6 +27,7 @@ CREATE TABLE tsys_sessions (
     , client_ip VARCHAR(45) NOT NULL
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_at TIMESTAMP DEFAULT NOW()
+    , version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE tsys_units (
@@ -46,6 +48,7 @@ CREATE TABLE tsys_categories (
 	, created_at TIMESTAMP DEFAULT NOW()
 	, updated_by VARCHAR(64)
 	, updated_at TIMESTAMP DEFAULT NOW()
+	, version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE tsys_keywords (
@@ -54,6 +57,7 @@ CREATE TABLE tsys_keywords (
     , keyword VARCHAR(30) NOT NULL
     , CONSTRAINT tsys_keywords_unique_constraint UNIQUE (id_object, reference, keyword)
 );
+CREATE INDEX tsys_keywords_reference_index ON tsys_keywords (reference, id_object);
 
 CREATE TABLE tsys_nodes (
     id serial primary key
@@ -65,7 +69,8 @@ CREATE TABLE tsys_nodes (
     , position VARCHAR(255) NOT NULL
     , ancestors TEXT
     , CONSTRAINT tsys_nodes_unique_constraint UNIQUE (uuid, reference, id_object)
-)
+);
+CREATE INDEX tsys_nodes_object_index ON tsys_nodes (id_object, reference);
 
 CREATE TABLE tsys_edges (
     id serial primary key
@@ -75,7 +80,23 @@ CREATE TABLE tsys_edges (
     , target_uuid VARCHAR(36) NOT NULL
     , type VARCHAR(50) DEFAULT 'default'
     , CONSTRAINT tsys_edges_unique_constraint UNIQUE (source_uuid, target_uuid, reference, id_object)
-)
+);
+CREATE INDEX tsys_edges_object_index ON tsys_edges (id_object, reference);
+
+CREATE TABLE tsys_jobs (
+    id VARCHAR(36) PRIMARY KEY
+    , name VARCHAR(100) NOT NULL
+    , status VARCHAR(20) NOT NULL DEFAULT 'queued' -- queued, running, finished, failed
+    , progress INTEGER DEFAULT 0
+    , total INTEGER
+    , status_code INTEGER
+    , message VARCHAR(255)
+    , result TEXT
+    , created_by VARCHAR(64)
+    , created_at TIMESTAMP DEFAULT NOW()
+    , updated_at TIMESTAMP DEFAULT NOW()
+    , version INTEGER NOT NULL DEFAULT 1
+);
 
 
 
@@ -87,7 +108,8 @@ CREATE TABLE tprod_resources (
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_by VARCHAR(64)
     , updated_at TIMESTAMP DEFAULT NOW()
-)
+    , version INTEGER NOT NULL DEFAULT 1
+);
 
 CREATE TABLE tprod_skills (
     id SERIAL PRIMARY KEY
@@ -97,6 +119,7 @@ CREATE TABLE tprod_skills (
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_by VARCHAR(64)
     , updated_at TIMESTAMP DEFAULT NOW()
+    , version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE tprod_tasks (
@@ -111,6 +134,7 @@ CREATE TABLE tprod_tasks (
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_by VARCHAR(64)
     , updated_at TIMESTAMP DEFAULT NOW()
+    , version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE tprod_taskskills (
@@ -118,12 +142,14 @@ CREATE TABLE tprod_taskskills (
     , id_skill INTEGER REFERENCES tprod_skills(id)
     , PRIMARY key (id_task, id_skill)
 );
+CREATE INDEX tprod_taskskills_id_skill_index ON tprod_taskskills (id_skill);
 
 CREATE TABLE tprod_resourceskills (
     id_resource INTEGER REFERENCES tprod_resources(id)
     , id_skill INTEGER REFERENCES tprod_skills(id)
     , PRIMARY key (id_resource, id_skill)
 );
+CREATE INDEX tprod_resourceskills_id_skill_index ON tprod_resourceskills (id_skill);
 
 create table tprod_producttags (
 	id serial primary key
@@ -142,8 +168,10 @@ CREATE TABLE tprod_routes (
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_by VARCHAR(64)
     , updated_at TIMESTAMP DEFAULT NOW()
+    , version INTEGER NOT NULL DEFAULT 1
     , PRIMARY key (id_tag, id_task)
 );
+CREATE INDEX tprod_routes_id_task_index ON tprod_routes (id_task);
 
 CREATE TABLE tprod_products (
     id SERIAL PRIMARY KEY
@@ -160,4 +188,31 @@ CREATE TABLE tprod_products (
     , created_at TIMESTAMP DEFAULT NOW()
     , updated_by VARCHAR(64)
     , updated_at TIMESTAMP DEFAULT NOW()
-);
\ No newline at end of file
+    , version INTEGER NOT NULL DEFAULT 1
+);
+
+
+-- VIEWS
+CREATE MATERIALIZED VIEW tprod_products_catalog AS
+SELECT
+    tprod_products.id
+    , tprod_producttags.id AS id_tag
+    , tprod_producttags.category || tprod_producttags.registry_counter || tprod_producttags.subcategory AS tag
+    , tprod_products.name
+    , tprod_products.description
+    , tprod_products.weight
+    , unit_mass.id AS id_unit_mass
+    , unit_mass.name AS name_unit_mass
+    , tprod_products.height
+    , tprod_products.width
+    , tprod_products.depth
+    , unit_volume.id AS id_unit_volume
+    , unit_volume.name AS name_unit_volume
+    , tprod_products.version
+FROM tprod_products
+JOIN tprod_producttags ON tprod_products.id_tag = tprod_producttags.id
+JOIN tsys_units AS unit_mass ON tprod_products.id_unit_mass = unit_mass.id
+JOIN tsys_units AS unit_volume ON tprod_products.id_unit_volume = unit_volume.id;
+
+CREATE UNIQUE INDEX tprod_products_catalog_id_index ON tprod_products_catalog (id); -- required by REFRESH ... CONCURRENTLY
+CREATE INDEX tprod_products_catalog_name_index ON tprod_products_catalog (name);
@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+
+from src.auth import validate_admin
+from src.profiling import profiler
+from src.security import key_manager, SESSION_LIFETIME
+from src.cache import revocations
+from src.startup import steps, STARTUP_MODE
+from src.start import db
+from src.plans import capture_plans, diff_plans, regressions, load_baseline, save_baseline, PLAN_BASELINE
+
+import os
+
+
+admin_router = APIRouter(dependencies=[Depends(validate_admin)])
+
+
+# Profiles
+@admin_router.get('/admin/profiles')
+async def list_profiles():
+    """
+    List the stored request profiles, newest first.
+    """
+    return JSONResponse(status_code=200, content={'data': profiler.list(), 'message': 'Profiles retrieved.'})
+
+
+@admin_router.get('/admin/profiles/{name}')
+async def download_profile(name: str):
+    """
+    Download a stored request profile in the collapsed stack format.
+    """
+    path = profiler.path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+
+    return FileResponse(path, media_type='text/plain', filename=name)
+
+
+# Startup
+@admin_router.get('/admin/startup')
+async def startup_report():
+    """
+    Report the startup mode, the time spent on each startup step and the state of the connection pools.
+    """
+    return JSONResponse(status_code=200, content={'data': {'mode': STARTUP_MODE, 'steps': steps, 'pool': db.pool_stats(), 'replicas': [db.pool_stats(engine) for engine in db.replica_engines]}, 'message': 'Startup report retrieved.'})
+
+
+# Keys
+@admin_router.post('/admin/jwt-keys/reload')
+async def reload_jwt_keys():
+    """
+    Reload the JWT keys of the worker serving the request from disk, e.g. after a key was added, retired
+    or made the active one.
+    """
+    try:
+        keys = key_manager.load()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    data = {'active': key_manager.active.kid, 'keys': [{'kid': key.kid, 'algorithm': key.algorithm, 'signing': key.private_key is not None} for key in keys.values()]}
+    return JSONResponse(status_code=200, content={'data': data, 'message': 'JWT keys reloaded.'})
+
+
+# Sessions
+@admin_router.post('/admin/sessions/revoke')
+async def revoke_sessions(google_id: str):
+    """
+    Sign a user out of every session issued until now, in every worker.
+    """
+    revocations.revoke_user(google_id, SESSION_LIFETIME)
+    return JSONResponse(status_code=200, content={'data': {'google_id': google_id}, 'message': 'Sessions revoked.'})
+
+
+# Plans
+@admin_router.get('/admin/plans')
+async def plan_report():
+    """
+    Run the statements of QUERY_MAP and the common filters under EXPLAIN (ANALYZE, BUFFERS), and diff their
+    plans against the saved baseline, if any. Every statement is executed, so this may take a while on large tables.
+    """
+    plans = await run_in_threadpool(capture_plans, db)
+
+    changes = None
+    if os.path.isfile(PLAN_BASELINE):
+        changes = diff_plans(load_baseline(PLAN_BASELINE), plans)
+
+    data = {'plans': plans, 'changes': changes, 'regressions': len(regressions(changes)) if changes is not None else None}
+    return JSONResponse(status_code=200, content={'data': data, 'message': 'Plans captured.' if changes is None else 'Plans compared with the baseline.'})
+
+
+@admin_router.post('/admin/plans/baseline')
+async def save_plan_baseline():
+    """
+    Capture the current plans and save them as the baseline later captures are compared with.
+    """
+    plans = await run_in_threadpool(capture_plans, db)
+    save_baseline(plans, PLAN_BASELINE)
+
+    return JSONResponse(status_code=200, content={'data': {'statements': len(plans)}, 'message': 'Plan baseline saved.'})
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, Request, Response, Cookie, Query, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Cookie, Header, Query, Depends
 from fastapi.responses import RedirectResponse, JSONResponse
 
 from src.start import db
 from src.models import TSysRoles, TSysUsers, TSysSessions
 from src.schemas import SuccessMessages, DBOutput, WhereConditions
-from src.security import generate_session_token, hash_plaintext, generate_jwt, decode_jwt
+from src.security import generate_session_token, hash_plaintext, generate_jwt, decode_jwt, session_payload, is_admin_token, SESSION_LIFETIME
+from src.metrics import timed
+from src.cache import session_cache, revocations, cache, MemoryCache
+from src.oauth import oauth, GOOGLE_AUTH_URL
+from src.startup import lazy_import
 
 from typing import Annotated
 
 import datetime
-import requests
 import base64
 import json
+import time
 import os
 
+httpx = lazy_import('httpx')
+
 
 auth_router = APIRouter()
 
@@ -35,6 +41,17 @@ GOOGLE_REDIRECT_URI = os.getenv('GOOGLE_REDIRECT_URI')
 FRONTEND_REDIRECT_URL = os.getenv('FRONTEND_REDIRECT_URL')
 ############# DEVELOPMENT ONLY #############
 
+# In the stateless session mode, a JWT with a valid signature, matching client data and an unexpired `exp`
+# is enough: tsys_sessions is not read. Logouts and forced sign-outs are enforced in both modes through the
+# revocation list, which every worker keeps in memory. In the stateless mode, the revocation list is the only
+# way to end a session before it expires, so it requires a shared cache (CACHE_URL=redis://...) whenever more
+# than one worker (WEB_CONCURRENCY) runs; with memory://, a logout would only reach the worker that served it.
+SESSION_MODE = os.getenv('SESSION_MODE', 'stateful')
+STATELESS_SESSIONS = SESSION_MODE == 'stateless'
+
+if STATELESS_SESSIONS and isinstance(cache, MemoryCache) and int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+    raise RuntimeError("Stateless sessions with more than one worker require a shared cache. Set CACHE_URL to a redis:// URL.")
+
 class MissingSessionError(BaseException):
     """
     An exception raised when a session token could be decrypted 
@@ -43,10 +60,11 @@ class MissingSessionError(BaseException):
     """
 
 
+@timed('auth')
 def validate_session(response: Response, request: Request, jwt_s: Annotated[str | None, Cookie()]):
     """
     Validate the session cookie. If the cookie is valid, extend the expiration,
-    otherwise, delete the cookie.
+    otherwise, delete the cookie. In the stateless session mode, no query is made.
     """
     try:
         session_cookie = jwt_s.encode('utf-8')
@@ -54,12 +72,22 @@ def validate_session(response: Response, request: Request, jwt_s: Annotated[str
         hashed_user_agent = hash_plaintext(json.dumps(request.headers.get("User-Agent")))
         hashed_user_agent = base64.b64encode(hashed_user_agent).decode('utf-8')
 
-        decoded_token: dict = decode_jwt(session_cookie)
+        decoded_token: dict = decode_jwt(session_cookie, require=['exp', 'iat'] if STATELESS_SESSIONS else None)
         client_ip = request.client.host
 
         if hashed_user_agent != decoded_token.get("user_agent") or client_ip != decoded_token.get("client_ip"):
             raise ValueError("Session data did not match preliminary client data.")
 
+        if revocations.is_revoked(decoded_token.get("token"), decoded_token.get("google_id"), decoded_token.get("iat")):
+            raise MissingSessionError("The session was revoked.")
+
+        if STATELESS_SESSIONS:
+            return decoded_token.get("google_id")
+
+        cached_session = (decoded_token.get("google_id"), decoded_token.get("token"), hashed_user_agent, client_ip)
+        if session_cache.is_valid(*cached_session): # reason: skip tsys_sessions while a recent validation is cached
+            return decoded_token.get("google_id")
+
 
         @db.catching(SuccessMessages(client="Session validated."))
         def auth__validate_session(decoded_token: dict, user_agent: dict, client_ip: str):
@@ -83,6 +111,8 @@ def validate_session(response: Response, request: Request, jwt_s: Annotated[str
         if not is_valid_session:
             db.logger.error("Session token belongs to us, but no session matched it's data. Was this token stolen?")
             raise MissingSessionError("No session could be found matching the provided session token.")
+
+        session_cache.remember(*cached_session)
         
         return decoded_token.get("google_id")
 
@@ -92,13 +122,22 @@ def validate_session(response: Response, request: Request, jwt_s: Annotated[str
         raise HTTPException(status_code=401, detail="Unauthorized access.", headers=response.headers)
 
 
+def validate_admin(x_admin_token: Annotated[str | None, Header()] = None):
+    """
+    Validate the admin token header of administrative routes.
+    """
+    if not is_admin_token(x_admin_token):
+        db.logger.error("An administrative route was called without a valid admin token.")
+        raise HTTPException(status_code=403, detail="Forbidden.")
+
+
 # Routes
 @auth_router.get("/auth/login")
 async def auth_login():
     """
     Build the Google OAuth2 login URL and redirect the user to it.
     """
-    return JSONResponse(content={'url': f"https://accounts.google.com/o/oauth2/auth?response_type=code&client_id={GOOGLE_CLIENT_ID}&redirect_uri={GOOGLE_REDIRECT_URI}&scope=openid%20profile%20email&access_type=offline"}, status_code=200)
+    return JSONResponse(content={'url': f"{GOOGLE_AUTH_URL}?response_type=code&client_id={GOOGLE_CLIENT_ID}&redirect_uri={GOOGLE_REDIRECT_URI}&scope=openid%20profile%20email&access_type=offline"}, status_code=200)
 
 
 @auth_router.get("/auth/callback")
@@ -108,7 +147,6 @@ async def auth_callback(request: Request, code: str = Query(...)):
     redirect the user to after they have successfully authenticated.
     """
 
-    token_url = "https://accounts.google.com/o/oauth2/token"
     data = {
         "code": code,
         "client_id": GOOGLE_CLIENT_ID,
@@ -116,12 +154,21 @@ async def auth_callback(request: Request, code: str = Query(...)):
         "redirect_uri": GOOGLE_REDIRECT_URI,
         "grant_type": "authorization_code"
     }
-    response = requests.post(token_url, data=data)
+    try:
+        response = await oauth.exchange_code(data)
+    except httpx.HTTPError as e:
+        db.logger.error(f"The OAuth token exchange failed: {e}")
+        raise HTTPException(status_code=503, detail="Authentication provider is unavailable.")
+
     if response.status_code == 200:
 
         access_token = response.json().get("access_token")
         if access_token:
-            user_info = requests.get("https://www.googleapis.com/oauth2/v1/userinfo", headers={"Authorization": f"Bearer {access_token}"})
+            try:
+                user_info = await oauth.userinfo(access_token)
+            except httpx.HTTPError as e:
+                db.logger.error(f"The OAuth user info request failed: {e}")
+                raise HTTPException(status_code=503, detail="Authentication provider is unavailable.")
 
             # 1) collect information
             hashed_user_agent = hash_plaintext(json.dumps(request.headers.get("User-Agent")))
@@ -150,12 +197,7 @@ async def auth_callback(request: Request, code: str = Query(...)):
             }
 
             # 3) build payload & generate JWT
-            payload = {
-                "google_id": user_info.get("id")
-                , "token": session_token
-                , "user_agent": hashed_user_agent
-                , "client_ip": client_ip
-            }
+            payload = session_payload(user_info.get("id"), session_token, hashed_user_agent, client_ip)
 
             jwt_token = generate_jwt(payload)
 
@@ -190,7 +232,7 @@ async def auth_callback(request: Request, code: str = Query(...)):
             response = RedirectResponse(url=url, headers=request.headers)
             
             if is_session_initiated:
-                response.set_cookie(key="jwt_s", value=jwt_token, httponly=True, samesite='none', secure=True, expires=(60 * 60 * 24 * 7))
+                response.set_cookie(key="jwt_s", value=jwt_token, httponly=True, samesite='none', secure=True, expires=SESSION_LIFETIME)
             
             return response
 
@@ -204,6 +246,15 @@ async def auth_validate():
 
 
 @auth_router.get('/auth/logout')
-async def auth_logout(response: Response):
+async def auth_logout(response: Response, jwt_s: Annotated[str | None, Cookie()] = None):
+    """
+    Revoke the session and delete its cookie.
+    """
+    try:
+        decoded_token: dict = decode_jwt(jwt_s.encode('utf-8'))
+        revocations.revoke_token(decoded_token.get("token"), decoded_token.get("exp") or time.time() + SESSION_LIFETIME)
+    except Exception as e: # reason: an invalid or expired cookie has nothing left to revoke
+        db.logger.debug(f"Logout without a valid session: {e}")
+
     response.delete_cookie(key="jwt_s", httponly=True, samesite='none', secure=True)
     return JSONResponse(status_code=200, content={"message": "Session has been terminated."}, headers=response.headers)
\ No newline at end of file
@@ -0,0 +1,373 @@
+# This area is meant for state shared between requests and, with more than one worker, between processes.
+# The backend is chosen by CACHE_URL: `memory://` keeps everything inside the process, `redis://...` shares
+# it between every worker of the node. Query results are keyed by the generation of the tables they read,
+# and generations are bumped whenever a transaction that wrote to those tables commits, so entries never
+# outlive a write. With more than one worker, only a shared backend sees the writes of the other workers.
+# The same generations back the ETags of read responses. Both are therefore turned off, whatever ETAGS and
+# QUERY_CACHE_TTL say, when the backend is `memory://` and more than one worker (WEB_CONCURRENCY) runs.
+from typing import Any, Callable, Iterable, Optional
+
+import threading
+import hashlib
+import secrets
+import uuid
+import pickle
+import json
+import time
+import os
+
+
+CACHE_URL = os.getenv('CACHE_URL', 'memory://')
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', 30))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 0))
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', 10000))
+ETAGS = os.getenv('ETAGS', 'true').lower() == 'true'
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+REVOCATION_SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', 1))
+REVOCATION_SYNC_BATCH = 1000
+
+
+class CacheBackend():
+    """
+    The interface of cache backends. Values are bytes; counters are integers that never expire.
+
+    Methods:
+        - get: Returns the value of a key, or None.
+        - get_many: Returns the values of several keys, None for the missing ones.
+        - set: Stores a value for `ttl` seconds.
+        - delete: Removes a key.
+        - incr: Increments a counter and returns its new value.
+        - add: Stores a value that never expires, unless the key already exists, and returns the stored value.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """
+    A per-process backend. Expired entries are dropped when read, or swept once `max_entries` is reached, and
+    only then are the oldest live entries evicted. Counters and values stored with `add` are kept apart and never
+    evicted, since generations starting over would bring back results cached before later writes.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: dict[str, tuple[Any, float]] = {}
+        self.counters: dict[str, Any] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            if key in self.counters:
+                return self.counters[key]
+
+            value, expires_at = self.entries.get(key, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self.lock:
+            if len(self.entries) >= self.max_entries and key not in self.entries:
+                now = time.monotonic()
+                live = [(name, entry) for name, entry in self.entries.items() if entry[1] >= now]
+                if len(live) >= self.max_entries: # reason: dicts keep insertion order, so the oldest entries go first; a tenth is freed so that sweeps stay rare
+                    live = live[len(live) - self.max_entries * 9 // 10:]
+                self.entries = dict(live)
+            self.entries[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.counters.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            value = int(self.counters.get(key, 0)) + 1
+            self.counters[key] = value
+            return value
+
+    def add(self, key: str, value: bytes) -> bytes:
+        with self.lock:
+            return self.counters.setdefault(key, value)
+
+
+class RedisCache(CacheBackend):
+    """
+    A backend shared by every process that points to the same Redis. Depends on the `redis` package.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("Redis caches require the redis package.")
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        return self.client.mget(keys) if keys else []
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+    def add(self, key: str, value: bytes) -> bytes:
+        self.client.set(key, value, nx=True)
+        return self.client.get(key)
+
+
+def build_cache(url: str) -> CacheBackend:
+    """
+    Builds the backend of a cache URL, either `memory://` or `redis://...`.
+    """
+    if url.startswith('memory://'):
+        return MemoryCache()
+
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url)
+
+    raise ValueError(f"Cache URL <{url}> is not supported. Use memory:// or redis://.")
+
+
+def hash_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class SessionCache():
+    """
+    Remembers sessions that were found valid for `ttl` seconds, so that authenticated requests do not hit
+    `tsys_sessions` every time. A session deleted from the table may keep working until its entry expires.
+
+    Args:
+        - backend (CacheBackend): Where entries are stored.
+        - ttl (float): The lifetime of the entries. Zero disables the cache.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    def is_valid(self, *session_data) -> bool:
+        return self.ttl > 0 and self.backend.get(f'session:{hash_key(*session_data)}') is not None
+
+    def remember(self, *session_data):
+        if self.ttl > 0:
+            self.backend.set(f'session:{hash_key(*session_data)}', b'1', self.ttl)
+
+
+class RevocationList():
+    """
+    Keeps the revoked sessions in memory, so that checking a token costs no round trip. Revocations are appended
+    to a log in the backend, numbered by a counter, and every process replays the entries it has not seen at most
+    every `sync_interval` seconds. With a shared backend, a revocation reaches the other workers within that
+    interval; the revoking worker applies it right away. Entries are dropped once the tokens they target expire.
+
+    Args:
+        - backend (CacheBackend): Where the log is stored.
+        - sync_interval (float): Seconds between two reads of the log.
+
+    Methods:
+        - revoke_token: Revokes a single session.
+        - revoke_user: Revokes every session of a user issued until now.
+        - is_revoked: Returns whether a session was revoked.
+        - sync: Replays the entries of the log that were not seen yet.
+    """
+
+    def __init__(self, backend: CacheBackend, sync_interval: float):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.tokens: dict[str, float] = {}
+        self.users: dict[str, tuple[float, float]] = {}
+        self.seen = 0
+        self.synced_at = float('-inf')
+        self.lock = threading.Lock()
+
+    def revoke_token(self, token: str, expires_at: float):
+        self._append({'kind': 'token', 'id': token, 'at': time.time(), 'expires_at': expires_at})
+
+    def revoke_user(self, google_id: str, lifetime: float):
+        """
+        Args:
+            - google_id (str): The user whose sessions are revoked.
+            - lifetime (float): The lifetime of sessions, after which no token issued until now is valid anyway.
+        """
+        now = time.time()
+        self._append({'kind': 'user', 'id': google_id, 'at': now, 'expires_at': now + lifetime})
+
+    def is_revoked(self, token: str, google_id: str, issued_at: Optional[float]) -> bool:
+        """
+        Args:
+            - token (str): The session token carried by the JWT.
+            - google_id (str): The user of the session.
+            - issued_at (float): The `iat` claim of the JWT. Tokens without it count as issued before any revocation.
+        """
+        self.sync()
+
+        if token in self.tokens:
+            return True
+
+        revoked_at, _ = self.users.get(google_id, (None, None))
+        return revoked_at is not None and (issued_at or 0) < revoked_at
+
+    def sync(self, force: bool = False):
+        if not force and time.monotonic() - self.synced_at < self.sync_interval:
+            return
+
+        with self.lock:
+            self.synced_at = time.monotonic()
+            counter = int(self.backend.get('revocations') or 0)
+            if counter < self.seen: # reason: the backend was flushed, its log starts over
+                self.seen = 0
+
+            for start in range(self.seen + 1, counter + 1, REVOCATION_SYNC_BATCH):
+                keys = [f'revocation:{n}' for n in range(start, min(start + REVOCATION_SYNC_BATCH, counter + 1))]
+                for value in self.backend.get_many(keys):
+                    if value is not None: # reason: entries of expired tokens expire as well
+                        self._apply(json.loads(value))
+            self.seen = counter
+
+            now = time.time()
+            self.tokens = {token: expires_at for token, expires_at in self.tokens.items() if expires_at > now}
+            self.users = {user: entry for user, entry in self.users.items() if entry[1] > now}
+
+    def _append(self, entry: dict):
+        ttl = entry['expires_at'] - time.time()
+        if ttl <= 0:
+            return
+
+        with self.lock:
+            self._apply(entry)
+        number = self.backend.incr('revocations')
+        self.backend.set(f'revocation:{number}', json.dumps(entry).encode('utf-8'), ttl)
+
+    def _apply(self, entry: dict):
+        if entry['kind'] == 'token':
+            self.tokens[entry['id']] = entry['expires_at']
+        else:
+            revoked_at, expires_at = self.users.get(entry['id'], (0, 0))
+            self.users[entry['id']] = (max(revoked_at, entry['at']), max(expires_at, entry['expires_at']))
+
+
+class QueryCache():
+    """
+    Caches query results by the generation of the tables they read.
+
+    Args:
+        - backend (CacheBackend): Where results and generations are stored.
+        - ttl (float): The lifetime of the results. Zero disables the cache.
+        - etags (bool, optional): Whether entity tags are derived from the generations. Defaults to True.
+
+    Methods:
+        - generations: Returns the current generation of each table.
+        - fetch: Returns a cached result, or loads and caches it.
+        - invalidate: Bumps the generation of the tables, which orphans every result that read them.
+        - etag: Returns an entity tag that changes whenever one of the tables is written.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, etags: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.etags = etags
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether results or entity tags are derived from the generations. Generations follow the commits of the
+        primary, so the reads they tag must run on it: a lagging replica would pair old rows with a new generation.
+        """
+        return self.ttl > 0 or self.etags
+
+    def generations(self, tables: Iterable[str]) -> dict[str, int]:
+        """
+        Returns the current generation of each table. A missing generation, never written or lost to an eviction
+        or a flush, starts at a random value instead of zero, so that it cannot match results or entity tags
+        derived from an earlier generation.
+        """
+        tables = sorted(set(tables))
+        values = self.backend.get_many([f'generation:{table}' for table in tables])
+
+        generations = {}
+        for table, value in zip(tables, values):
+            if value is None:
+                value = self.backend.add(f'generation:{table}', str(secrets.randbits(48)).encode())
+            generations[table] = int(value)
+
+        return generations
+
+    def fetch(self, key: Any, tables: Iterable[str], load: Callable[[], Any]) -> Any:
+        """
+        Args:
+            - key (Any): Anything JSON serializable that identifies the query, e.g. the table, filters and arguments.
+            - tables (Iterable[str]): The tables read by the query.
+            - load (Callable): Executes the query.
+
+        Returns:
+            - Any: The result of the query.
+        """
+        if self.ttl <= 0:
+            return load()
+
+        cache_key = f'query:{hash_key(key, self.generations(tables))}'
+        cached = self.backend.get(cache_key)
+        if cached is not None:
+            return pickle.loads(cached)
+
+        result = load()
+        self.backend.set(cache_key, pickle.dumps(result), self.ttl)
+
+        return result
+
+    def invalidate(self, tables: Iterable[str]):
+        self.generations(tables) # reason: missing generations get their random start first, incrementing them from zero could repeat an earlier value
+        for table in tables:
+            self.backend.incr(f'generation:{table}')
+
+    def etag(self, key: Any, tables: Iterable[str]) -> Optional[str]:
+        """
+        Args:
+            - key (Any): Anything JSON serializable that identifies the response, e.g. the table, filters and user.
+            - tables (Iterable[str]): The tables the response is built from.
+
+        Returns:
+            - str: A weak entity tag, or None if ETags are disabled. The epoch of the backend is part of it, and generations that went
+            missing start from a random value (see `generations`), so tags issued before a rebuild, a flush or an eviction never match again.
+        """
+        if not self.etags:
+            return None
+
+        epoch = self.backend.get('epoch') or self.backend.add('epoch', uuid.uuid4().hex.encode())
+        return f'W/"{hash_key(key, epoch.decode(), self.generations(tables))[:32]}"'
+
+
+cache = build_cache(CACHE_URL)
+shared_generations = not isinstance(cache, MemoryCache) or WEB_CONCURRENCY <= 1 # reason: a write on one worker would not bump the generations the others answer with
+
+session_cache = SessionCache(cache, SESSION_CACHE_TTL)
+revocations = RevocationList(cache, REVOCATION_SYNC_INTERVAL)
+query_cache = QueryCache(cache, QUERY_CACHE_TTL if shared_generations else 0, ETAGS and shared_generations)
@@ -0,0 +1,115 @@
+# This area is meant for compressing the responses built by `api_output`. The body is encoded once, right
+# after it is rendered, with the best encoding both sides support: zstd and brotli when their packages
+# (zstandard, brotli) are installed, gzip otherwise. Bodies under COMPRESSION_MIN_SIZE bytes, such as most
+# auth responses, are sent as they are, since compressing them costs more CPU than it saves in bandwidth.
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from src.metrics import phase
+
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION = os.getenv('COMPRESSION', 'true').lower() == 'true'
+ZSTD_LEVEL = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
+BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {} # reason: ordered by preference, the best one accepted by the client wins
+if zstandard is not None:
+    ENCODERS['zstd'] = lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body) # reason: compressors are not thread safe
+if brotli is not None:
+    ENCODERS['br'] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+ENCODERS['gzip'] = lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+accepted_encoding: ContextVar[Optional[str]] = ContextVar('accepted_encoding', default=None)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the preferred encoding among the ones accepted by an Accept-Encoding header. Encodings with `q=0`
+    are refused and `*` stands for any encoding not listed.
+
+    Args:
+        - accept_encoding (str): The Accept-Encoding header of the request.
+
+    Returns:
+        - str: The name of the encoding, or None if the body should be sent as it is.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for entry in accept_encoding.lower().split(','):
+        name, _, parameters = entry.partition(';')
+        weight = 1.0
+        parameter, _, value = parameters.strip().partition('=')
+        if parameter == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+
+    candidates = [
+        (weights.get(encoding, weights.get('*', 0.0)), -position, encoding)
+        for position, encoding in enumerate(ENCODERS)
+    ]
+    weight, _, encoding = max(candidates)
+
+    return encoding if weight > 0 else None
+
+
+def compress_response(response):
+    """
+    Compresses the rendered body of a response with the encoding negotiated for the current request, if the
+    body is large enough.
+    """
+    if response.status_code < 200 or response.status_code in [204, 304] or len(response.body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.headers['Vary'] = 'Accept-Encoding'
+
+    encoding = accepted_encoding.get()
+    if encoding is None:
+        return response
+
+    with phase('compression'):
+        response.body = ENCODERS[encoding](response.body)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(response.body))
+
+    return response
+
+
+class CompressionMiddleware():
+    """
+    ASGI middleware that negotiates the encoding of every HTTP request, for `api_output` to compress with.
+    Responses built elsewhere are left untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not COMPRESSION:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope['headers'])
+        token = accepted_encoding.set(negotiate(headers.get(b'accept-encoding', b'').decode('latin-1')))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            accepted_encoding.reset(token)
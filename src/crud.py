@@ -1,25 +1,35 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import inspect
 
-from src.schemas import DBOutput, APIOutput, CRUDSelectInput, CRUDDeleteInput, CRUDInsertInput, CRUDUpdateInput, SuccessMessages
-from src.methods import api_output, append_userstamps, append_timestamps
+from src.schemas import DBOutput, APIOutput, CRUDSelectInput, CRUDDeleteInput, CRUDInsertInput, CRUDUpdateInput, CRUDBatchInput, SuccessMessages
+from src.methods import api_output, job_output, conditional_output, append_userstamps, append_timestamps
 from src.auth import validate_session
-from src.start import db
+from src.start import db, jobs
 from src.models import TABLE_MAP, SimpleQuery
-from src.queries import QUERY_MAP
+from src.queries import QUERY_MAP, INCLUDE_MAP, with_includes
+from src.validation import validate_records
+from src.cache import query_cache
+from src.orm import read_tables
+from src.startup import lazy_import
+
+pd = lazy_import('pandas')
 
 
 crud_router = APIRouter()
+INSERT_CHUNK_SIZE = 1000
 
 
 @crud_router.post("/crud/insert")
-async def crud_insert(input: CRUDInsertInput, id_user: str = Depends(validate_session)) -> APIOutput:
+async def crud_insert(input: CRUDInsertInput, background: bool = False, id_user: str = Depends(validate_session)) -> APIOutput:
     """
-    Inserts data into the specified table.
+    Inserts data into the specified table. Large payloads may be sent to the background with
+    `?background=true`, in which case the response carries the ID of the job.
 
     <h3>Args:</h3>
         <ul>
         <li>table_name (str): The name of the table to insert data into.</li>
         <li>body (dict): Data in the form of a list of dictionaries.</li>
+        <li>background (bool): Whether to run the insert as a background job.</li>
         </ul>
 
     <h3>Returns:</h3>
@@ -27,28 +37,40 @@ async def crud_insert(input: CRUDInsertInput, id_user: str = Depends(validate_se
         <li>JSONResponse: The JSON response containing the inserted data and a message.</li>
         </ul>
     """
-    table_cls = TABLE_MAP.get(input.table_name)
+    if input.table_name not in TABLE_MAP:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={'message': f'Table <{input.table_name}> cannot be written to.'})
+
+    table_cls = TABLE_MAP.get(input.table_name).cls
     
     messages = SuccessMessages(
         client=f"Successfuly submited to {input.table_name.capitalize()}."
         , logger=f"Insert in <{input.table_name.capitalize()}> was successful. Data: {input.data}"
     )
 
-    append_timestamps(input.data)
-    append_userstamps(input.data, id_user)
+    append_timestamps(table_cls, input.data)
+    append_userstamps(table_cls, input.data, id_user)
+    validate_records(table_cls, input.data)
     
-    @api_output
-    @db.catching(messages=messages)
     def crud__insert(table_cls, data) -> DBOutput:
-        return db.insert(table_cls, data)
-    
-    return crud__insert(table_cls, input.data)
+        results = []
+        for start in range(0, len(data), INSERT_CHUNK_SIZE):
+            results.append(db.insert(table_cls, data[start:start + INSERT_CHUNK_SIZE]))
+            jobs.progress(min(start + INSERT_CHUNK_SIZE, len(data)), len(data))
+
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+    if background:
+        id_job = jobs.submit('crud__insert', crud__insert, table_cls, input.data, id_user=id_user, messages=messages)
+        return job_output(id_job)
+
+    return api_output(db.catching(messages=messages)(crud__insert))(table_cls, input.data)
 
 
 @crud_router.post("/crud/select", dependencies=[Depends(validate_session)])
-async def crud_select(input: CRUDSelectInput) -> APIOutput:
+async def crud_select(input: CRUDSelectInput, if_none_match: str = Header(None)) -> APIOutput:
     """
-    Selects data from a specified table in the database based on the provided filters.
+    Selects data from a specified table in the database based on the provided filters. Responses carry
+    an ETag; sending it back in `If-None-Match` yields a 304 while none of the tables read were written.
 
     The parameters should be formatted as follows:
     <pre>
@@ -78,16 +100,21 @@ async def crud_select(input: CRUDSelectInput) -> APIOutput:
 
     In case of no filters, simply omit the "filters" key.
 
+    Resources and tasks accept `"include": ["skills", "keywords"]`, which adds their skills and keywords to
+    every row as JSON arrays, aggregated by the database in the same query.
+
     <h3>Args:</h3>
         <ul>
         <li>response (Response): The response object.</li>
         <li>table_name (str): The name of the table to select data from.</li>
         <li>data (dict): The request body containing the filters and other parameters.</li>
+        <li>include (set[str]): The related rows to add to each row.</li>
+        <li>if_none_match (str): The ETag of a previous response.</li>
         </ul>
         
     <h3>Returns:</h3>
         <ul>
-        <li>JSONResponse: The response containing the selected data and a message.</li>
+        <li>JSONResponse: The response containing the selected data and a message, or an empty 304.</li>
         </ul>
     """
 
@@ -101,23 +128,37 @@ async def crud_select(input: CRUDSelectInput) -> APIOutput:
         else:
             statement = complex_query.statement(**input.lambda_kwargs)
 
+    if input.include:
+        if input.table_name not in INCLUDE_MAP:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Table <{input.table_name}> does not support includes.')
+        statement = with_includes(statement, input.table_name, input.include)
+
     messages = SuccessMessages(
         client=f"{simple_query.name} retrieved." if simple_query.cls else f"{complex_query.name} retrieved."
         , logger=f"Querying <{input.table_name}> was succesful! Filters: {input.filters}"
     )
 
+    key = [input.table_name, input.filters.dict(), input.lambda_kwargs, sorted(input.include)]
+    tables = read_tables(simple_query.cls, statement)
+
     @api_output
     @db.catching(messages=messages)
     def crud__select(table_cls, statement, filters):
-        return db.query(table_cls=table_cls, statement=statement, filters=filters)
+        return query_cache.fetch(
+            key=key
+            , tables=tables
+            , load=lambda: db.query(table_cls=table_cls, statement=statement, filters=filters, primary=query_cache.enabled)
+        )
 
-    return crud__select(simple_query.cls, statement, input.filters)
+    etag = query_cache.etag(key, tables) # reason: taken before the query, which then reads the primary, so a concurrent write can only make it stale, never too fresh
+    return conditional_output(etag, if_none_match, lambda: crud__select(simple_query.cls, statement, input.filters))
 
 
 @crud_router.put("/crud/update")
 async def crud_update(input: CRUDUpdateInput, id_user: str = Depends(validate_session)) -> APIOutput:
     """
-    Update a record in the specified table.
+    Update a record in the specified table. If the record carries its `version`, the update
+    is rejected when another user changed the record in the meantime.
 
     <h3>Args:</h3>
         <ul>
@@ -130,14 +171,18 @@ async def crud_update(input: CRUDUpdateInput, id_user: str = Depends(validate_se
         <li>JSONResponse: The JSON response containing the updated data and message.</li>
         </ul>
     """
-    table_cls = TABLE_MAP.get(input.table_name)
+    if input.table_name not in TABLE_MAP:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={'message': f'Table <{input.table_name}> cannot be written to.'})
+
+    table_cls = TABLE_MAP.get(input.table_name).cls
 
     messages = SuccessMessages(
         client=f"{input.table_name.capitalize()} updated."
         , logger=f"Update in {input.table_name.capitalize()} was successful. Data: {input.data}"
     )
 
-    append_userstamps(input.data, id_user, created_by=False, updated_by=True)
+    append_timestamps(table_cls, input.data)
+    append_userstamps(table_cls, input.data, id_user)
 
     @api_output
     @db.catching(messages=messages)
@@ -169,18 +214,102 @@ async def crud_delete(input: CRUDDeleteInput) -> APIOutput:
         <li>JSONResponse: The JSON response containing the deleted data and a message.</li>
         </ul>
     """
-    table_cls = TABLE_MAP.get(input.table_name)
+    if input.table_name not in TABLE_MAP:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={'message': f'Table <{input.table_name}> cannot be written to.'})
+
+    table_cls = TABLE_MAP.get(input.table_name).cls
 
     messages = SuccessMessages(
         client=f"{input.table_name.capitalize()} deleted."
         , logger=f"Delete in {input.table_name.capitalize()} was successful. Filters: {input.filters}"
     )
 
-    input.filters.not_like_['created_by'] = ['system'] # reason: system created data should not be deleted
+    if 'created_by' in table_cls.__table__.columns:
+        input.filters.not_like_['created_by'] = ['system'] # reason: system created data should not be deleted
 
     @api_output
     @db.catching(messages=messages)
     def crud__delete(table_cls, filters):
         return db.delete(table_cls, filters)
     
-    return crud__delete(table_cls, input.filters)
\ No newline at end of file
+    return crud__delete(table_cls, input.filters)
+
+
+@crud_router.post("/crud/batch")
+async def crud_batch(input: CRUDBatchInput, id_user: str = Depends(validate_session)) -> APIOutput:
+    """
+    Runs an ordered list of inserts, updates and deletes in a single transaction: either every operation
+    is applied or none is. Each operation follows the rules of its own endpoint and is written as
+    <pre>
+    <code>
+    {
+        "operations": [
+            {"operation": "insert", "table_name": "tsys_categories", "data": [{"name": "Welding", "description": "Joining metals", "reference": "skills"}]},
+            {"operation": "update", "table_name": "tsys_categories", "data": {"id": 1, "name": "Cutting"}},
+            {"operation": "delete", "table_name": "tprod_producttags", "filters": {"and_": {"id": [2, 3]}}}
+        ]
+    }
+    </code>
+    </pre>
+
+    <h3>Returns:</h3>
+        <ul>
+        <li>JSONResponse: One entry per operation, in order, with the amount of rows written and their primary keys.</li>
+        </ul>
+    """
+    messages = SuccessMessages(
+        client=f"{len(input.operations)} operations applied."
+        , logger=f"Batch of {len(input.operations)} operations was successful. Tables: {sorted({operation.table_name for operation in input.operations})}"
+    )
+
+    for position, operation in enumerate(input.operations):
+        if operation.table_name not in TABLE_MAP:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={'message': f'Table <{operation.table_name}> cannot be written in batches.', 'operation': position})
+
+        table_cls = TABLE_MAP.get(operation.table_name).cls
+
+        if operation.operation == 'insert':
+            append_timestamps(table_cls, operation.data)
+            append_userstamps(table_cls, operation.data, id_user)
+            try:
+                validate_records(table_cls, operation.data)
+            except HTTPException as e: # reason: the client must know which operation carried the invalid rows
+                raise HTTPException(status_code=e.status_code, detail={**e.detail, 'operation': position})
+
+        elif operation.operation == 'update':
+            append_timestamps(table_cls, operation.data)
+            append_userstamps(table_cls, operation.data, id_user)
+
+        elif operation.filters is None: # reason: an unfiltered delete would empty the table
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={'message': 'Delete operations require filters.', 'operation': position})
+
+        elif 'created_by' in table_cls.__table__.columns:
+            operation.filters.not_like_['created_by'] = ['system'] # reason: system created data should not be deleted
+
+    @api_output
+    @db.catching(messages=messages)
+    def crud__batch(operations):
+        results = []
+        for operation in operations:
+            table_cls = TABLE_MAP.get(operation.table_name).cls
+
+            if operation.operation == 'insert':
+                df = db.insert(table_cls, operation.data) if operation.data else pd.DataFrame()
+            elif operation.operation == 'update':
+                df = db.update(table_cls, [operation.data])
+            else:
+                df = db.delete(table_cls, operation.filters)
+
+            pk_columns = [column.name for column in inspect(table_cls).primary_key]
+            if df.empty:
+                ids = []
+            elif len(pk_columns) == 1:
+                ids = df[pk_columns[0]].tolist()
+            else:
+                ids = df[pk_columns].to_dict(orient='records')
+
+            results.append({'operation': operation.operation, 'table_name': operation.table_name, 'count': len(df), 'ids': ids})
+
+        return pd.DataFrame(results, columns=['operation', 'table_name', 'count', 'ids'])
+
+    return crud__batch(input.operations)
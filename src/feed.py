@@ -0,0 +1,241 @@
+# This area is meant for pushing table changes to clients, so that they do not have to poll `/crud/select`.
+# Writes made through DBManager issue a NOTIFY on commit with the table, operation and primary keys of the
+# rows written (see `DBManager.notify_channel`). Each worker runs a single listener, started with its first
+# subscriber, which fans the notifications out to the clients subscribed to those tables through SSE or
+# WebSockets. A `resync` event means changes may have been missed, e.g. after the listener reconnected or
+# because the client fell behind, and clients should then reload the tables they follow.
+from fastapi import APIRouter, HTTPException, WebSocket, Response, Depends
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+
+from src.auth import validate_session
+from src.models import TABLE_MAP
+from src.start import db, logger
+
+from logging import Logger
+from typing import Optional
+
+import asyncio
+import json
+import os
+
+
+FEED_QUEUE_SIZE = int(os.getenv('FEED_QUEUE_SIZE', 1000))
+FEED_KEEPALIVE_INTERVAL = float(os.getenv('FEED_KEEPALIVE_INTERVAL', 25))
+FEED_RECONNECT_INTERVAL = float(os.getenv('FEED_RECONNECT_INTERVAL', 5))
+
+RESYNC = {'table': None, 'operation': 'resync', 'primary_key': None, 'ids': None}
+
+
+class ChangeFeed():
+    """
+    Listens to the notifications of DBManager writes and fans them out to subscribers.
+
+    Args:
+        - db (DBManager): The manager whose writes are followed. Its engine provides the listening connection.
+        - logger (Logger): The logger object for logging.
+        - queue_size (int, optional): The amount of changes buffered per subscriber before it is told to resync.
+
+    Methods:
+        - subscribe: Returns a queue receiving the changes of a set of tables.
+        - unsubscribe: Stops delivering changes to a queue.
+        - publish: Delivers a change to the subscribers of its table.
+        - stop: Stops the listener.
+    """
+
+    def __init__(self, db, logger: Logger, queue_size: int = FEED_QUEUE_SIZE):
+        self.db = db
+        self.logger = logger
+        self.queue_size = queue_size
+        self.subscribers: dict[asyncio.Queue, set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.db.notify_channel is not None
+
+
+    def subscribe(self, tables: set[str]) -> asyncio.Queue:
+        """
+        Args:
+            - tables (set[str]): The tables to follow. An empty set follows every table.
+
+        Returns:
+            - asyncio.Queue: Receives the changes as dictionaries with the table, operation, primary key columns and
+            ids of the rows written. Ids are None when the rows are unknown and the whole table should be reloaded.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[queue] = tables
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(), name='change-feed')
+
+        return queue
+
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+
+
+    def publish(self, change: dict):
+        for queue, tables in list(self.subscribers.items()):
+            if change['table'] is not None and tables and change['table'] not in tables:
+                continue
+
+            try:
+                queue.put_nowait(change)
+            except asyncio.QueueFull: # reason: a slow client must not hold the others back, it reloads instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+    def _connect(self):
+        connection = self.db.engine.raw_connection()
+        connection.detach() # reason: the listening connection is held for as long as there are subscribers, outside of the pool
+
+        driver_connection = connection.driver_connection
+        driver_connection.autocommit = True
+        with driver_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.db.notify_channel}')
+
+        return connection
+
+
+    async def _listen(self):
+        """
+        Holds a connection listening to the channel while there are subscribers, reconnecting when it breaks.
+        """
+        loop = asyncio.get_running_loop()
+
+        while self.subscribers:
+            connection = None
+            try:
+                connection = await run_in_threadpool(self._connect)
+                driver_connection = connection.driver_connection
+                fileno = driver_connection.fileno()
+                broken = asyncio.Event()
+
+                def on_readable():
+                    try:
+                        driver_connection.poll()
+                    except Exception as e:
+                        self.logger.error(f"Change feed connection lost: {e}")
+                        broken.set()
+                        return
+
+                    while driver_connection.notifies:
+                        notify = driver_connection.notifies.pop(0)
+                        try:
+                            self.publish(json.loads(notify.payload))
+                        except (ValueError, KeyError):
+                            self.logger.error(f"Change feed received a malformed notification: {notify.payload}")
+
+                loop.add_reader(fileno, on_readable)
+                try:
+                    self.publish(RESYNC) # reason: changes made before LISTEN took effect were not delivered
+                    while self.subscribers and not broken.is_set():
+                        try:
+                            await asyncio.wait_for(broken.wait(), FEED_KEEPALIVE_INTERVAL)
+                        except asyncio.TimeoutError:
+                            on_readable() # reason: also detects connections closed without the socket becoming readable
+                finally:
+                    loop.remove_reader(fileno)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Change feed could not listen on <{self.db.notify_channel}>: {e}")
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+            if self.subscribers:
+                await asyncio.sleep(FEED_RECONNECT_INTERVAL)
+
+
+feed = ChangeFeed(db, logger)
+feed_router = APIRouter()
+
+
+def parse_tables(tables: Optional[str]) -> set[str]:
+    """
+    Parses a comma separated list of tables, which must be selectable through `/crud/select`.
+    """
+    if not feed.enabled:
+        raise HTTPException(status_code=503, detail="The change feed is disabled.")
+
+    names = {name.strip() for name in (tables or '').split(',') if name.strip()}
+    unknown = sorted(names - set(TABLE_MAP))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Changes cannot be followed on tables {unknown}.")
+
+    return names
+
+
+@feed_router.get('/feed/stream')
+async def stream_changes(tables: str = None, id_user: str = Depends(validate_session)):
+    """
+    Stream the changes of the given tables (comma separated, all of them by default) as server-sent events.
+    Each `change` event carries the table, operation and ids of the rows written; a `resync` event asks the
+    client to reload the tables it follows.
+    """
+    names = parse_tables(tables)
+
+    async def feed__stream_changes(names: set[str]):
+        queue = feed.subscribe(names)
+        try:
+            while True:
+                try:
+                    change = await asyncio.wait_for(queue.get(), FEED_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                event = 'resync' if change['operation'] == 'resync' else 'change'
+                yield f"event: {event}\ndata: {json.dumps(change)}\n\n"
+        finally:
+            feed.unsubscribe(queue)
+
+    return StreamingResponse(feed__stream_changes(names), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@feed_router.websocket('/feed/ws')
+async def websocket_changes(websocket: WebSocket, tables: str = None):
+    """
+    Send the changes of the given tables (comma separated, all of them by default) as JSON messages, the same
+    ones streamed by `/feed/stream`. The session cookie is validated before the connection is accepted.
+    """
+    try:
+        await run_in_threadpool(validate_session, Response(), websocket, websocket.cookies.get('jwt_s'))
+        names = parse_tables(tables)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+
+    await websocket.accept()
+    queue = feed.subscribe(names)
+
+    async def feed__forward_changes():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    forwarding = asyncio.create_task(feed__forward_changes())
+    try:
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+    finally:
+        forwarding.cancel()
+        await asyncio.gather(forwarding, return_exceptions=True)
+        feed.unsubscribe(queue)
@@ -0,0 +1,106 @@
+# This area is meant for turning WhereConditions into SQLAlchemy expressions. Expressions are compiled
+# once per filter shape (table, clauses, columns and amount of like patterns) and cached, while the
+# values travel as bound parameters. Membership lists are bound as a single array, so lists of any
+# length produce the same statement.
+from sqlalchemy import and_, or_, any_, all_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from src.schemas import WhereConditions
+
+from functools import lru_cache
+from typing import Any
+
+
+FILTER_CACHE_SIZE = 1024
+
+MEMBERSHIP_CLAUSES = ['and_', 'or_', 'not_in_']
+PATTERN_CLAUSES = ['like_', 'not_like_']
+
+
+def filter_shape(filters: WhereConditions) -> tuple:
+    """
+    Builds the hashable shape of a set of filters: the clauses and columns used and, for pattern clauses,
+    the amount of patterns per column. Values are not part of the shape.
+    """
+    shape = []
+    for clause in [*MEMBERSHIP_CLAUSES, *PATTERN_CLAUSES]:
+        columns = getattr(filters, clause) or {}
+        if not columns:
+            continue
+
+        if clause in MEMBERSHIP_CLAUSES:
+            shape.append((clause, tuple(sorted(columns))))
+        else:
+            shape.append((clause, tuple(sorted((column, len(values)) for column, values in columns.items()))))
+
+    return tuple(shape)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def compile_shape(table_cls, shape: tuple) -> tuple:
+    """
+    Compiles a filter shape into SQLAlchemy conditions with named bound parameters. Column names are validated
+    against the table's metadata.
+
+    Args:
+        - table_cls (class): The table class the filters apply to.
+        - shape (tuple): The shape built by `filter_shape`.
+
+    Returns:
+        - tuple: The conditions, in the same order as the clauses of the shape.
+    """
+    table_columns = table_cls.__table__.columns
+
+    referenced = {entry if isinstance(entry, str) else entry[0] for _, entries in shape for entry in entries}
+    unknown = sorted(column for column in referenced if column not in table_columns)
+    if unknown:
+        raise ValueError(f"Columns {unknown} do not exist in <{table_cls.__tablename__}>.")
+
+    def array_param(clause: str, column: str):
+        return bindparam(f'{clause}_{column}', type_=ARRAY(table_columns[column].type)) # reason: rendered with an explicit array cast
+
+    conditions = []
+    for clause, entries in shape:
+
+        if clause == 'and_':
+            conditions.append(and_(*[table_columns[column] == any_(array_param(clause, column)) for column in entries]))
+
+        elif clause == 'or_':
+            conditions.append(or_(*[table_columns[column] == any_(array_param(clause, column)) for column in entries]))
+
+        elif clause == 'not_in_':
+            conditions.append(and_(*[table_columns[column] != all_(array_param(clause, column)) for column in entries]))
+
+        elif clause == 'like_':
+            conditions.append(or_(*[table_columns[column].like(bindparam(f'{clause}_{column}_{i}')) for column, amount in entries for i in range(amount)]))
+
+        elif clause == 'not_like_':
+            conditions.append(and_(*[table_columns[column].notlike(bindparam(f'{clause}_{column}_{i}')) for column, amount in entries for i in range(amount)]))
+
+    return tuple(conditions)
+
+
+def compile_filters(table_cls, filters: WhereConditions) -> tuple[list, dict[str, Any]]:
+    """
+    Compiles filters into conditions and the values of their bound parameters.
+
+    Args:
+        - table_cls (class): The table class the filters apply to.
+        - filters (WhereConditions): The filters to be compiled.
+
+    Returns:
+        - tuple[list, dict]: The conditions and the parameters to be passed when executing the statement.
+    """
+    conditions = list(compile_shape(table_cls, filter_shape(filters)))
+
+    params = {}
+    for clause in MEMBERSHIP_CLAUSES:
+        for column, values in (getattr(filters, clause) or {}).items():
+            params[f'{clause}_{column}'] = list(values)
+
+    for clause in PATTERN_CLAUSES:
+        for column, values in (getattr(filters, clause) or {}).items():
+            for i, value in enumerate(values):
+                params[f'{clause}_{column}_{i}'] = value
+
+    return conditions, params
@@ -0,0 +1,122 @@
+# This area is meant for bulk imports of production data, usually done while onboarding a plant. Files
+# are read & validated in chunks, so that memory stays flat regardless of the upload size, and are loaded
+# through DBManager.copy, which relies on PostgreSQL's COPY instead of multi-row INSERT statements.
+from src.start import db, jobs
+from src.validation import validate_frame
+from src.models import TProdSkills, TProdResources, TProdTasks, TProdResourceSkills, TProdTaskSkills, TProdProductTags, TProdProducts
+from src.startup import lazy_import
+
+from typing import Iterator
+
+import datetime
+import os
+
+pd = lazy_import('pandas')
+
+
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+IMPORT_FORMATS = ['csv', 'parquet']
+
+IMPORT_MAP = {
+    'tprod_skills': TProdSkills
+    , 'tprod_resources': TProdResources
+    , 'tprod_tasks': TProdTasks
+    , 'tprod_resourceskills': TProdResourceSkills
+    , 'tprod_taskskills': TProdTaskSkills
+    , 'tprod_producttags': TProdProductTags
+    , 'tprod_products': TProdProducts
+}
+
+
+def read_chunks(path: str, format: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> 'Iterator[pd.DataFrame]':
+    """
+    Reads a CSV or Parquet file in chunks of `chunk_size` rows. Parquet support depends on `pyarrow`.
+
+    Args:
+        - path (str): The path of the file.
+        - format (str): Either `csv` or `parquet`.
+        - chunk_size (int, optional): The amount of rows per chunk.
+
+    Returns:
+        - Iterator[pd.DataFrame]: The chunks of the file.
+    """
+    if format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[''])
+
+    elif format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet imports require the pyarrow package.")
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    else:
+        raise ValueError(f"Format <{format}> is not supported. Use one of: {', '.join(IMPORT_FORMATS)}.")
+
+
+def import_file(table_cls, path: str, format: str, id_user: str, dry_run: bool = False) -> dict:
+    """
+    Validates and loads a file into the specified table. Meant to be executed inside `DBManager.catching`, either
+    inline or as a background job. The file is validated in a first pass and nothing is written if any row is
+    invalid; otherwise it is read again and loaded in a single transaction. In `dry_run` mode the load is
+    performed and then rolled back, which also surfaces database constraint violations.
+
+    Args:
+        - table_cls (class): The table class to load data into.
+        - path (str): The path of the uploaded file.
+        - format (str): Either `csv` or `parquet`.
+        - id_user (str): The user responsible for the import.
+        - dry_run (bool, optional): Whether to roll back after loading.
+
+    Returns:
+        - dict: A report with the amount of rows read, imported and the errors of the invalid rows.
+    """
+    table_columns = [column.name for column in table_cls.__table__.columns]
+    report = {'table': table_cls.__tablename__, 'rows': 0, 'imported': 0, 'dry_run': dry_run, 'errors': []}
+
+    now = datetime.datetime.utcnow()
+    stamps = {
+        column: value for column, value in
+        {'created_by': id_user, 'updated_by': id_user, 'created_at': now, 'updated_at': now}.items()
+        if column in table_columns
+    }
+
+    def stamped_chunks():
+        for df in read_chunks(path, format):
+            unknown = [col for col in df.columns if col not in table_columns]
+            if unknown:
+                raise KeyError(f"Columns {unknown} do not belong to <{table_cls.__tablename__}>.")
+
+            yield df.assign(**stamps)
+
+    # 1) validate
+    columns = []
+    for df in stamped_chunks():
+        errors = validate_frame(table_cls, df, report['rows'])
+
+        report['rows'] += len(df)
+        report['errors'].extend(errors[:IMPORT_MAX_ERRORS - len(report['errors'])])
+        columns = list(df.columns)
+        jobs.progress(report['rows'])
+
+    if report['errors'] or not report['rows']:
+        return report
+
+    # 2) load
+    def loaded_chunks():
+        loaded = 0
+        for df in stamped_chunks():
+            yield df
+
+            loaded += len(df)
+            jobs.progress(report['rows'] + loaded, report['rows'] * 2)
+
+    report['imported'] = db.copy(table_cls, loaded_chunks(), columns)
+
+    if dry_run:
+        db.session.rollback()
+
+    return report
@@ -0,0 +1,137 @@
+from sqlalchemy import insert, update
+
+from src.orm import DBManager
+from src.models import TSysJobs
+from src.schemas import APIOutput, SuccessMessages
+
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exc
+from typing import Callable
+from logging import Logger
+
+import threading
+import json
+import datetime
+import uuid
+import time
+
+
+class JobManager():
+    """
+    An in-process job queue meant for long-running operations. Jobs are executed by a bounded pool of worker threads,
+    so batch work never occupies the event loop, and their status & progress are persisted in `tsys_jobs` so that
+    clients can poll them. Each job runs inside `DBManager.catching`, which means failures are mapped exactly like
+    they would be in a regular request.
+
+    Args:
+        - db (DBManager): The database manager used by the jobs.
+        - logger (Logger): The logger object for logging.
+        - max_workers (int): The size of the worker pool.
+        - progress_interval (float): Minimum amount of seconds between two progress writes of the same job.
+
+    Methods:
+        - submit: Queues a function and returns the ID of its job.
+        - progress: Reports the progress of the job running in the current thread, if any.
+        - shutdown: Stops accepting jobs and waits for the running ones.
+    """
+
+    def __init__(self, db: DBManager, logger: Logger, max_workers: int = 2, progress_interval: float = 0.5):
+        self.db = db
+        self.logger = logger
+        self.progress_interval = progress_interval
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._local = threading.local()
+
+
+    def _persist(self, id_job: str, **values):
+        """
+        Writes the job state in its own short transaction, so that it is visible while the job's transaction is open.
+        """
+        values['updated_at'] = datetime.datetime.utcnow()
+        statement = update(TSysJobs).where(TSysJobs.id == id_job).values(**values)
+
+        with self.db.engine.begin() as connection:
+            connection.execute(statement)
+
+
+    def _run(self, id_job: str, func: Callable, args: tuple, kwargs: dict, messages: SuccessMessages):
+        """
+        Executes the job function in a worker thread and persists its outcome.
+        """
+        self._local.id_job = id_job
+        self._local.last_progress = 0.0
+
+        try:
+            self._persist(id_job, status='running')
+
+            data, status, message = self.db.catching(messages=messages)(func)(*args, **kwargs)
+            output = APIOutput(data=data, message=message)
+
+            self._persist(
+                id_job
+                , status='finished' if status < 400 else 'failed'
+                , status_code=status
+                , message=output.message
+                , result=output.data if isinstance(output.data, str) else json.dumps(output.data)
+            )
+        except Exception as e:
+            self.logger.error(f"Job <{id_job}> could not be completed.\nMessage:\n\n {e}.\nTraceback:\n{format_exc()}")
+            self._persist(id_job, status='failed', status_code=500, message="Internal server error.")
+        finally:
+            self._local.id_job = None
+            self.db.session.remove() # reason: release the thread-local session back to the pool
+
+
+    def submit(self, name: str, func: Callable, *args, id_user: str = None, messages: SuccessMessages = None, **kwargs) -> str:
+        """
+        Queues `func` for execution in the worker pool.
+
+        Args:
+            - name (str): A readable name for the job, usually the name of the router function.
+            - func (Callable): The function to be executed. It must return the content of a `DBOutput`.
+            - id_user (str, optional): The user that requested the job.
+            - messages (SuccessMessages, optional): The messages used by `DBManager.catching` in case of success.
+
+        Returns:
+            - str: The ID of the job.
+        """
+        id_job = str(uuid.uuid4())
+
+        statement = insert(TSysJobs).values(id=id_job, name=name, status='queued', created_by=id_user)
+        with self.db.engine.begin() as connection:
+            connection.execute(statement)
+
+        self.executor.submit(self._run, id_job, func, args, kwargs, messages)
+        self.logger.info(f"Job <{id_job}> ({name}) was queued.")
+
+        return id_job
+
+
+    def progress(self, done: int, total: int = None):
+        """
+        Reports the progress of the job running in the current thread. Writes are throttled by `progress_interval`,
+        except for the last step. Does nothing when called outside of a job, so functions can be shared between
+        inline and background execution.
+
+        Args:
+            - done (int): The amount of work units done.
+            - total (int, optional): The total amount of work units.
+        """
+        id_job = getattr(self._local, 'id_job', None)
+        if not id_job:
+            return
+
+        now = time.monotonic()
+        if now - self._local.last_progress < self.progress_interval and done != total:
+            return
+
+        self._local.last_progress = now
+        self._persist(id_job, progress=done, **({'total': total} if total is not None else {}))
+
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops accepting new jobs and optionally waits for the running ones.
+        """
+        self.executor.shutdown(wait=wait)
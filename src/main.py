@@ -1,7 +1,10 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 
+import threading
 import uvicorn
 import sys
 import os
@@ -10,16 +13,57 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from src.crud import crud_router     # reason: uncomment when developing or testing locally
-from src.auth import auth_router
-from src.routes.tsys import tsys_router
-from src.routes.tprod import tprod_router
+from src.startup import step, steps, STARTUP_MODE, LAZY_STARTUP
 
-app = FastAPI()
+with step('routers'):
+    from src.crud import crud_router     # reason: uncomment when developing or testing locally
+    from src.auth import auth_router
+    from src.routes.tsys import tsys_router
+    from src.routes.tprod import tprod_router
+    from src.admin import admin_router
+    from src.feed import feed_router, feed
+
+from src.metrics import MetricsMiddleware, registry, render_gauge
+from src.profiling import ProfilingMiddleware
+from src.compression import CompressionMiddleware
+from src.start import db, jobs, views, logger
+from src.oauth import oauth
+from src.auth import validate_admin
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warms the connection pool on startup, in the background when in the lazy startup mode so that the worker
+    answers right away, and releases jobs, the change feed, the OAuth client and connections on shutdown. Pending
+    refreshes of materialized views are run before the connections are closed.
+    """
+    if LAZY_STARTUP:
+        threading.Thread(target=db.warmup, name='pool-warmup', daemon=True).start()
+    else:
+        with step('pool warmup'):
+            await run_in_threadpool(db.warmup)
+
+    logger.info(f"Startup ({STARTUP_MODE} mode): {', '.join(f'{name} {seconds:.3f}s' for name, seconds in steps.items())}.")
+
+    yield
+
+    await feed.stop()
+    await oauth.close()
+    jobs.shutdown(wait=True)
+    views.stop()
+    db.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware( # necessary to allow requests from local services
     CORSMiddleware,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+    expose_headers=["ETag"],
     allow_origins=['http://localhost:5173'],
     allow_credentials=True,
 )
@@ -28,11 +72,22 @@ app.include_router(crud_router)
 app.include_router(auth_router)
 app.include_router(tsys_router)
 app.include_router(tprod_router)
+app.include_router(admin_router)
+app.include_router(feed_router)
+
+
+registry.register_finish_hook(db.log_request_summary)
+registry.register_collector(lambda: render_gauge('api_db_pool_connections', 'Connections of the database pool, by state.', 'state', db.pool_stats()))
 
 
 @app.get('/health')
 async def azuretest():
     return JSONResponse(status_code=200, content={"message": "healthy."})
 
+
+@app.get('/metrics', dependencies=[Depends(validate_admin)])
+async def metrics():
+    return Response(content=registry.render(), media_type='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     uvicorn.run('main:app', reload=True, reload_dirs=['app'], port=8000)
@@ -1,25 +1,26 @@
 from fastapi import Response
 from fastapi.responses import JSONResponse
 from sqlalchemy import inspect
-from sqlalchemy.orm.exc import StaleDataError
 
-from src.schemas import APIOutput, WhereConditions
-from src.start import db
+from src.schemas import APIOutput
+from src.metrics import phase
+from src.compression import compress_response
+from src.startup import lazy_import
 
-from typing import List, Union
+from typing import List, Union, Callable
 from functools import wraps
-from collections import namedtuple
 
-import pandas as pd
 import datetime
-import json
+
+pd = lazy_import('pandas')
 
 
 # Decorators
 def api_output(func):
     """
     Expects a DBOutput for `func` return value. This decorator uses APIOutput 
-    to validate and parse the data. Afterwards, the data is fit it into a JSONResponse.
+    to validate and parse the data. Afterwards, the data is fit it into a JSONResponse,
+    compressed if the client accepts it and the body is large enough.
     """
 
     @wraps(func)
@@ -30,12 +31,54 @@ def api_output(func):
         if status in [204, 304]:
             return Response(status_code=status, headers={'message': output.message})
 
-        return JSONResponse(status_code=status, content={'data': output.data, 'message': output.message})
+        with phase('serialization'):
+            response = JSONResponse(status_code=status, content={'data': output.data, 'message': output.message})
+
+        return compress_response(response)
     return wrapper
 
 
+def conditional_output(etag: str, if_none_match: str, build: Callable[[], Response]) -> Response:
+    """
+    Answers a conditional read. When `if_none_match` carries `etag`, the client already holds the current
+    representation and a 304 is returned without calling `build`. Otherwise, `build` produces the response
+    and successful ones are tagged with `etag`.
+
+    Args:
+        - etag (str): The current entity tag of the response, None if ETags are disabled.
+        - if_none_match (str): The If-None-Match header of the request.
+        - build (Callable): Builds the full response, usually a function decorated with `api_output`.
+
+    Returns:
+        - Response: Either a 304 or the response of `build`.
+    """
+    if etag is None:
+        return build()
+
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if if_none_match:
+        candidates = [candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')]
+        if '*' in candidates or etag.removeprefix('W/') in candidates: # reason: If-None-Match uses the weak comparison
+            return Response(status_code=304, headers={**headers, 'message': 'Unchanged state.'})
+
+    response = build()
+    if response.status_code == 200:
+        response.headers.update(headers)
+
+    return response
+
+
+def job_output(id_job: str):
+    """
+    Builds the response of an operation that was sent to the background. Clients are expected to
+    poll `/tsys/jobs/{id_job}` or stream `/tsys/jobs/{id_job}/stream` to follow its progress.
+    """
+    output = APIOutput(data={'id': id_job}, message='Operation queued.')
+    return JSONResponse(status_code=202, content={'data': output.data, 'message': output.message})
+
+
 # CRUD
-def append_userstamps(table_cls, data: Union[List[dict], dict, pd.DataFrame], id_user: str) -> list[dict]:
+def append_userstamps(table_cls, data: 'Union[List[dict], dict, pd.DataFrame]', id_user: str) -> list[dict]:
     """
     Appends the user ID to the data.
     """
@@ -74,7 +117,7 @@ def append_userstamps(table_cls, data: Union[List[dict], dict, pd.DataFrame], id
         raise TypeError(f"Could not append userstamps. Current data type {type(data)} is not supported.")
 
 
-def append_timestamps(table_cls, data: Union[List[dict], dict, pd.DataFrame]) -> list[dict]:
+def append_timestamps(table_cls, data: 'Union[List[dict], dict, pd.DataFrame]') -> list[dict]:
     """
     Appends the current timestamp to the data.
     """
@@ -111,22 +154,8 @@ def append_timestamps(table_cls, data: Union[List[dict], dict, pd.DataFrame]) ->
     return data
 
 
-# Verifications
-def check_stale_data(table_cls, filters: WhereConditions, reference: str) -> pd.DataFrame:
-    """
-    Check if the data is stale.
-    """
-    curr_data = db.query(table_cls, None, filters)
-
-    is_greater = (curr_data['updated_at'] > reference).any()
-    if is_greater:
-        raise StaleDataError("This data has been updated by another user. Please refresh the page and try again.")
-
-    return curr_data   
-
-
 # Dataframe state comparison
-def find_common(df1: pd.DataFrame, df2: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+def find_common(df1: 'pd.DataFrame', df2: 'pd.DataFrame', cols: list[str]) -> 'pd.DataFrame':
     """
     Finds the common rows between two dataframes by comparing the values of the specified columns.
 
@@ -145,7 +174,7 @@ def find_common(df1: pd.DataFrame, df2: pd.DataFrame, cols: list[str]) -> pd.Dat
     return df
 
 
-def find_missing(df1: pd.DataFrame, df2: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+def find_missing(df1: 'pd.DataFrame', df2: 'pd.DataFrame', cols: list[str]) -> 'pd.DataFrame':
     """
     Finds the missing rows between two dataframes by comparing the values of the specified columns.
 
@@ -164,7 +193,7 @@ def find_missing(df1: pd.DataFrame, df2: pd.DataFrame, cols: list[str]) -> pd.Da
     return df
 
 
-def find_new(df1: pd.DataFrame, df2: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+def find_new(df1: 'pd.DataFrame', df2: 'pd.DataFrame', cols: list[str]) -> 'pd.DataFrame':
     """
     Finds the new rows between two dataframes by comparing the values of the specified columns.
 
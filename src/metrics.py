@@ -0,0 +1,245 @@
+# This area is meant for request-level performance instrumentation. A RequestMetrics object travels
+# with each request through a context variable, so that any layer (auth, DBManager, serialization)
+# can attribute time to a phase without receiving it as an argument. Everything is aggregated in an
+# in-process registry and exposed in Prometheus' text format.
+from contextvars import ContextVar
+from contextlib import contextmanager
+from collections import defaultdict
+from functools import wraps
+from typing import Callable
+
+import threading
+import bisect
+import time
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram():
+    """
+    A Prometheus histogram with a fixed set of buckets, keyed by label values.
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series = defaultdict(lambda: [[0] * len(buckets), 0.0, 0])
+
+    def observe(self, value: float, *label_values):
+        counts, _, _ = series = self.series[label_values]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(self.series.items()):
+            labels = ','.join(f'{key}="{value}"' for key, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter():
+    """
+    A Prometheus counter keyed by label values.
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series = defaultdict(float)
+
+    def inc(self, *label_values, amount: float = 1):
+        self.series[label_values] += amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.series.items()):
+            labels = ','.join(f'{key}="{value}"' for key, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+def render_gauge(name: str, description: str, label: str, values: dict) -> list[str]:
+    """
+    Renders a gauge whose values are read on demand, for use by collectors.
+    """
+    lines = [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+    lines.extend(f'{name}{{{label}="{key}"}} {value}' for key, value in values.items())
+    return lines
+
+
+class MetricsRegistry():
+    """
+    Holds every metric of the process and the collectors of gauges that are read on demand (pool stats and such).
+
+    Methods:
+        - record_request: Aggregates the metrics of a finished request.
+        - register_collector: Registers a function that returns gauge values at render time.
+        - register_finish_hook: Registers a function called with the metrics and route of every finished request.
+        - render: Renders every metric in Prometheus' text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collectors: list[Callable[[], list[str]]] = []
+        self.finish_hooks: list[Callable[['RequestMetrics', str], None]] = []
+
+        self.requests = Counter('api_requests_total', 'Requests handled, by route, method and status.', ('route', 'method', 'status'))
+        self.duration = Histogram('api_request_duration_seconds', 'Wall time of requests.', ('route',), DURATION_BUCKETS)
+        self.phases = Histogram('api_request_phase_seconds', 'Wall time of requests spent per phase.', ('route', 'phase'), DURATION_BUCKETS)
+        self.queries = Histogram('api_request_queries', 'Statements executed per request.', ('route',), COUNT_BUCKETS)
+        self.request_size = Histogram('api_request_size_bytes', 'Size of request bodies.', ('route',), SIZE_BUCKETS)
+        self.response_size = Histogram('api_response_size_bytes', 'Size of response bodies.', ('route',), SIZE_BUCKETS)
+
+    def record_request(self, request_metrics: 'RequestMetrics', route: str, method: str, status: int, duration: float):
+        with self.lock:
+            self.requests.inc(route, method, str(status))
+            self.duration.observe(duration, route)
+            self.queries.observe(request_metrics.queries, route)
+            self.request_size.observe(request_metrics.request_size, route)
+            self.response_size.observe(request_metrics.response_size, route)
+            for phase, elapsed in request_metrics.phases.items():
+                self.phases.observe(elapsed, route, phase)
+
+    def register_collector(self, collector: Callable[[], list[str]]):
+        self.collectors.append(collector)
+
+    def register_finish_hook(self, hook: Callable[['RequestMetrics', str], None]):
+        self.finish_hooks.append(hook)
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = [self.requests, self.duration, self.phases, self.queries, self.request_size, self.response_size]
+            lines = [line for metric in metrics for line in metric.render()]
+
+        for collector in self.collectors:
+            lines.extend(collector())
+
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics():
+    """
+    The metrics of a single request. Phases are measured independently and may overlap, e.g. the database
+    time spent validating a session also counts as `auth`. `read_primary` is set once the request commits a
+    write, so that its later reads are not routed to a replica that may lag behind.
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.active = set()
+        self.queries = 0
+        self.statements = {}
+        self.request_size = 0
+        self.response_size = 0
+        self.read_primary = False
+
+
+registry = MetricsRegistry()
+current_request: ContextVar[RequestMetrics | None] = ContextVar('current_request', default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Attributes the wall time of the block to a phase of the current request. Nested blocks of the same phase
+    are only counted once. Does nothing outside of a request.
+    """
+    request_metrics = current_request.get()
+    if request_metrics is None or name in request_metrics.active:
+        yield
+        return
+
+    request_metrics.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.phases[name] += time.perf_counter() - start
+        request_metrics.active.discard(name)
+
+
+def timed(name: str):
+    """
+    Decorator version of `phase`.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_query(elapsed: float, shape: str = None):
+    """
+    Counts a statement and its execution time for the current request, grouped by statement shape.
+    """
+    request_metrics = current_request.get()
+    if request_metrics is not None:
+        request_metrics.queries += 1
+        request_metrics.phases['db'] += elapsed
+
+        if shape is not None:
+            stats = request_metrics.statements.setdefault(shape, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+class MetricsMiddleware():
+    """
+    ASGI middleware that opens a `RequestMetrics` for every HTTP request and records it once the response is sent.
+    Routes are labeled by their path template, so path parameters do not create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        start = time.perf_counter()
+        status = 500
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request':
+                request_metrics.request_size += len(message.get('body', b''))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                request_metrics.response_size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            route = getattr(scope.get('route'), 'path', '<unmatched>')
+            registry.record_request(request_metrics, route, scope['method'], status, time.perf_counter() - start)
+            current_request.reset(token)
+
+            for hook in registry.finish_hooks:
+                hook(request_metrics, route)
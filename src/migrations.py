@@ -0,0 +1,209 @@
+# This area is meant for evolving the schema of existing databases. Every change to the schema is a numbered
+# SQL file in migrations/ (e.g. `0001_lookup_indexes.sql`), applied once and in order, and recorded in
+# `tsys_migrations` along with its checksum. Files starting with the line `-- migrate:no-transaction` run
+# statement by statement outside of a transaction, as required by `CREATE INDEX CONCURRENTLY`.
+#
+# setup.sql always holds the current schema, migrations included, so fresh databases are created from it and
+# older ones are brought to it by the migrations. Both then run the same migrations, which is why each of them
+# must be idempotent (`IF NOT EXISTS`): on a fresh database they find their changes already made and are only
+# recorded as applied.
+#
+# Usage:
+#   python -m src.migrations status
+#   python -m src.migrations upgrade
+#   python -m src.migrations upgrade --target 3
+from sqlalchemy import text
+
+from collections import namedtuple
+from logging import Logger
+from typing import List
+
+import argparse
+import hashlib
+import sys
+import os
+import re
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+NO_TRANSACTION = '-- migrate:no-transaction'
+MIGRATION_LOCK_ID = 727_001 # reason: an arbitrary advisory lock key, held so that concurrent deploys do not apply migrations twice
+
+Migration = namedtuple('Migration', ['version', 'name', 'path', 'checksum', 'transactional'])
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Lists the migrations of a directory, ordered by version. Files that do not follow the naming scheme are ignored.
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Migrations <{migrations[version].name}> and <{match.group(2)}> share version {version}.")
+
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as file:
+            content = file.read()
+
+        migrations[version] = Migration(
+            version
+            , match.group(2)
+            , path
+            , hashlib.sha256(content).hexdigest()
+            , not content.decode('utf-8').lstrip().startswith(NO_TRANSACTION)
+        )
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Splits a script on the semicolons that end a line, dropping chunks made only of comments. Meant for
+    migrations that run outside of a transaction, which should be plain DDL.
+    """
+    statements = []
+    for chunk in re.split(r';[ \t]*(?:--[^\n]*)?$', sql, flags=re.M):
+        if any(line.strip() and not line.strip().startswith('--') for line in chunk.splitlines()):
+            statements.append(chunk.strip())
+
+    return statements
+
+
+class MigrationRunner():
+    """
+    Applies the pending migrations of a directory to a database.
+
+    Args:
+        - engine (Engine): The engine of the database, usually `DBManager.engine`.
+        - logger (Logger): The logger object for logging.
+        - directory (str, optional): Where the migration files are. Defaults to migrations/ at the root of the project.
+
+    Methods:
+        - applied: Returns the checksum of every applied migration, by version.
+        - pending: Returns the migrations not applied yet, after checking the applied ones were not edited.
+        - upgrade: Applies the pending migrations, up to a target version.
+    """
+
+    def __init__(self, engine, logger: Logger, directory: str = MIGRATIONS_DIR):
+        self.engine = engine
+        self.logger = logger
+        self.directory = directory
+
+
+    def _ensure_table(self, connection):
+        connection.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS tsys_migrations (
+                version INTEGER PRIMARY KEY
+                , name VARCHAR(100) NOT NULL
+                , checksum VARCHAR(64) NOT NULL
+                , applied_at TIMESTAMP DEFAULT NOW()
+            )
+            """
+        ))
+
+
+    def applied(self) -> dict[int, str]:
+        with self.engine.begin() as connection:
+            self._ensure_table(connection)
+            rows = connection.execute(text('SELECT version, checksum FROM tsys_migrations ORDER BY version')).all()
+
+        return {version: checksum for version, checksum in rows}
+
+
+    def pending(self) -> List[Migration]:
+        migrations = discover(self.directory)
+        applied = self.applied()
+
+        known = {migration.version: migration for migration in migrations}
+        for version, checksum in applied.items():
+            if version in known and known[version].checksum != checksum: # reason: an edited migration would never run again where it was applied
+                raise MigrationError(f"Migration <{known[version].name}> was changed after it was applied. Add a new migration instead.")
+
+        return [migration for migration in migrations if migration.version not in applied]
+
+
+    def upgrade(self, target: int = None) -> List[Migration]:
+        """
+        Args:
+            - target (int, optional): The last version to be applied. Defaults to the latest one.
+
+        Returns:
+            - List[Migration]: The migrations that were applied, in order.
+        """
+        done = []
+        with self.engine.connect() as lock_connection:
+            lock_connection = lock_connection.execution_options(isolation_level='AUTOCOMMIT') # reason: an idle transaction would hold back CREATE INDEX CONCURRENTLY
+            lock_connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_ID})
+            try:
+                for migration in self.pending(): # reason: listed under the lock, so migrations applied by a concurrent runner are skipped
+                    if target is not None and migration.version > target:
+                        break
+
+                    self._apply(migration)
+                    done.append(migration)
+            finally:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_ID})
+
+        return done
+
+
+    def _apply(self, migration: Migration):
+        with open(migration.path, encoding='utf-8') as file:
+            sql = file.read()
+
+        record = text('INSERT INTO tsys_migrations (version, name, checksum) VALUES (:version, :name, :checksum)')
+        values = {'version': migration.version, 'name': migration.name, 'checksum': migration.checksum}
+
+        self.logger.info(f"Applying migration {migration.version:04d} <{migration.name}>.")
+        if migration.transactional:
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql(sql)
+                connection.execute(record, values)
+        else:
+            with self.engine.connect() as connection:
+                connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+                for statement in split_statements(sql):
+                    connection.exec_driver_sql(statement)
+                connection.execute(record, values)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Applies the migrations of migrations/ to the database configured in the environment.')
+    parser.add_argument('command', choices=['status', 'upgrade'])
+    parser.add_argument('--target', type=int, help='The last version to be applied. Defaults to the latest one.')
+    args = parser.parse_args(argv)
+
+    from src.start import db, logger
+
+    runner = MigrationRunner(db.engine, logger)
+    try:
+        if args.command == 'status':
+            applied = runner.applied()
+            for migration in discover(runner.directory):
+                state = 'applied' if migration.version in applied else 'pending'
+                print(f"{migration.version:04d} {migration.name:<40} {state}")
+        else:
+            done = runner.upgrade(args.target)
+            print(f"{len(done)} migrations applied." if done else "The database is up to date.")
+    except MigrationError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.dispose()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,6 +11,7 @@ REGEX_SHA256 = r'^[a-fA-F0-9]{64}$'
 REGEX_UUID4 = r'^[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-4[a-fA-F0-9]{3}-[89abAB][a-fA-F0-9]{3}-[a-fA-F0-9]{12}$'
 REGEX_NUMBERS = r'^[0-9]+$'
 REGEX_WORDS = r"^[a-zA-Z\s]+$"
+REGEX_TABLE_NAME = r'^[a-z_]+$'
 REGEX_IP = r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
 URL_REGEX = r'^https:\/\/[^\s\/$.?#].[^\s]*$'
 EMAIL_REGEX = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
@@ -19,6 +20,9 @@ EMAIL_REGEX = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
 class TimestampModel(SQLModel):
     created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    version: Optional[int] = Field(default=1)
+    # Note: version is incremented on every DBManager.update/upsert and, when provided by the client,
+    # checked in the WHERE clause of the write (optimistic locking).
     # Note: sqalchemy's .on_conflict_do_update() does not trigger onupdate events 
     # see the post at https://github.com/sqlalchemy/sqlalchemy/discussions/5903#discussioncomment-327672
 
@@ -78,7 +82,7 @@ class TSysKeywords(SQLModel, table=True):
     __tablename__ = 'tsys_keywords'
 
     id_object: int = Field(primary_key=True)
-    reference: str = Field(regex=REGEX_WORDS, primary_key=True)
+    reference: str = Field(regex=REGEX_TABLE_NAME, primary_key=True)
     keyword: str = Field(regex=REGEX_WORDS, primary_key=True)
 
 class TSysNodes(SQLModel, table=True):
@@ -87,7 +91,7 @@ class TSysNodes(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     id_object: int = Field()
-    reference: str = Field(regex=REGEX_WORDS)
+    reference: str = Field(regex=REGEX_TABLE_NAME)
     type: str = Field(regex=REGEX_WORDS, default='default')
     uuid: str = Field(regex=REGEX_UUID4)
     layer: int = Field(default=1)
@@ -100,11 +104,24 @@ class TSysEdges(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     id_object: int = Field()
-    reference: str = Field(regex=REGEX_WORDS)
+    reference: str = Field(regex=REGEX_TABLE_NAME)
     source_uuid: str = Field(regex=REGEX_UUID4)
     target_uuid: str = Field(regex=REGEX_UUID4)
     type: str = Field(regex=REGEX_WORDS, default='default')
 
+class TSysJobs(TimestampModel, table=True):
+    __tablename__ = 'tsys_jobs'
+
+    id: Optional[str] = Field(default=None, regex=REGEX_UUID4, primary_key=True)
+    name: str = Field()
+    status: str = Field(default='queued', regex=REGEX_WORDS)
+    progress: int = Field(default=0)
+    total: Optional[int] = Field(default=None)
+    status_code: Optional[int] = Field(default=None)
+    message: Optional[str] = Field(default=None)
+    result: Optional[str] = Field(default=None)
+    created_by: Optional[str] = Field(default=None, regex=REGEX_NUMBERS)
+
 
 # TPROD   
 class TProdResources(TimestampModel, UserstampModel, table=True):
@@ -165,6 +182,26 @@ class TProdProducts(TimestampModel, UserstampModel, table=True):
     width: float = Field(default=0.0)
     depth: float = Field(default=0.0)
     id_unit_volume: int = Field(foreign_key='tsys_units.id') 
+
+
+# VIEWS
+class TProdProductsCatalog(SQLModel, table=True): # reason: read-only, refreshed in the background after writes to its sources (see src/views.py)
+    __tablename__ = 'tprod_products_catalog'
+
+    id: int = Field(primary_key=True)
+    id_tag: int
+    tag: Optional[str] = None
+    name: str
+    description: str
+    weight: float
+    id_unit_mass: int
+    name_unit_mass: str
+    height: float
+    width: float
+    depth: float
+    id_unit_volume: int
+    name_unit_volume: str
+    version: int
     
 class TProdRoutes(TimestampModel, UserstampModel, table=True):
     __tablename__ = 'tprod_routes'
@@ -0,0 +1,103 @@
+# This area is meant for talking to the OAuth provider. Every exchange goes through a single async HTTP
+# client per worker, which keeps connections to the provider alive between logins and never blocks the event
+# loop. The provider URLs are configurable, so that tests and load tests can point them to a local stub
+# (see bench/oauth_stub.py) instead of Google.
+from typing import Optional
+
+from src.startup import lazy_import
+
+import asyncio
+import os
+
+httpx = lazy_import('httpx')
+
+
+GOOGLE_AUTH_URL = os.getenv('GOOGLE_AUTH_URL', 'https://accounts.google.com/o/oauth2/auth')
+GOOGLE_TOKEN_URL = os.getenv('GOOGLE_TOKEN_URL', 'https://accounts.google.com/o/oauth2/token')
+GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v1/userinfo')
+
+OAUTH_TIMEOUT = float(os.getenv('OAUTH_TIMEOUT', 10))
+OAUTH_RETRIES = int(os.getenv('OAUTH_RETRIES', 2))
+OAUTH_RETRY_BACKOFF = float(os.getenv('OAUTH_RETRY_BACKOFF', 0.2))
+OAUTH_MAX_CONNECTIONS = int(os.getenv('OAUTH_MAX_CONNECTIONS', 20))
+
+
+class OAuthClient():
+    """
+    An OAuth client on top of a shared `httpx.AsyncClient`, built on first use.
+
+    Connection failures are retried `retries` times by the transport, for every request, since nothing reached
+    the provider. Reading the user info is idempotent, so it is also retried on timeouts and 5xx responses. The
+    code exchange is not, as authorization codes can only be redeemed once.
+
+    Args:
+        - token_url (str): The token endpoint of the provider.
+        - userinfo_url (str): The user info endpoint of the provider.
+        - timeout (float): Seconds allowed for each request.
+        - retries (int): The amount of retries of failed requests.
+
+    Methods:
+        - exchange_code: Redeems an authorization code for tokens.
+        - userinfo: Retrieves the profile of the user an access token belongs to.
+        - close: Closes the pooled connections.
+    """
+
+    def __init__(self, token_url: str, userinfo_url: str, timeout: float = OAUTH_TIMEOUT, retries: int = OAUTH_RETRIES):
+        self.token_url = token_url
+        self.userinfo_url = userinfo_url
+        self.timeout = timeout
+        self.retries = retries
+        self._client: 'Optional[httpx.AsyncClient]' = None
+
+
+    @property
+    def client(self) -> 'httpx.AsyncClient':
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout
+                , transport=httpx.AsyncHTTPTransport(
+                    retries=self.retries
+                    , limits=httpx.Limits(max_connections=OAUTH_MAX_CONNECTIONS, max_keepalive_connections=OAUTH_MAX_CONNECTIONS)
+                )
+            )
+        return self._client
+
+
+    async def exchange_code(self, data: dict) -> 'httpx.Response':
+        """
+        Args:
+            - data (dict): The form of the token request: code, client credentials, redirect URI and grant type.
+
+        Returns:
+            - httpx.Response: The response of the provider.
+        """
+        return await self.client.post(self.token_url, data=data)
+
+
+    async def userinfo(self, access_token: str) -> 'httpx.Response':
+        """
+        Args:
+            - access_token (str): The access token returned by `exchange_code`.
+
+        Returns:
+            - httpx.Response: The response of the provider.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.get(self.userinfo_url, headers={'Authorization': f'Bearer {access_token}'})
+                if response.status_code < 500 or attempt == self.retries:
+                    return response
+            except httpx.TimeoutException:
+                if attempt == self.retries:
+                    raise
+
+            await asyncio.sleep(OAUTH_RETRY_BACKOFF * 2 ** attempt)
+
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+oauth = OAuthClient(GOOGLE_TOKEN_URL, GOOGLE_USERINFO_URL)
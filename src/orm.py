@@ -1,25 +1,40 @@
 from fastapi import status
-from sqlalchemy import create_engine, inspect, select, insert, delete, update, and_, or_
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, inspect, select, insert, delete, update, and_, func, text, Table, Column, MetaData
+from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.dialects.postgresql import insert as postgres_upsert
 from sqlalchemy.exc import IntegrityError, InternalError, OperationalError, ProgrammingError
 from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.sql.selectable import Select
+from sqlalchemy.sql.util import find_tables
 
 from src.schemas import DBOutput, WhereConditions, SuccessMessages
+from src.filters import compile_filters
+from src.metrics import RequestMetrics, current_request, timed, record_query
+from src.startup import lazy_import
 
 from traceback import format_exc
 from collections import namedtuple
-from typing import List, Any
+from functools import lru_cache
+from typing import List, Any, Iterable, Callable
 from logging import Logger
 
-import pandas as pd
+import itertools
+import threading
+import json
+import uuid
+import os
+import time
+import io
+import re
+
+pd = lazy_import('pandas')
 
 
 ErrorObject = namedtuple('ErrorObject', ['status_code', 'client_message', 'logger_message'])
 
 STATUS_MAP = {
     200: status.HTTP_200_OK
+    , 202: status.HTTP_202_ACCEPTED
     , 204: status.HTTP_204_NO_CONTENT
     , 304: status.HTTP_304_NOT_MODIFIED
     , 400: status.HTTP_400_BAD_REQUEST
@@ -27,6 +42,33 @@ STATUS_MAP = {
     , 503: status.HTTP_503_SERVICE_UNAVAILABLE
 }
 
+SLOW_QUERY_PARAMETERS_LENGTH = 500
+REPLICA_POLICIES = ['round_robin', 'least_connections']
+NOTIFY_PAYLOAD_LIMIT = 7000 # reason: PostgreSQL refuses NOTIFY payloads of 8000 bytes or more
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """
+    Reduces a statement to its shape: placeholders become `?`, whitespace is collapsed and parameter lists
+    or multi-row VALUES are folded into a single entry.
+    """
+    statement = re.sub(r'%\(\w+\)s|%s', '?', statement)
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    statement = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(?)', statement)
+    statement = re.sub(r'(VALUES \(\?\))(\s*,\s*\(\?\))+', r'\1', statement)
+    return statement
+
+
+def read_tables(table_cls=None, statement: Select = None) -> set[str]:
+    """
+    Returns the names of the tables read by a table class or a select statement, aliases included.
+    """
+    if statement is not None:
+        return {table.name for table in find_tables(statement, include_aliases=True, include_joins=True) if isinstance(table, Table)}
+
+    return {table_cls.__tablename__} if table_cls is not None else set()
+
+
 class UnchangedStateError(BaseException):
     pass
 
@@ -118,15 +160,29 @@ class DBManager():
         - database (str): The name of the database.
         - schema (str): The schema to be used for the database connection.
         - logger (Logger): The logger object for logging.
+        - slow_query_ms (float, optional): Statements slower than this are logged with their parameters. Defaults to None (disabled).
+        - repeat_threshold (int, optional): Requests that execute the same statement shape more than this amount of times
+        are flagged as possible N+1 patterns. Defaults to None (disabled).
+        - replicas (List[str], optional): Read replicas as `host` or `host:port`, the port defaulting to the primary's. Defaults to None.
+        - replica_policy (str, optional): How a replica is picked for each read, `round_robin` or `least_connections`. Defaults to `round_robin`.
+        - notify_channel (str, optional): When set, every transaction that writes through this manager issues NOTIFYs on this channel,
+        with the table, operation and primary keys of the rows written. They are only delivered if the transaction commits. Defaults to None.
 
     Attributes:
-        - engine: The database engine object.
-        - session: The database session object.
+        - engine: The database engine object, built on first use.
+        - replica_engines: The engines of the read replicas, built on first use.
+        - session: The database session object, scoped to the current thread.
         - logger: The logger object for logging.
 
     Methods:
         - __init__: Initializes the DBManager object.
         - __del__: Closes the session and releases resources when the object is destroyed.
+        - warmup: Opens the connections of the pool ahead of the first requests.
+        - dispose: Closes every pooled connection.
+        - register_commit_hook: Registers a function called with the tables written by every committed transaction.
+        - pool_stats: Returns the state of the connection pool.
+        - read_engine: Returns the engine read-only queries should run on.
+        - log_request_summary: Logs the statements executed by a request and flags repeated statement shapes.
         - _map_dataframe: Maps a dataframe to the specified mapping class.
         - _parse_returnings: Parses the returnings from a database query and returns the result as a pandas DataFrame.
         - _single: Returns the first record from a DataFrame as a namedtuple.
@@ -136,19 +192,292 @@ class DBManager():
         - update: Updates records in the specified table with the given data.
         - delete: Deletes records from the specified table based on the given filters.
         - upsert: Attempts to insert data into the specified table and updates the data if the insert fails due to a unique constraint violation.
+        - copy: Bulk loads dataframes into a staging table through COPY and merges them into the specified table.
         - catching: Decorator that executes a function, commits the session and handles exceptions gracefully.
     """
 
-    def __init__(self, dialect: str, user: str, password: str, address: str, port: str, database: str, schema: str, logger: Logger):
-        self.engine = create_engine(f'{dialect}://{user}:{password}@{address}:{port}/{database}', connect_args={"options": f"-csearch_path={schema}"}, pool_pre_ping=True)
-
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+    def __init__(self, dialect: str, user: str, password: str, address: str, port: str, database: str, schema: str, logger: Logger
+                 , slow_query_ms: float = None, repeat_threshold: int = None, replicas: List[str] = None, replica_policy: str = 'round_robin'
+                 , notify_channel: str = None):
+        if replica_policy not in REPLICA_POLICIES:
+            raise ValueError(f"Replica policy <{replica_policy}> is not supported. Use one of {REPLICA_POLICIES}.")
+        if notify_channel is not None and not re.fullmatch(r'[a-z_][a-z0-9_]*', notify_channel):
+            raise ValueError(f"Notify channel <{notify_channel}> must be a lowercase identifier.")
+
+        self.url = f'{dialect}://{user}:{password}@{address}:{port}/{database}'
+        self.replica_urls = [
+            f'{dialect}://{user}:{password}@{replica if ":" in replica else f"{replica}:{port}"}/{database}'
+            for replica in replicas or []
+        ]
+        self.replica_policy = replica_policy
+        self.connect_args = {"options": f"-csearch_path={schema}"}
+
+        self._engine = None
+        self._replica_engines = None
+        self._replica_counter = itertools.count()
+        self._engine_lock = threading.Lock()
+        self._sessionmaker = sessionmaker()
+        self.session = scoped_session(self._create_session) # reason: background jobs run on worker threads and must not share a session
 
         self.logger = logger
+        self.slow_query_ms = slow_query_ms
+        self.repeat_threshold = repeat_threshold
+        self.notify_channel = notify_channel
+        self.commit_hooks: list[Callable[[set[str]], None]] = []
+
+        event.listen(self._sessionmaker, 'before_commit', self._before_commit)
+        event.listen(self._sessionmaker, 'after_commit', self._after_commit)
+        event.listen(self._sessionmaker, 'after_soft_rollback', self._after_rollback)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+
+    @property
+    def engine(self):
+        """
+        The engine is only built on first use, which keeps the DBAPI and dialect imports out of the import of the app.
+        """
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = self._create_engine(self.url)
+
+        return self._engine
+
+
+    @property
+    def replica_engines(self) -> list:
+        if self._replica_engines is None:
+            with self._engine_lock:
+                if self._replica_engines is None:
+                    self._replica_engines = [self._create_engine(url) for url in self.replica_urls]
+
+        return self._replica_engines
+
+
+    def _create_engine(self, url: str):
+        engine = create_engine(url, connect_args=self.connect_args, pool_pre_ping=True)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        return engine
+
+
+    def _create_session(self):
+        return self._sessionmaker(bind=self.engine)
+
+
+    def _after_fork(self):
+        """
+        Forked workers must not reuse the connections of their parent. The inherited pool is dropped without closing
+        its connections, which still belong to the parent, and the child builds its own engine on first use.
+        """
+        self._engine_lock = threading.Lock()
+        for engine in [self._engine, *(self._replica_engines or [])]:
+            if engine is not None:
+                engine.dispose(close=False)
+        self._engine = None
+        self._replica_engines = None
+        self.session.registry.clear()
+
+
+    def _track_write(self, table_cls):
+        self.session.info.setdefault('written_tables', set()).add(table_cls.__tablename__)
+
+
+    def _track_change(self, table_cls, operation: str, df: 'pd.DataFrame' = None):
+        """
+        Records the primary keys of the rows written by an operation, to be notified on commit. Without `df`, the
+        rows are unknown and subscribers are told to reload the whole table.
+        """
+        if self.notify_channel is None or (df is not None and df.empty):
+            return
+
+        pk_columns = [column.name for column in table_cls.__table__.primary_key]
+        keys = None
+        if df is not None:
+            keys = df[pk_columns[0]].tolist() if len(pk_columns) == 1 else df[pk_columns].values.tolist()
+
+        changes = self.session.info.setdefault('changes', {})
+        entry = changes.setdefault((table_cls.__tablename__, operation), {'primary_key': pk_columns, 'ids': []})
+        if keys is None or entry['ids'] is None:
+            entry['ids'] = None
+        else:
+            entry['ids'].extend(keys)
+
+
+    def _before_commit(self, session):
+        """
+        Issues the NOTIFYs of the changes made by the transaction, inside of it, so that they are delivered
+        if and only if it commits. Changes are split across payloads to fit PostgreSQL's size limit.
+        """
+        changes = session.info.pop('changes', None)
+        if not changes:
+            return
+
+        payloads = []
+        for (table, operation), entry in changes.items():
+            change = {'table': table, 'operation': operation, 'primary_key': entry['primary_key']}
+            if entry['ids'] is None:
+                payloads.append(json.dumps({**change, 'ids': None}, default=str))
+                continue
+
+            ids, size = [], 0
+            for id in entry['ids']:
+                encoded = json.dumps(id, default=str)
+                if ids and size + len(encoded) > NOTIFY_PAYLOAD_LIMIT:
+                    payloads.append(json.dumps({**change, 'ids': ids}, default=str))
+                    ids, size = [], 0
+                ids.append(id)
+                size += len(encoded) + 2
+            payloads.append(json.dumps({**change, 'ids': ids}, default=str))
+
+        for payload in payloads:
+            session.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': self.notify_channel, 'payload': payload})
+
+
+    def _after_commit(self, session):
+        tables = session.info.pop('written_tables', None)
+        if not tables:
+            return
+
+        # reason: replicas may lag behind the commit, so the rest of the request (or of the session, outside of requests) reads from the primary
+        request_metrics = current_request.get()
+        if request_metrics is not None:
+            request_metrics.read_primary = True
+        else:
+            session.info['read_primary'] = True
+
+        for hook in self.commit_hooks:
+            try:
+                hook(tables)
+            except Exception as e: # reason: the transaction is already committed, a failing hook must not turn it into an error
+                self.logger.error(f"Commit hook <{getattr(hook, '__name__', hook)}> failed for tables {sorted(tables)}: {e}")
+
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('written_tables', None)
+        session.info.pop('changes', None)
+
+
+    def register_commit_hook(self, hook: Callable[[set[str]], None]):
+        """
+        Registers a function called with the names of the tables written by every committed transaction.
+        """
+        self.commit_hooks.append(hook)
+
+
+    def warmup(self, connections: int = None):
+        """
+        Opens `connections` connections, the size of the pool by default, on the primary and on every replica, and
+        returns them to the pools. Failures are logged, since the pools recover on their own once the database is reachable.
+        """
+        for engine in [self.engine, *self.replica_engines]:
+            start = time.perf_counter()
+            opened = []
+            try:
+                for _ in range(connections or engine.pool.size()):
+                    opened.append(engine.connect())
+            except OperationalError as e:
+                self.logger.error(f"Could not warm the connection pool of <{engine.url.host}:{engine.url.port}>: {e}")
+            finally:
+                for connection in opened:
+                    connection.close()
+
+            self.logger.info(f"Connection pool of <{engine.url.host}:{engine.url.port}> warmed with {len(opened)} connections in {time.perf_counter() - start:.3f}s.")
+
+
+    def dispose(self):
+        """
+        Closes every pooled connection. The engine is rebuilt on next use.
+        """
+        self.session.remove()
+        with self._engine_lock:
+            for engine in [self._engine, *(self._replica_engines or [])]:
+                if engine is not None:
+                    engine.dispose()
+            self._engine = None
+            self._replica_engines = None
+
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
 
 
-    def _map_dataframe(self, df: pd.DataFrame, mapping_cls: Any):
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        shape = normalize_statement(statement)
+        record_query(elapsed, shape)
+
+        if self.slow_query_ms is not None and elapsed * 1000 >= self.slow_query_ms:
+            parameters = f"{len(parameters)} sets, first: {parameters[0]}" if executemany and parameters else parameters
+            self.logger.warning(f"Slow query ({elapsed * 1000:.1f} ms):\n{shape}\nParameters: {str(parameters)[:SLOW_QUERY_PARAMETERS_LENGTH]}")
+
+
+    def log_request_summary(self, request_metrics: RequestMetrics, route: str):
+        """
+        Logs the statements executed by a request and flags statement shapes executed more than `repeat_threshold`
+        times, which usually means rows are being written or read one at a time.
+
+        Args:
+            - request_metrics (RequestMetrics): The metrics of the finished request.
+            - route (str): The route of the request.
+        """
+        if not request_metrics.statements:
+            return
+
+        if self.repeat_threshold is not None:
+            for shape, (count, elapsed) in request_metrics.statements.items():
+                if count > self.repeat_threshold:
+                    self.logger.warning(f"Possible N+1 in <{route}>: statement executed {count} times ({elapsed * 1000:.1f} ms).\n{shape}")
+
+        self.logger.debug(
+            f"<{route}> executed {request_metrics.queries} statements ({len(request_metrics.statements)} distinct) "
+            f"in {request_metrics.phases['db'] * 1000:.1f} ms."
+        )
+
+
+    def pool_stats(self, engine=None) -> dict[str, int]:
+        """
+        Returns the state of the connection pool of an engine, the primary by default.
+        """
+        engine = engine or self._engine
+        if engine is None:
+            return {'size': 0, 'checked_in': 0, 'checked_out': 0, 'overflow': 0}
+
+        pool = engine.pool
+        return {
+            'size': pool.size()
+            , 'checked_in': pool.checkedin()
+            , 'checked_out': pool.checkedout()
+            , 'overflow': pool.overflow()
+        }
+
+
+    def read_engine(self):
+        """
+        Returns the engine read-only queries should run on: a replica, unless there are none or the current
+        transaction, request or session has written, in which case reads stick to the primary so that they
+        see their own writes.
+        """
+        if not self.replica_urls:
+            return self.engine
+
+        request_metrics = current_request.get()
+        if request_metrics is not None and request_metrics.read_primary:
+            return self.engine
+
+        info = self.session.info
+        if info.get('written_tables') or info.get('read_primary'):
+            return self.engine
+
+        replicas = self.replica_engines
+        if self.replica_policy == 'least_connections':
+            return min(replicas, key=lambda engine: engine.pool.checkedout())
+
+        return replicas[next(self._replica_counter) % len(replicas)]
+
+
+    @timed('pandas')
+    def _map_dataframe(self, df: 'pd.DataFrame', mapping_cls: Any):
         """
         Maps a dataframe to the specified mapping class.
 
@@ -172,6 +501,7 @@ class DBManager():
         return df
     
 
+    @timed('pandas')
     def _parse_returnings(self, returnings: list, mapping_cls: Any = None):
         """
         Parses the returnings from a database query and returns the result as a pandas DataFrame.
@@ -195,7 +525,7 @@ class DBManager():
         return self._map_dataframe(pd.DataFrame(rows_as_dicts), mapping_cls)
    
 
-    def _single(self, table_cls, df: pd.DataFrame):
+    def _single(self, table_cls, df: 'pd.DataFrame'):
         """
         Returns the first record from a DataFrame as a dictionary.
 
@@ -220,37 +550,19 @@ class DBManager():
 
     def _build_conditions(self, table_cls, filters: WhereConditions = None, pks: dict[str, Any] = None):
         """
-        Builds the conditions for a query.
+        Builds the conditions for a query. Filters are compiled once per shape and their values are returned as
+        bound parameters, see `src.filters`.
 
         Args:
             - table_cls (class): The table class to build the conditions for.
             - filters (QueryFilters): The filters to apply to the query.
+            - pks (dict[str, Any], optional): Primary key values that must be matched.
 
         Returns:
-            - List: The list of conditions to be applied to the query.
+            - Tuple[List, dict]: The list of conditions to be applied to the query and the parameters to execute it with.
         """
 
-        conditions = []
-        if filters:
-            if filters.and_:
-                and_conditions = [getattr(table_cls, column).in_(values) for column, values in filters.and_.items()]
-                conditions.append(and_(*and_conditions))
-
-            if filters.or_:
-                or_conditions = [getattr(table_cls, column).in_(values) for column, values in filters.or_.items()]
-                conditions.append(or_(*or_conditions))
-
-            if filters.not_in_:
-                not_conditions = [getattr(table_cls, column).notin_(values) for column, values in filters.not_in_.items()]
-                conditions.append(and_(*not_conditions))
-
-            if filters.like_:
-                like_conditions = [getattr(table_cls, attr).like(val) for attr, values in filters.like_.items() for val in values]
-                conditions.append(or_(*like_conditions))
-
-            if filters.not_like_:
-                not_like_conditions = [getattr(table_cls, attr).notlike(val) for attr, values in filters.not_like_.items() for val in values]
-                conditions.append(and_(*not_like_conditions))
+        conditions, params = compile_filters(table_cls, filters) if filters else ([], {})
 
         if pks:
             pk_conditions = [getattr(table_cls, pk) == value for pk, value in pks.items()]
@@ -261,10 +573,10 @@ class DBManager():
         if created_by:
             conditions.append(and_(created_by != 'system'))
 
-        return conditions
+        return conditions, params
 
 
-    def query(self, table_cls, statement: Select = None, filters: WhereConditions = None, order_by: List[str] = None, single: bool = None):
+    def query(self, table_cls, statement: Select = None, filters: WhereConditions = None, order_by: List[str] = None, single: bool = None, primary: bool = False):
         """
         Executes a database query based on the provided parameters. Accepts either a table class or a select statement. If
         a statement is provided, filters and order_by are ignored.
@@ -275,6 +587,8 @@ class DBManager():
             - filters (dict, optional): The filters to apply to the query. Defaults to None.
             - order_by (List[str], optional): The columns to order the query results by. Defaults to None.
             - single (bool, optional): Whether to return a single result or a DataFrame. Defaults to None.
+            - primary (bool, optional): Whether to read from the primary even if there are replicas, for reads that must
+            reflect every commit, such as those tagged with the table generations. Defaults to False.
 
         Returns:
             - pandas.DataFrame or namedtuple: If single is False, returns a DataFrame containing the updated records.
@@ -286,11 +600,12 @@ class DBManager():
         if table_cls is not None and statement is not None:
             raise ValueError("Either table_cls or statement must be specified, not both.")
 
+        params = {}
         if table_cls:
 
             statement = select(table_cls)
 
-            conditions = self._build_conditions(table_cls, filters) if filters else []
+            conditions, params = self._build_conditions(table_cls, filters) if filters else ([], {})
             if conditions:
                 statement = statement.where(and_(*conditions))
 
@@ -298,7 +613,14 @@ class DBManager():
                 order_by_columns = [getattr(table_cls, column) for column in order_by]
                 statement = statement.order_by(*order_by_columns)
 
-        df = pd.read_sql(statement, self.engine)
+        engine = self.engine if primary else self.read_engine()
+        try:
+            df = pd.read_sql(statement, engine, params=params)
+        except OperationalError as e:
+            if engine is self.engine:
+                raise
+            self.logger.warning(f"Replica <{engine.url.host}:{engine.url.port}> is unreachable, reading from the primary: {e}")
+            df = pd.read_sql(statement, self.engine, params=params)
 
         if 'created_at' in df.columns: df['created_at'] = df['created_at'].astype(str)
         if 'updated_at' in df.columns: df['updated_at'] = df['updated_at'].astype(str)
@@ -323,10 +645,12 @@ class DBManager():
             - If `single` is `True`, a `namedtuple` representing the first updated record.
         """
 
+        self._track_write(table_cls)
         statement = insert(table_cls).values(data_list).returning(table_cls)
 
         returnings = self.session.execute(statement)
         df = self._parse_returnings(returnings, mapping_cls=table_cls)
+        self._track_change(table_cls, 'insert', df)
 
         if single:
             return self._single(table_cls, df)
@@ -336,7 +660,8 @@ class DBManager():
 
     def update(self, table_cls, data_list: List[dict], single: bool = False):
         """
-        Update records in the specified table with the given data.
+        Update records in the specified table with the given data. Rows carrying a `version` are only updated if
+        they are still at that version, otherwise a `StaleDataError` is raised.
 
         Args:
             - table_cls (class): The table class representing the table to update.
@@ -349,9 +674,11 @@ class DBManager():
             - If `single` is `True`, a `namedtuple` representing the first updated record.
         """
         data_list = data_list.copy()
+        self._track_write(table_cls)
 
         inspector = inspect(table_cls)
         pk_columns = [column.name for column in inspector.primary_key]  
+        version_column = getattr(table_cls, 'version', None)
 
         results = []
         for data in data_list:
@@ -362,16 +689,27 @@ class DBManager():
 
             data.pop('created_at', None) # reason: ensure that the created_at column is not updated
             data.pop('created_by', None) # reason: ensure that the created_by column is not updated
+            version = data.pop('version', None)
 
             pks_dct = {pk: data[pk] for pk in pk_columns}
-            conditions = self._build_conditions(table_cls, None, pks_dct)
+            conditions, _ = self._build_conditions(table_cls, None, pks_dct)
+
+            values = data
+            if version_column is not None:
+                values = {**data, 'version': version_column + 1}
+                if version is not None: # reason: optimistic locking, the row must still be at the version the client read
+                    conditions.append(version_column == version)
             
-            statement = update(table_cls).where(*conditions).values(data).returning(table_cls)
+            statement = update(table_cls).where(*conditions).values(values).returning(table_cls)
+
+            returnings = self.session.execute(statement).all()
+            if version is not None and not returnings:
+                raise StaleDataError(f"Row {pks_dct} of <{table_cls.__tablename__}> is no longer at version {version}.")
 
-            returnings = self.session.execute(statement)
             results.extend(returnings)
 
         df = self._parse_returnings(results, mapping_cls=table_cls)
+        self._track_change(table_cls, 'update', df)
 
         if single:
             return self._single(table_cls, df)
@@ -393,11 +731,13 @@ class DBManager():
             - If `single` is `True`, a `namedtuple` representing the first deleted record.
         """
 
-        conditions = self._build_conditions(table_cls, filters) if filters else []                        
+        self._track_write(table_cls)
+        conditions, params = self._build_conditions(table_cls, filters) if filters else ([], {})
         statement = delete(table_cls).where(*conditions).returning(table_cls)
         
-        returnings = self.session.execute(statement)
+        returnings = self.session.execute(statement, params)
         df = self._parse_returnings(returnings, mapping_cls=table_cls)
+        self._track_change(table_cls, 'delete', df)
 
         if single:
             return self._single(table_cls, df)
@@ -408,6 +748,7 @@ class DBManager():
     def upsert(self, table_cls, data_list: List[dict], single: bool = False):
         """
         Attempts to insert data into the specified table, and updates the data if the insert fails because of a unique constraint violation.
+        Rows carrying a `version` are only updated if they are still at that version, otherwise a `StaleDataError` is raised.
 
         Args:
             - table_cls (`class`): The table class to insert data into.
@@ -418,6 +759,8 @@ class DBManager():
             - If `single` is `True`, a `namedtuple` representing the first inserted record.
         """
         data_list = data_list.copy()
+        self._track_write(table_cls)
+        version_column = getattr(table_cls, 'version', None)
 
         results = []
         for data in data_list:
@@ -427,6 +770,7 @@ class DBManager():
                 raise SystemDataError("Cannot add or modify system data.")
             
             data.pop('created_at', None) # reason: ensure that the created_at column is not updated
+            version = data.pop('version', None)
 
             inspector = inspect(table_cls)
             pk_columns = [column.name for column in inspector.primary_key] 
@@ -436,19 +780,30 @@ class DBManager():
                 if data.get(pk) is None:
                     data.pop(pk, None)
             
-            conditions = self._build_conditions(table_cls)
+            conditions, _ = self._build_conditions(table_cls)
+
+            set_ = data
+            if version_column is not None:
+                set_ = {**data, 'version': version_column + 1}
+                if version is not None: # reason: optimistic locking, the row must still be at the version the client read
+                    conditions.append(version_column == version)
+
             statement = postgres_upsert(table_cls).values(data)\
                         .on_conflict_do_update(
                             index_elements=pk_value_list
-                            , set_=data
+                            , set_=set_
                             , where=(and_(*conditions) if conditions else None) # reason: prevent updating system data
                         )\
                         .returning(table_cls)
             
-            returnings = self.session.execute(statement)
+            returnings = self.session.execute(statement).all()
+            if version is not None and not returnings:
+                raise StaleDataError(f"A row of <{table_cls.__tablename__}> is no longer at version {version}.")
+
             results.extend(returnings)
 
         df = self._parse_returnings(results, mapping_cls=table_cls)
+        self._track_change(table_cls, 'upsert', df)
 
         if single:
             return self._single(table_cls, df)
@@ -456,6 +811,71 @@ class DBManager():
         return df
 
 
+    def copy(self, table_cls, chunks: 'Iterable[pd.DataFrame]', columns: List[str]) -> int:
+        """
+        Bulk loads data into the specified table. Chunks are streamed through PostgreSQL's `COPY` into a temporary
+        staging table, which is then merged into the target with a single `INSERT ... SELECT ... ON CONFLICT`. The
+        staging table is dropped on commit or rollback.
+
+        Args:
+            - table_cls (`class`): The table class to load data into.
+            - chunks (`Iterable[pd.DataFrame]`): The data to be loaded. Every chunk must contain exactly `columns`.
+            - columns (`List[str]`): The columns present in the chunks.
+
+        Returns:
+            - `int`: The amount of rows inserted or updated in the target table.
+        """
+        table = table_cls.__table__
+        pk_columns = [column.name for column in table.primary_key]
+
+        staging = Table(
+            f'stg_{table.name}_{uuid.uuid4().hex[:8]}'
+            , MetaData()
+            , *[Column(column.name, column.type) for column in table.columns if column.name in columns]
+            , prefixes=['TEMPORARY']
+            , postgresql_on_commit='DROP'
+        )
+
+        self._track_write(table_cls)
+        connection = self.session.connection()
+        staging.create(connection)
+
+        cursor = connection.connection.cursor()
+        copy_statement = f"COPY {staging.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '')"
+        for chunk in chunks:
+            buffer = io.StringIO()
+            chunk[columns].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(copy_statement, buffer)
+
+        # reason: rows without a serial primary key must draw it from the target's sequence
+        def source_column(name: str):
+            column = table.columns[name]
+            if name in pk_columns and len(pk_columns) == 1 and column.autoincrement in [True, 'auto']:
+                sequence = func.pg_get_serial_sequence(table.name, name)
+                return func.coalesce(staging.c[name], func.nextval(sequence)).label(name)
+            return staging.c[name]
+
+        statement = postgres_upsert(table).from_select(columns, select(*[source_column(name) for name in columns]))
+
+        if all(pk in columns for pk in pk_columns):
+            set_ = {name: statement.excluded[name] for name in columns if name not in [*pk_columns, 'created_at', 'created_by', 'version']}
+            if 'version' in table.columns:
+                set_['version'] = table.c.version + 1
+            created_by = table.columns.get('created_by')
+
+            statement = statement.on_conflict_do_update(
+                index_elements=pk_columns
+                , set_=set_
+                , where=(created_by.is_distinct_from('system') if created_by is not None else None) # reason: prevent updating system data
+            ) if set_ else statement.on_conflict_do_nothing(index_elements=pk_columns)
+
+        result = connection.execute(statement)
+        self._track_change(table_cls, 'upsert') # reason: the merged rows are not returned, subscribers reload the table
+
+        return result.rowcount
+
+
     def catching(self, messages: SuccessMessages = None):
         """
         Decorator that catches specific exceptions and handles them gracefully.
@@ -0,0 +1,287 @@
+# This area is meant for checking that the statements the API runs most are served by indexes. Each statement
+# is explained, and its plan is searched for sequential scans that read a table to find a few rows: scans with
+# a filter, or scans repeated once per row of an outer relation. Scans of whole tables that are read in full,
+# such as the driving table of an unfiltered `/crud/select`, are expected and allowed, as are scans of tables
+# smaller than PLAN_MIN_ROWS, which the planner rightly prefers to read whole. Plans depend on statistics, so
+# the check only means something on a database seeded at a realistic scale (see bench/plans.py).
+#
+# Plans can also flip silently as data grows. `capture_plans` runs the same statements under
+# EXPLAIN (ANALYZE, BUFFERS) and keeps a fingerprint of each plan's shape along with its costs, and
+# `diff_plans` compares a capture with a saved baseline.
+#
+# Usage:
+#   python -m src.plans capture --output plans-baseline.json
+#   python -m src.plans diff --baseline plans-baseline.json     # exits with 1 on regressions
+from sqlalchemy import select, inspect, text
+
+from src.models import TABLE_MAP, TProdRoutes, TSysNodes, TSysEdges, TSysKeywords, TProdResourceSkills, TProdTaskSkills
+from src.queries import QUERY_MAP, INCLUDE_MAP, with_includes
+from src.schemas import WhereConditions
+
+from collections import namedtuple
+from typing import Any, Iterator
+
+import argparse
+import datetime
+import hashlib
+import json
+import sys
+import os
+
+
+PLAN_MIN_ROWS = int(os.getenv('PLAN_MIN_ROWS', 1000))
+PLAN_BASELINE = os.getenv('PLAN_BASELINE', 'plans-baseline.json')
+PLAN_COST_RATIO = float(os.getenv('PLAN_COST_RATIO', 2))
+
+PlanViolation = namedtuple('PlanViolation', ['statement', 'relation', 'reason'])
+
+
+def route_upsert_filters() -> dict[str, tuple[Any, WhereConditions]]:
+    """
+    The filters of `/tprod/routes/upsert` and of the deletes that depend on the lookup indexes, with
+    representative values. Routes looked up by tag are covered by `common_filters`.
+    """
+    return {
+        'routes.by_task': (TProdRoutes, WhereConditions(and_={'id_task': [1]})) # reason: the foreign key check of task deletes
+        , 'nodes.by_object': (TSysNodes, WhereConditions(and_={'id_object': [1], 'reference': ['tprod_producttags']}, not_in_={'id': [1]}))
+        , 'edges.by_object': (TSysEdges, WhereConditions(and_={'id_object': [1], 'reference': ['tprod_producttags']}, not_in_={'id': [1]}))
+        , 'keywords.by_object': (TSysKeywords, WhereConditions(and_={'id_object': [1, 2, 3], 'reference': ['tprod_tasks']}))
+        , 'taskskills.by_skill': (TProdTaskSkills, WhereConditions(and_={'id_skill': [1]}))
+        , 'resourceskills.by_skill': (TProdResourceSkills, WhereConditions(and_={'id_skill': [1]}))
+    }
+
+
+def common_filters() -> dict[str, tuple[Any, WhereConditions]]:
+    """
+    The most common shape of `/crud/select` and `/crud/delete` filters: a lookup by the leading primary key
+    column of each table of TABLE_MAP.
+    """
+    filters = {}
+    for name, query in TABLE_MAP.items():
+        column = inspect(query.cls).primary_key[0].name
+        filters[f'{name}.by_{column}'] = (query.cls, WhereConditions(and_={column: [1]}))
+
+    return filters
+
+
+def plan_statements(db) -> Iterator[tuple[str, Any, dict]]:
+    """
+    Yields the name, statement and parameters of every statement to be checked: each entry of QUERY_MAP, with
+    and without its includes, the route upsert filters and the common filter shapes. Filters are built by
+    `DBManager._build_conditions`, exactly as the API runs them.
+    """
+    for name, query in QUERY_MAP.items():
+        statement = query.statement() if callable(query.statement) else query.statement
+        yield f'select.{name}', statement, {}
+
+        if name in INCLUDE_MAP:
+            yield f'select.{name}.include', with_includes(statement, name, set(INCLUDE_MAP[name])), {}
+
+    for name, (table_cls, filters) in {**route_upsert_filters(), **common_filters()}.items():
+        conditions, params = db._build_conditions(table_cls, filters)
+        yield f'filter.{name}', select(table_cls).where(*conditions), params
+
+
+def explain(connection, statement, params: dict = None, analyze: bool = False) -> dict:
+    """
+    Args:
+        - connection (Connection): Where the statement is explained.
+        - statement (Select): The statement to be explained.
+        - params (dict, optional): Values of the parameters bound by the filters.
+        - analyze (bool, optional): Whether the statement is executed, for actual timings and buffer usage. Defaults to False.
+
+    Returns:
+        - dict: The output of `EXPLAIN (FORMAT JSON)`: the root node under `Plan` and, when analyzed, the `Execution Time`.
+    """
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    compiled = statement.compile(dialect=connection.dialect)
+    result = connection.exec_driver_sql(f'EXPLAIN ({options}) {compiled}', {**compiled.params, **(params or {})}).scalar()
+    plan = json.loads(result) if isinstance(result, str) else result
+
+    return plan[0]
+
+
+def walk(node: dict, repeated: bool = False) -> Iterator[tuple[dict, bool]]:
+    """
+    Yields every node of a plan along with whether it runs once per row of an outer relation.
+    """
+    yield node, repeated
+
+    for child in node.get('Plans', []):
+        relationship = child.get('Parent Relationship')
+        child_repeated = repeated or relationship == 'SubPlan' or (node['Node Type'] == 'Nested Loop' and relationship == 'Inner')
+        yield from walk(child, child_repeated)
+
+
+def verify_plans(db, min_rows: int = PLAN_MIN_ROWS, analyze: bool = True) -> list[PlanViolation]:
+    """
+    Explains every statement of `plan_statements` and reports the sequential scans that an index should have
+    avoided.
+
+    Args:
+        - db (DBManager): The manager of the database to check, on its primary.
+        - min_rows (int, optional): Tables estimated to hold fewer rows may be scanned.
+        - analyze (bool, optional): Whether statistics are refreshed first, e.g. right after seeding. Defaults to True.
+
+    Returns:
+        - list[PlanViolation]: The offending scans, empty if every statement is served by indexes.
+    """
+    violations = []
+    with db.engine.connect() as connection:
+        if analyze:
+            connection.exec_driver_sql('ANALYZE')
+
+        sizes = dict(connection.execute(text("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'm')")).all())
+
+        for name, statement, params in plan_statements(db):
+            for node, repeated in walk(explain(connection, statement, params)['Plan']):
+                if node['Node Type'] != 'Seq Scan' or sizes.get(node['Relation Name'], 0) < min_rows:
+                    continue
+
+                if 'Filter' in node:
+                    violations.append(PlanViolation(name, node['Relation Name'], f"filtered by {node['Filter']}"))
+                elif repeated:
+                    violations.append(PlanViolation(name, node['Relation Name'], 'scanned once per outer row'))
+
+        connection.rollback()
+
+    return violations
+
+
+def shape(node: dict) -> str:
+    """
+    Describes the shape of a plan: its node types, join types, relations and indexes, without costs or row
+    estimates, e.g. `Sort(Hash Join[Inner](Seq Scan on tprod_tasks, Hash(Seq Scan on tsys_units)))`.
+    """
+    label = node['Node Type']
+    if 'Join Type' in node:
+        label += f"[{node['Join Type']}]"
+    if 'Relation Name' in node:
+        label += f" on {node['Relation Name']}"
+    if 'Index Name' in node:
+        label += f" using {node['Index Name']}"
+
+    children = node.get('Plans', [])
+    return f"{label}({', '.join(shape(child) for child in children)})" if children else label
+
+
+def capture_plans(db) -> dict[str, dict]:
+    """
+    Runs every statement of `plan_statements` under EXPLAIN (ANALYZE, BUFFERS), in a transaction that is rolled
+    back, and summarizes each plan.
+
+    Args:
+        - db (DBManager): The manager of the database, on its primary.
+
+    Returns:
+        - dict[str, dict]: By statement, the fingerprint and shape of the plan, its estimated cost and rows, the
+        execution time and the shared buffers hit and read.
+    """
+    plans = {}
+    with db.engine.connect() as connection:
+        for name, statement, params in plan_statements(db):
+            output = explain(connection, statement, params, analyze=True)
+            root = output['Plan']
+            plan_shape = shape(root)
+
+            plans[name] = {
+                'fingerprint': hashlib.sha256(plan_shape.encode('utf-8')).hexdigest()[:16]
+                , 'shape': plan_shape
+                , 'total_cost': root['Total Cost']
+                , 'plan_rows': root['Plan Rows']
+                , 'actual_rows': root.get('Actual Rows')
+                , 'execution_ms': output.get('Execution Time')
+                , 'shared_hit_blocks': root.get('Shared Hit Blocks')
+                , 'shared_read_blocks': root.get('Shared Read Blocks')
+            }
+
+        connection.rollback()
+
+    return plans
+
+
+def diff_plans(baseline: dict[str, dict], current: dict[str, dict], cost_ratio: float = PLAN_COST_RATIO) -> list[dict]:
+    """
+    Compares two captures. A statement regresses when its plan changed shape, or when its estimated cost grew by
+    more than `cost_ratio` times. Execution times are reported but not compared, since they are too noisy.
+
+    Args:
+        - baseline (dict): A capture taken earlier, as returned by `capture_plans`.
+        - current (dict): The capture to be checked.
+        - cost_ratio (float, optional): The cost growth tolerated with the same plan. Defaults to PLAN_COST_RATIO.
+
+    Returns:
+        - list[dict]: One entry per changed statement with the kind of change (plan, cost, new or missing) and
+        both summaries.
+    """
+    changes = []
+    for name in sorted(set(baseline) | set(current)):
+        before, after = baseline.get(name), current.get(name)
+
+        if before is None:
+            change = 'new'
+        elif after is None:
+            change = 'missing'
+        elif before['fingerprint'] != after['fingerprint']:
+            change = 'plan'
+        elif after['total_cost'] > before['total_cost'] * cost_ratio:
+            change = 'cost'
+        else:
+            continue
+
+        changes.append({'statement': name, 'change': change, 'before': before, 'after': after})
+
+    return changes
+
+
+def regressions(changes: list[dict]) -> list[dict]:
+    """
+    Filters the changes that should fail a check. New statements are not regressions.
+    """
+    return [change for change in changes if change['change'] != 'new']
+
+
+def load_baseline(path: str = PLAN_BASELINE) -> dict[str, dict]:
+    with open(path) as file:
+        return json.load(file)['plans']
+
+
+def save_baseline(plans: dict[str, dict], path: str = PLAN_BASELINE):
+    with open(path, 'w') as file:
+        json.dump({'created_at': datetime.datetime.utcnow().isoformat(), 'plans': plans}, file, indent=2)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Captures the plans of the API statements on the database configured in the environment, or diffs them against a baseline.')
+    parser.add_argument('command', choices=['capture', 'diff'])
+    parser.add_argument('--output', default=PLAN_BASELINE, help='Where `capture` writes the plans.')
+    parser.add_argument('--baseline', default=PLAN_BASELINE, help='The capture `diff` compares with.')
+    parser.add_argument('--cost-ratio', type=float, default=PLAN_COST_RATIO)
+    args = parser.parse_args(argv)
+
+    from src.start import db
+
+    try:
+        plans = capture_plans(db)
+    finally:
+        db.dispose()
+
+    if args.command == 'capture':
+        save_baseline(plans, args.output)
+        print(f"{len(plans)} plans written to {args.output}.", file=sys.stderr)
+        return 0
+
+    changes = diff_plans(load_baseline(args.baseline), plans, args.cost_ratio)
+    for change in changes:
+        before, after = change['before'] or {}, change['after'] or {}
+        print(f"{change['statement']:<45} {change['change']:<8} cost {before.get('total_cost')} -> {after.get('total_cost')}", file=sys.stderr)
+        if change['change'] == 'plan':
+            print(f"    before: {before['shape']}\n    after:  {after['shape']}", file=sys.stderr)
+
+    print(f"{len(regressions(changes))} regressions in {len(plans)} plans.", file=sys.stderr)
+
+    return 1 if regressions(changes) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# This area is meant for profiling requests in production. A fraction of the requests (or those carrying
+# the admin token in the X-Profile header) is followed by a sampling profiler, which periodically reads
+# the stack of the thread handling the request. Stacks are stored in the collapsed format understood by
+# flamegraph tools, in a bounded directory that works as a ring buffer.
+from collections import Counter
+from typing import Optional
+
+from src.security import is_admin_token
+
+import threading
+import random
+import time
+import uuid
+import sys
+import os
+import re
+
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('/tmp', 'api_profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+
+ROUTER_FUNCTION = re.compile(r'^[a-z]+__\w+$') # reason: router functions are named <area>__<operation>, e.g. crud__select
+
+
+class Profile():
+    """
+    The samples of a single request.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.started = time.time()
+
+    def name(self) -> Optional[str]:
+        """
+        The most sampled router function of the request, if any.
+        """
+        functions = Counter()
+        for stack, count in self.stacks.items():
+            for frame in stack.split(';'):
+                function = frame.split(' ')[0]
+                if ROUTER_FUNCTION.match(function):
+                    functions[function] += count
+                    break
+
+        return functions.most_common(1)[0][0] if functions else None
+
+
+class SamplingProfiler():
+    """
+    A low-overhead sampling profiler. A single background thread runs while at least one profile is active and,
+    every `interval_ms`, records the stack of each profiled thread.
+
+    Args:
+        - interval_ms (float): The sampling interval.
+        - directory (str): Where profiles are stored.
+        - max_files (int): The amount of profiles kept; the oldest are removed first.
+
+    Methods:
+        - start: Starts profiling a thread.
+        - stop: Stops profiling and stores the result.
+        - list: Lists the stored profiles.
+        - path: Returns the path of a stored profile.
+    """
+
+    def __init__(self, interval_ms: float, directory: str, max_files: int):
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.max_files = max_files
+
+        self.profiles: dict[str, Profile] = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+
+    def _sample(self):
+        while True:
+            with self.lock:
+                if not self.profiles:
+                    self.thread = None
+                    return
+                profiles = list(self.profiles.values())
+
+            frames = sys._current_frames()
+            for profile in profiles:
+                frame = frames.get(profile.thread_id)
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                if stack:
+                    profile.stacks[';'.join(reversed(stack))] += 1
+
+            time.sleep(self.interval)
+
+
+    def start(self, thread_id: int) -> str:
+        """
+        Starts profiling a thread and returns the ID of the profile.
+        """
+        id_profile = uuid.uuid4().hex[:8]
+
+        with self.lock:
+            self.profiles[id_profile] = Profile(thread_id)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+                self.thread.start()
+
+        return id_profile
+
+
+    def stop(self, id_profile: str, fallback_name: str) -> Optional[str]:
+        """
+        Stops a profile and writes its collapsed stacks to disk, named after the router function that was sampled
+        the most. Returns the file name, if anything was sampled.
+        """
+        with self.lock:
+            profile = self.profiles.pop(id_profile, None)
+
+        if not profile or not profile.stacks:
+            return None
+
+        name = profile.name() or fallback_name
+        filename = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime(profile.started))}_{name}_{id_profile}.collapsed"
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, filename), 'w') as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in profile.stacks.items())
+
+        for old in self.list()[self.max_files:]: # reason: keep the directory bounded
+            os.remove(os.path.join(self.directory, old['name']))
+
+        return filename
+
+
+    def list(self) -> list[dict]:
+        """
+        Lists the stored profiles, newest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.collapsed'):
+                stat = entry.stat()
+                entries.append({'name': entry.name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+
+        return sorted(entries, key=lambda entry: entry['name'], reverse=True)
+
+
+    def path(self, name: str) -> Optional[str]:
+        """
+        Returns the path of a stored profile, or None if it does not exist.
+        """
+        if os.path.basename(name) != name or not name.endswith('.collapsed'):
+            return None
+
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+profiler = SamplingProfiler(PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_MAX_FILES)
+
+
+class ProfilingMiddleware():
+    """
+    ASGI middleware that profiles a sample of the requests, plus the ones carrying the admin token in the
+    `X-Profile` header. The thread handling the request is followed, which is where router functions run.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        header = dict(scope['headers']).get(b'x-profile')
+        requested = header is not None and is_admin_token(header.decode('latin-1'))
+
+        if not requested and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return await self.app(scope, receive, send)
+
+        id_profile = profiler.start(threading.get_ident())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            endpoint = scope.get('endpoint')
+            profiler.stop(id_profile, getattr(endpoint, '__name__', 'unmatched'))
@@ -2,16 +2,15 @@
 # reducing backend ammount of work & other reasons. This is not a rule, but a suggestion.
 from collections import namedtuple
 
-from sqlmodel import select, func, literal, case
+from sqlmodel import select, func, literal, case, true
+from sqlalchemy import JSON
 from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from src.models import *
 
 created_by_user = aliased(TSysUsers)
 updated_by_user = aliased(TSysUsers)
 
-unit_mass = aliased(TSysUnits)
-unit_volume = aliased(TSysUnits)
-
 
 # TSYS
 def tsys_units_query(type = None):
@@ -46,6 +45,7 @@ tprod_skills_query = select(
     , TProdSkills.created_at.label('created_at')
     , updated_by_user.name.label('updated_by')
     , TProdSkills.updated_at.label('updated_at')
+    , TProdSkills.version
 ).outerjoin(
     created_by_user,
     TProdSkills.created_by == created_by_user.google_id
@@ -63,6 +63,7 @@ tprod_resources_query = select(
     , TProdResources.created_at.label('created_at')
     , updated_by_user.name.label('updated_by')
     , TProdResources.updated_at.label('updated_at')
+    , TProdResources.version
 ).outerjoin(
     created_by_user
     , TProdResources.created_by == created_by_user.google_id
@@ -86,6 +87,7 @@ tprod_tasks_query = select(
     , TProdTasks.created_at.label('created_at')
     , updated_by_user.name.label('updated_by')
     , TProdTasks.updated_at.label('updated_at')
+    , TProdTasks.version
 ).join(
     TSysUnits
     , TProdTasks.id_unit == TSysUnits.id
@@ -99,35 +101,23 @@ tprod_tasks_query = select(
     TProdTasks.name
 )
 
-tprod_products_query = select(
-    TProdProducts.id
-    , TProdProductTags.id.label('id_tag')
-    , (
-        TProdProductTags.category + \
-        TProdProductTags.registry_counter + \
-        TProdProductTags.subcategory
-    ).label('tag')
-    , TProdProducts.name
-    , TProdProducts.description
-    , TProdProducts.weight
-    , unit_mass.id.label('id_unit_mass')
-    , unit_mass.name.label('name_unit_mass')
-    , TProdProducts.height
-    , TProdProducts.width
-    , TProdProducts.depth
-    , unit_volume.id.label('id_unit_volume')
-    , unit_volume.name.label('name_unit_volume')
-).join(
-    TProdProductTags
-    , TProdProducts.id_tag == TProdProductTags.id
-).join(
-    unit_mass
-    , TProdProducts.id_unit_mass == unit_mass.id
-).join(
-    unit_volume
-    , TProdProducts.id_unit_volume == unit_volume.id
+tprod_products_query = select( # reason: materialized in tprod_products_catalog, see setup.sql
+    TProdProductsCatalog.id
+    , TProdProductsCatalog.id_tag
+    , TProdProductsCatalog.tag
+    , TProdProductsCatalog.name
+    , TProdProductsCatalog.description
+    , TProdProductsCatalog.weight
+    , TProdProductsCatalog.id_unit_mass
+    , TProdProductsCatalog.name_unit_mass
+    , TProdProductsCatalog.height
+    , TProdProductsCatalog.width
+    , TProdProductsCatalog.depth
+    , TProdProductsCatalog.id_unit_volume
+    , TProdProductsCatalog.name_unit_volume
+    , TProdProductsCatalog.version
 ).order_by(
-    TProdProducts.name
+    TProdProductsCatalog.name
 )
 
 
@@ -138,4 +128,67 @@ QUERY_MAP = {
     , 'tprod_resources': ComplexQuery(tprod_resources_query, 'Resources')
     , 'tprod_tasks': ComplexQuery(tprod_tasks_query, 'Tasks')
     , 'tprod_products': ComplexQuery(tprod_products_query, 'Products')
-}
\ No newline at end of file
+}
+
+
+# INCLUDES
+def skills_include(parent_id, link_cls, link_column: str):
+    """
+    Aggregates the skills linked to a parent row into a JSON array of `{id, name}` objects, ordered by name.
+    """
+    return select(
+        func.coalesce(
+            func.json_agg(aggregate_order_by(func.json_build_object('id', TProdSkills.id, 'name', TProdSkills.name), TProdSkills.name))
+            , literal('[]').cast(JSON)
+        ).label('skills')
+    ).join(
+        link_cls
+        , link_cls.id_skill == TProdSkills.id
+    ).where(
+        getattr(link_cls, link_column) == parent_id
+    ).lateral('skills_include')
+
+def keywords_include(parent_id, reference: str):
+    """
+    Aggregates the keywords of a parent row into a JSON array of strings, in alphabetical order.
+    """
+    return select(
+        func.coalesce(
+            func.json_agg(aggregate_order_by(TSysKeywords.keyword, TSysKeywords.keyword))
+            , literal('[]').cast(JSON)
+        ).label('keywords')
+    ).where(
+        TSysKeywords.id_object == parent_id
+        , TSysKeywords.reference == reference
+    ).lateral('keywords_include')
+
+
+INCLUDE_MAP = {
+    'tprod_resources': {
+        'skills': lambda: skills_include(TProdResources.id, TProdResourceSkills, 'id_resource')
+        , 'keywords': lambda: keywords_include(TProdResources.id, 'tprod_resources')
+    }
+    , 'tprod_tasks': {
+        'skills': lambda: skills_include(TProdTasks.id, TProdTaskSkills, 'id_task')
+        , 'keywords': lambda: keywords_include(TProdTasks.id, 'tprod_tasks')
+    }
+}
+
+def with_includes(statement, table_name: str, include: set[str]):
+    """
+    Adds the related rows named in `include` to every row of a statement, each one as a JSON column computed by
+    a lateral subquery. The database aggregates them once per row, in the same round trip as the statement.
+
+    Args:
+        - statement (Select): The statement of the table, as found in QUERY_MAP.
+        - table_name (str): The name of the table, which must be in INCLUDE_MAP.
+        - include (set[str]): The relations to add, e.g. skills and keywords.
+
+    Returns:
+        - Select: The statement with one extra column per relation.
+    """
+    for name in sorted(include):
+        subquery = INCLUDE_MAP[table_name][name]()
+        statement = statement.outerjoin(subquery, true()).add_columns(subquery.c[name])
+
+    return statement
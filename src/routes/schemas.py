@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, conlist, conint
 from typing import Optional, Literal
 
 from fastapi import HTTPException, status
 
+from src.models import REGEX_UUID4
+
+BULK_DELETE_LIMIT = 10000
+
 # TSYS
 class UnitObject(BaseModel):
     name: str
@@ -81,7 +85,7 @@ class NodeObject(BaseModel):
     id_object: Optional[int] = None
     reference: Optional[str] = None
     type: str
-    uuid: str
+    uuid: str = Field(regex=REGEX_UUID4)
     layer: int
     position: dict[str, int]
     ancestors: list
@@ -90,14 +94,14 @@ class EdgeObject(BaseModel):
     id: Optional[int] = None
     id_object: Optional[int] = None
     reference: Optional[str] = None
-    source_uuid: str
-    target_uuid: str
+    source_uuid: str = Field(regex=REGEX_UUID4)
+    target_uuid: str = Field(regex=REGEX_UUID4)
     type: str
 
 class RouteData(BaseModel):
     id_tag: Optional[int] = None
     id_task: int
-    node_uuid: str
+    node_uuid: str = Field(regex=REGEX_UUID4)
 
 class TSysRouteUpsert(BaseModel):
     tag: ProductTagObject
@@ -115,6 +119,7 @@ class TProdSkillUpsert(BaseModel):
     created_at: Optional[str] = None
     updated_by: Optional[str] = None
     updated_at: Optional[str] = None
+    version: Optional[int] = None
 
     @validator('name', 'description')
     def name_must_not_be_empty(cls, value):
@@ -134,6 +139,7 @@ class ResourceObject(BaseModel):
     name: str
     updated_by: Optional[str] = None
     updated_at: Optional[str] = None
+    version: Optional[int] = None
 
     @validator('name')
     def name_must_not_be_empty(cls, value):
@@ -152,6 +158,9 @@ class TProdResourceUpsert(BaseModel):
 class TProdResourceDelete(BaseModel):
     id: int = Field(..., gt=0)
 
+class TProdResourceBulkDelete(BaseModel):
+    id_list: conlist(conint(gt=0), min_items=1, max_items=BULK_DELETE_LIMIT)
+
 
 class TaskObject(BaseModel):
     id: Optional[int] = None
@@ -162,6 +171,7 @@ class TaskObject(BaseModel):
     interruptible: Optional[bool] = False
     updated_by: Optional[str] = None
     updated_at: Optional[str] = None
+    version: Optional[int] = None
 
     @validator('name', 'description', 'duration', 'id_unit', 'interruptible')
     def must_not_be_empty(cls, value):
@@ -180,6 +190,9 @@ class TProdTaskUpsert(BaseModel):
 class TProdTaskDelete(BaseModel):
     id: int = Field(..., gt=0)
 
+class TProdTaskBulkDelete(BaseModel):
+    id_list: conlist(conint(gt=0), min_items=1, max_items=BULK_DELETE_LIMIT)
+
 
 class TProdProductTagCheckAvailability(BaseModel):
     category: str
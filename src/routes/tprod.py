@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 
-from src.start import db
+from src.start import db, jobs
 from src.auth import validate_session
-from src.methods import api_output, append_userstamps, append_timestamps
+from src.methods import api_output, job_output, append_userstamps, append_timestamps
 from src.models import TProdSkills, TProdResources, TProdTasks, TProdResourceSkills, TSysKeywords, TProdTaskSkills, TProdProductTags, TSysNodes, TSysEdges, TProdRoutes
 from src.schemas import DBOutput, SuccessMessages, WhereConditions
 from src.routes.schemas import *
 from src.queries import tprod_skills_query, tprod_resources_query, tprod_tasks_query
+from src.imports import IMPORT_MAP, IMPORT_FORMATS, import_file
+from src.startup import lazy_import
 
+from tempfile import NamedTemporaryFile
+
+import shutil
 import os
 import json
 import datetime
-import pandas as pd
+
+pd = lazy_import('pandas')
 
 
 tprod_router = APIRouter()
@@ -86,10 +93,10 @@ async def upsert_resources(input: TProdResourceUpsert, id_user: str = Depends(va
         id_resource = resource_returning.id
 
         if resource.get('id'): # reason: differs between an UPDATE or INSERT
-            skills_delete_filters = WhereConditions(and_={'id_resource': [resource['id']]}, not_like={'id_skill': id_skill_list})
+            skills_delete_filters = WhereConditions(and_={'id_resource': [resource['id']]}, not_in_={'id_skill': id_skill_list})
             db.delete(TProdResourceSkills, filters=skills_delete_filters)
 
-            keywords_delete_filters = WhereConditions(and_={'id_object': [resource['id']], 'reference': ['tprod_resources']}, not_like={'keyword': keyword_list})
+            keywords_delete_filters = WhereConditions(and_={'id_object': [resource['id']], 'reference': ['tprod_resources']}, not_in_={'keyword': keyword_list})
             db.delete(TSysKeywords, filters=keywords_delete_filters)
 
         db.upsert(TSysKeywords, [{'id_object': id_resource, 'reference': 'tprod_resources', 'keyword': keyword} for keyword in keyword_list]) 
@@ -121,6 +128,28 @@ async def delete_resources(input: TProdResourceDelete):
 
     return tprod__delete_resources(filters)
 
+@tprod_router.delete("/tprod/resources/delete-bulk", dependencies=[Depends(validate_session)])
+async def delete_resources_bulk(input: TProdResourceBulkDelete):
+    """
+    Delete many resources, their skills and their keywords in one transaction and return the IDs of the
+    deleted resources. Each table is cleared with a single `= ANY(...)` statement.
+    """
+
+    id_list = list(set(input.id_list))
+
+    @api_output
+    @db.catching(messages=SuccessMessages('Resources deleted!'))
+    def tprod__delete_resources_bulk(id_list: list[int]) -> DBOutput:
+
+        db.delete(TProdResourceSkills, filters=WhereConditions(and_={'id_resource': id_list}))
+        db.delete(TSysKeywords, filters=WhereConditions(and_={'id_object': id_list, 'reference': ['tprod_resources']}))
+        deleted = db.delete(TProdResources, filters=WhereConditions(and_={'id': id_list}))
+        db.session.commit()
+
+        return deleted[['id']] if not deleted.empty else pd.DataFrame(columns=['id'])
+
+    return tprod__delete_resources_bulk(id_list)
+
 
 # tprod_tasks
 @tprod_router.post("/tprod/tasks/upsert")
@@ -146,10 +175,10 @@ async def upsert_tasks(input: TProdTaskUpsert, id_user: str = Depends(validate_s
         id_task = task_returning.id
 
         if task.get('id'): # reason: differs between an UPDATE or INSERT
-            skills_delete_filters = WhereConditions(and_={'id_task': [task['id']]}, not_like={'id_skill': id_skill_list})
+            skills_delete_filters = WhereConditions(and_={'id_task': [task['id']]}, not_in_={'id_skill': id_skill_list})
             db.delete(TProdTaskSkills, filters=skills_delete_filters)
 
-            keywords_delete_filters = WhereConditions(and_={'id_object': [task['id']], 'reference': ['tprod_tasks']}, not_like={'keyword': keyword_list})
+            keywords_delete_filters = WhereConditions(and_={'id_object': [task['id']], 'reference': ['tprod_tasks']}, not_in_={'keyword': keyword_list})
             db.delete(TSysKeywords, filters=keywords_delete_filters)
 
         db.upsert(TSysKeywords, [{'id_object': id_task, 'reference': 'tprod_tasks', 'keyword': keyword} for keyword in keyword_list])
@@ -181,6 +210,28 @@ async def delete_tasks(input: TProdTaskDelete):
 
     return tprod__delete_tasks(filters)
 
+@tprod_router.delete("/tprod/tasks/delete-bulk", dependencies=[Depends(validate_session)])
+async def delete_tasks_bulk(input: TProdTaskBulkDelete):
+    """
+    Delete many tasks, their skills and their keywords in one transaction and return the IDs of the
+    deleted tasks. Each table is cleared with a single `= ANY(...)` statement.
+    """
+
+    id_list = list(set(input.id_list))
+
+    @api_output
+    @db.catching(messages=SuccessMessages('Tasks deleted!'))
+    def tprod__delete_tasks_bulk(id_list: list[int]) -> DBOutput:
+
+        db.delete(TProdTaskSkills, filters=WhereConditions(and_={'id_task': id_list}))
+        db.delete(TSysKeywords, filters=WhereConditions(and_={'id_object': id_list, 'reference': ['tprod_tasks']}))
+        deleted = db.delete(TProdTasks, filters=WhereConditions(and_={'id': id_list}))
+        db.session.commit()
+
+        return deleted[['id']] if not deleted.empty else pd.DataFrame(columns=['id'])
+
+    return tprod__delete_tasks_bulk(id_list)
+
 
 # tprod_producttags
 @tprod_router.post("/tprod/products/tag-check-availability", dependencies=[Depends(validate_session)])
@@ -216,21 +267,23 @@ async def product_tag_check_availability(input: TProdProductTagCheckAvailability
 
 # tprod_routes
 @tprod_router.post("/tprod/routes/upsert")
-async def upsert_routes(input: TSysRouteUpsert, id_user: str = Depends(validate_session)):
+async def upsert_routes(input: TSysRouteUpsert, background: bool = False, id_user: str = Depends(validate_session)):
     """
-    Insert nodes, edges and routes and return the entire table.
+    Insert nodes, edges and routes and return the entire table. Big graphs may be sent to the
+    background with `?background=true`.
     """
     tag = input.tag.dict()
     nodes = [node.dict() for node in input.nodes]
     edges = [edge.dict() for edge in input.edges]
     routes = [route.dict() for route in input.routes_data]
-    
-    @api_output
-    @db.catching(messages=SuccessMessages('Nodes upserted!'))
+
+    messages = SuccessMessages('Nodes upserted!')
+
     def tprod__upsert_routes(tag: dict, nodes: list[dict], edges: list[dict], routes: list[dict]) -> DBOutput:
 
         # Upsert tag, has unique constraint on category and registry_counter
         new_tag = db.upsert(TProdProductTags, data_list=[tag], single=True)
+        jobs.progress(1, 4)
 
         current_timestamp = datetime.datetime.now(datetime.UTC)
         input_uuids = [rt['node_uuid'] for rt in routes]
@@ -303,7 +356,7 @@ async def upsert_routes(input: TSysRouteUpsert, id_user: str = Depends(validate_
                 'id_object': [new_tag.id]
                 , 'reference': [node['reference'] for node in nodes]
             }
-            , not_like_={
+            , not_in_={
                 'id': [nd['id'] for nd in nodes if nd.get('id')]
             }
         )
@@ -320,12 +373,15 @@ async def upsert_routes(input: TSysRouteUpsert, id_user: str = Depends(validate_
         db.delete(TProdRoutes, filters=delete_routes)
         db.delete(TSysNodes, filters=delete_nodes)
         db.delete(TSysEdges, filters=delete_edges)
+        jobs.progress(2, 4)
 
         # Upsert nodes, edges and routes
         db.upsert(TProdRoutes, routes)
 
         new_nodes = db.upsert(TSysNodes, nodes)
+        jobs.progress(3, 4)
         new_edges = db.upsert(TSysEdges, edges)
+        jobs.progress(4, 4)
 
         # Parse json fields
         new_nodes['position'] = new_nodes['position'].apply(json.loads)
@@ -337,4 +393,55 @@ async def upsert_routes(input: TSysRouteUpsert, id_user: str = Depends(validate_
             , 'tsys_edges': new_edges
         }
 
-    return tprod__upsert_routes(tag, nodes, edges, routes)
\ No newline at end of file
+    if background:
+        id_job = jobs.submit('tprod__upsert_routes', tprod__upsert_routes, tag, nodes, edges, routes, id_user=id_user, messages=messages)
+        return job_output(id_job)
+
+    return api_output(db.catching(messages=messages)(tprod__upsert_routes))(tag, nodes, edges, routes)
+
+
+# imports
+@tprod_router.post("/tprod/import/{table_name}")
+async def import_table(table_name: str, file: UploadFile, dry_run: bool = False, background: bool = False, id_user: str = Depends(validate_session)):
+    """
+    Import a CSV or Parquet file into a production table. Every row is validated against the table's
+    model and all invalid rows are reported at once. With `?dry_run=true` the load is rolled back.
+    """
+
+    table_cls = IMPORT_MAP.get(table_name)
+    if not table_cls:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Imports are not allowed on table <{table_name}>.',
+        )
+
+    format = os.path.splitext(file.filename or '')[1].lstrip('.').lower()
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'File format must be one of the following: {", ".join(IMPORT_FORMATS)}.',
+        )
+
+    def save_upload() -> str:
+        with NamedTemporaryFile(delete=False, suffix=f'.{format}') as tmp:
+            shutil.copyfileobj(file.file, tmp)
+        return tmp.name
+
+    path = await run_in_threadpool(save_upload) # reason: the upload must outlive the request when sent to the background
+
+    messages = SuccessMessages(
+        client='Import finished.'
+        , logger=f"Import in <{table_name}> was successful. File: {file.filename}"
+    )
+
+    def tprod__import_table(table_cls, path: str, format: str, id_user: str, dry_run: bool) -> DBOutput:
+        try:
+            return import_file(table_cls, path, format, id_user, dry_run)
+        finally:
+            os.remove(path)
+
+    if background:
+        id_job = jobs.submit('tprod__import_table', tprod__import_table, table_cls, path, format, id_user, dry_run, id_user=id_user, messages=messages)
+        return job_output(id_job)
+
+    return api_output(db.catching(messages=messages)(tprod__import_table))(table_cls, path, format, id_user, dry_run)
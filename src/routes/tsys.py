@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
 from src.start import db
 from src.auth import validate_session
-from src.methods import api_output, append_userstamps, append_timestamps
-from src.models import TSysUsers, TSysUnits, TSysCategories, TSysNodes, TSysEdges, TProdRoutes
+from src.methods import api_output, conditional_output, append_userstamps, append_timestamps
+from src.models import TSysUsers, TSysUnits, TSysCategories, TSysNodes, TSysEdges, TProdRoutes, TSysJobs
 from src.schemas import DBOutput, SuccessMessages, WhereConditions
 from src.routes.schemas import *
 from src.queries import tsys_units_query
+from src.cache import query_cache
 
 from collections import namedtuple
 
+import asyncio
+import json
 import os
 
 
@@ -18,25 +23,27 @@ tsys_router = APIRouter()
 
 
 SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+JOB_STREAM_INTERVAL = float(os.getenv('JOB_STREAM_INTERVAL', 1.0))
 
 # tsys_users
 @tsys_router.get("/tsys/users/me")
-async def get_user(id_user: str = Depends(validate_session)):
+async def get_user(id_user: str = Depends(validate_session), if_none_match: str = Header(None)):
     """
-    Retrieve non-sensitive user information.
+    Retrieve non-sensitive user information. Answers 304 to a matching `If-None-Match`.
     """
 
     @api_output
     @db.catching(messages=SuccessMessages('User retrieved!'))
     def tsys__get_user(id_user: str) -> DBOutput:
         filters = WhereConditions(and_={'google_id': [id_user]})
-        user = db.query(TSysUsers, filters=filters, single=True)
+        user = db.query(TSysUsers, filters=filters, single=True, primary=query_cache.etags)
 
         FilteredUser = namedtuple('FilteredUser', ['name', 'picture'])
 
         return FilteredUser(user.name, user.google_picture_url)
 
-    return tsys__get_user(id_user)
+    etag = query_cache.etag(['tsys_users', id_user], [TSysUsers.__tablename__])
+    return conditional_output(etag, if_none_match, lambda: tsys__get_user(id_user))
 
 
 # tsys_units
@@ -119,9 +126,60 @@ async def update_category(input: TSysCategoriesChangeStatus, id_user: str = Depe
     @db.catching(messages=SuccessMessages('Category status changed!'))
     def tsys__update_category(data: dict, filters: WhereConditions) -> DBOutput:
             
-            db.update(TSysCategories, data, filters=filters)
+            db.update(TSysCategories, [data])
             db.session.commit()
     
             return db.query(TSysCategories)
     
-    return tsys__update_category(data, filters)
\ No newline at end of file
+    return tsys__update_category(data, filters)
+
+
+# tsys_jobs
+@tsys_router.get("/tsys/jobs/{id_job}")
+async def get_job(id_job: str, id_user: str = Depends(validate_session)):
+    """
+    Retrieve the status and progress of a background job.
+    """
+
+    filters = WhereConditions(and_={'id': [id_job], 'created_by': [id_user]})
+
+    @api_output
+    @db.catching(messages=SuccessMessages('Job retrieved!'))
+    def tsys__get_job(filters: WhereConditions) -> DBOutput:
+        job = db.query(TSysJobs, filters=filters, single=True, primary=True) # reason: jobs are written outside of the session, so reads do not stick to the primary after them
+
+        if not job:
+            raise KeyError(f"Job <{id_job}> could not be found.")
+
+        return job
+
+    return tsys__get_job(filters)
+
+@tsys_router.get("/tsys/jobs/{id_job}/stream")
+async def stream_job(id_job: str, id_user: str = Depends(validate_session)):
+    """
+    Stream the status and progress of a background job as server-sent events. The stream
+    ends once the job is finished or failed.
+    """
+
+    filters = WhereConditions(and_={'id': [id_job], 'created_by': [id_user]})
+
+    async def tsys__stream_job(filters: WhereConditions):
+        previous = None
+        while True:
+            job = await run_in_threadpool(db.query, TSysJobs, filters=filters, single=True, primary=True)
+            if not job:
+                yield f"event: error\ndata: {json.dumps({'message': 'Job not found.'})}\n\n"
+                return
+
+            current = json.dumps(job._asdict(), default=str)
+            if current != previous:
+                yield f"data: {current}\n\n"
+                previous = current
+
+            if job.status in ['finished', 'failed']:
+                return
+
+            await asyncio.sleep(JOB_STREAM_INTERVAL)
+
+    return StreamingResponse(tsys__stream_job(filters), media_type='text/event-stream')
@@ -1,9 +1,16 @@
-from pydantic import BaseModel, validator
-from typing import List, Any, Optional, Literal
+from pydantic import BaseModel, Field, validator, conlist
+from typing import List, Any, Optional, Literal, Union, Annotated
+
+from src.metrics import timed
+from src.startup import lazy_import
 
-import pandas as pd
 import json
 
+pd = lazy_import('pandas')
+
+
+BATCH_OPERATIONS_LIMIT = 100
+
 
 class ForbiddenOperationError(Exception):
     pass
@@ -20,6 +27,7 @@ class WhereConditions(BaseModel):
     def __iter__(self):
         yield self.or_
         yield self.and_
+        yield self.not_in_
         yield self.like_
         yield self.not_like_
 
@@ -62,6 +70,7 @@ class CRUDInsertInput(TableNames):
 class CRUDSelectInput(TableNames):
     filters: Optional[WhereConditions] = WhereConditions()
     lambda_kwargs: Optional[dict[str, Any]] = {}
+    include: set[Literal['skills', 'keywords']] = set()
 
 class CRUDUpdateInput(TableNames):
     data: dict
@@ -82,12 +91,29 @@ class CRUDDeleteInput(TableNames):
         return val
 
 
+class CRUDBatchInsert(CRUDInsertInput):
+    operation: Literal['insert']
+
+class CRUDBatchUpdate(CRUDUpdateInput):
+    operation: Literal['update']
+
+class CRUDBatchDelete(CRUDDeleteInput):
+    operation: Literal['delete']
+
+class CRUDBatchInput(BaseModel):
+    operations: conlist(
+        Annotated[Union[CRUDBatchInsert, CRUDBatchUpdate, CRUDBatchDelete], Field(discriminator='operation')]
+        , min_items=1
+        , max_items=BATCH_OPERATIONS_LIMIT
+    )
+
+
 class DBOutput(BaseModel):
     """
     The purpose of this class is to make it easier to understand the layers of the API.
     """
 
-    data: List[dict] | pd.DataFrame | Any
+    data: Any # reason: a list of dicts, a pd.DataFrame or any other content; left unvalidated
     status: int
     message: str
 
@@ -107,7 +133,7 @@ class APIOutput(BaseModel):
     data: str | dict[str, str]
     message: str
 
-    def __init__(self, data: List[dict] | pd.DataFrame, message: str):
+    def __init__(self, data: 'List[dict] | pd.DataFrame', message: str):
         data = self.to_json(data)
         super().__init__(data=data, message=message)
 
@@ -115,6 +141,7 @@ class APIOutput(BaseModel):
         yield self.data
         yield self.message
 
+    @timed('serialization')
     def to_json(self, data):
         """
         Converts the data content to JSON strings.
@@ -1,12 +1,26 @@
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519, padding
 from cryptography.hazmat.primitives import serialization, hashes
 
+from collections import namedtuple
+from typing import Any
+
+import threading
 import secrets
 import base64
+import glob
+import time
 import jwt
 import os
 
 CURR_DIR = os.path.dirname(os.path.abspath(__file__))
+VAULT_DIR = os.getenv('VAULT_DIR', f'{CURR_DIR}/vault')
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+JWT_KEYS_DIR = os.getenv('JWT_KEYS_DIR', f'{VAULT_DIR}/jwt_keys')
+JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID')
+JWT_ALGORITHMS = ['RS256', 'ES256', 'EdDSA']
+SESSION_LIFETIME = int(os.getenv('SESSION_LIFETIME', 60 * 60 * 24 * 7))
+LEGACY_KID = 'default' # reason: tokens signed before key IDs existed carry no kid and were signed by the vault's key pair
 
 # RSA & hashing
 def generate_rsa_key_pair():
@@ -27,10 +41,10 @@ def generate_rsa_key_pair():
                                         format=serialization.PublicFormat.SubjectPublicKeyInfo)
     
 
-    with open(f'{CURR_DIR}/vault/public_key.pem', 'wb') as public_key_file:
+    with open(f'{VAULT_DIR}/public_key.pem', 'wb') as public_key_file:
         public_key_file.write(public_key_der)
 
-    with open(f'{CURR_DIR}/vault/private_key.pem', 'wb') as private_key_file:
+    with open(f'{VAULT_DIR}/private_key.pem', 'wb') as private_key_file:
         private_key_file.write(private_key_pem)
 
 def hash_plaintext(plaintext) -> bytes:
@@ -86,34 +100,194 @@ def decrypt_rsa_ciphertext(ciphertext, private_key) -> str:
 
 
 # JWT
-def generate_jwt(payload):
+JWTKey = namedtuple('JWTKey', ['kid', 'algorithm', 'private_key', 'public_key'])
+
+
+def key_algorithm(key: Any) -> str:
     """
-    Generates a JWT token using the payload and the secret signature.
+    Returns the JWT algorithm of a private or public key: RS256 for RSA, ES256 for P-256 and EdDSA for Ed25519.
     """
-    ############ DEVELOPMENT ONLY ############
-    with open(f'{CURR_DIR}/vault/jwt_private_key.pem', 'rb') as private_key_file:
-        private_key = serialization.load_pem_private_key(
-            private_key_file.read(),
-            password=None,
-            backend=None,
-        )
-    ############ DEVELOPMENT ONLY ############
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return 'RS256'
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and key.curve.name == 'secp256r1':
+        return 'ES256'
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return 'EdDSA'
+
+    raise ValueError(f"Keys of type <{type(key).__name__}> are not supported. Use RSA, P-256 or Ed25519 keys.")
 
-    return jwt.encode(payload, private_key, algorithm='RS256')
 
-def decode_jwt(cookie):
+def generate_jwt_key(kid: str, algorithm: str = 'EdDSA', directory: str = JWT_KEYS_DIR) -> str:
     """
-    Decodes a JWT token using the secret signature.
+    Generates a signing key and stores it as `<kid>.pem` in the key directory. This method is meant for
+    development only. When in production, store your private keys in a secure location.
+
+    Args:
+        - kid (str): The ID of the key, sent in the header of the tokens it signs.
+        - algorithm (str, optional): One of RS256, ES256 or EdDSA. Defaults to EdDSA.
+        - directory (str, optional): Where the key is stored. Defaults to JWT_KEYS_DIR.
+
+    Returns:
+        - str: The path of the key.
     """
-    ############ DEVELOPMENT ONLY ############
-    with open(f'{CURR_DIR}/vault/jwt_public_key.pem', 'rb') as public_key_file:
-        public_key = serialization.load_der_public_key(
-            public_key_file.read()
-            , backend=None
-        )
-    ############ DEVELOPMENT ONLY ############
+    if algorithm == 'RS256':
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == 'ES256':
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == 'EdDSA':
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Algorithm <{algorithm}> is not supported. Use one of {JWT_ALGORITHMS}.")
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{kid}.pem')
+    with open(path, 'wb') as key_file:
+        key_file.write(private_key.private_bytes(encoding=serialization.Encoding.PEM
+                                                 , format=serialization.PrivateFormat.PKCS8
+                                                 , encryption_algorithm=serialization.NoEncryption()))
+
+    return path
+
+
+class KeyManager():
+    """
+    Keeps every JWT key in memory and picks them by the `kid` header of the tokens. The key directory holds
+    signing keys as `<kid>.pem` and verification-only keys as `<kid>.pub.pem`; the vault's original key pair,
+    if present, is loaded as `default` and verifies tokens without a kid. The algorithm of each key follows from
+    its type, and tokens are only accepted with the algorithm of the key they name.
+
+    Keys are rotated without downtime by first deploying the new key everywhere, then making it the active one
+    (JWT_ACTIVE_KID) and finally removing the old key once the tokens it signed have expired.
+
+    Args:
+        - directory (str): The key directory.
+        - legacy_directory (str): The directory of the original key pair.
+        - active_kid (str, optional): The key that signs new tokens. Defaults to `default` while the original key
+        pair can sign, or else to the only signing key of the key directory. Required when there are several.
+
+    Attributes:
+        - keys: Every key by its kid, read on first use.
+        - active: The key that signs new tokens.
+
+    Methods:
+        - load: Reads the keys from disk, replacing the ones in memory.
+        - sign: Signs a payload with the active key.
+        - verify: Verifies a token with the key it names and returns its payload.
+    """
+
+    def __init__(self, directory: str, legacy_directory: str, active_kid: str = None):
+        self.directory = directory
+        self.legacy_directory = legacy_directory
+        self.active_kid = active_kid
+        self._keys: dict[str, JWTKey] = None
+        self._active: JWTKey = None
+        self._lock = threading.Lock()
+
+
+    def load(self) -> dict[str, JWTKey]:
+        keys = {}
+
+        legacy_private = os.path.join(self.legacy_directory, 'jwt_private_key.pem')
+        legacy_public = os.path.join(self.legacy_directory, 'jwt_public_key.pem')
+        if os.path.isfile(legacy_public):
+            private_key = None
+            if os.path.isfile(legacy_private):
+                with open(legacy_private, 'rb') as key_file:
+                    private_key = serialization.load_pem_private_key(key_file.read(), password=None)
+            with open(legacy_public, 'rb') as key_file:
+                public_key = serialization.load_der_public_key(key_file.read())
+            keys[LEGACY_KID] = JWTKey(LEGACY_KID, key_algorithm(public_key), private_key, public_key)
+
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.pem'))):
+            name = os.path.basename(path)
+            with open(path, 'rb') as key_file:
+                content = key_file.read()
+
+            if name.endswith('.pub.pem'):
+                kid, private_key, public_key = name[:-len('.pub.pem')], None, serialization.load_pem_public_key(content)
+            else:
+                kid, private_key = name[:-len('.pem')], serialization.load_pem_private_key(content, password=None)
+                public_key = private_key.public_key()
+
+            keys[kid] = JWTKey(kid, key_algorithm(public_key), private_key, public_key)
+
+        signing_kids = [kid for kid, key in keys.items() if key.private_key is not None and kid != LEGACY_KID]
+        if self.active_kid:
+            active_kid = self.active_kid
+        elif LEGACY_KID in keys and keys[LEGACY_KID].private_key is not None: # reason: a new key must only sign once every instance can verify it
+            active_kid = LEGACY_KID
+        elif len(signing_kids) > 1:
+            raise ValueError(f"JWT_ACTIVE_KID must name the signing key among {signing_kids}.")
+        else:
+            active_kid = signing_kids[0] if signing_kids else LEGACY_KID
+        if active_kid not in keys or keys[active_kid].private_key is None:
+            raise ValueError(f"No signing key <{active_kid}> was found in {self.directory} or {self.legacy_directory}.")
 
-    return jwt.decode(cookie, public_key, algorithms=['RS256'])
+        with self._lock:
+            self._keys, self._active = keys, keys[active_kid]
+
+        return keys
+
+
+    @property
+    def keys(self) -> dict[str, JWTKey]:
+        if self._keys is None:
+            self.load()
+        return self._keys
+
+
+    @property
+    def active(self) -> JWTKey:
+        if self._keys is None:
+            self.load()
+        return self._active
+
+
+    def sign(self, payload: dict) -> str:
+        key = self.active
+        headers = {'kid': key.kid} if key.kid != LEGACY_KID else None # reason: tokens of the original key stay readable by older instances
+
+        return jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers=headers)
+
+
+    def verify(self, token, require: list[str] = None) -> dict:
+        kid = jwt.get_unverified_header(token).get('kid', LEGACY_KID)
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidKeyError(f"The token was signed by an unknown key <{kid}>.")
+
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm], options={'require': require or []})
+
+
+key_manager = KeyManager(JWT_KEYS_DIR, VAULT_DIR, JWT_ACTIVE_KID)
+
+
+def generate_jwt(payload):
+    """
+    Generates a JWT token using the payload and the active signing key.
+    """
+    return key_manager.sign(payload)
+
+def decode_jwt(cookie, require: list[str] = None):
+    """
+    Decodes a JWT token using the key named by its header. Claims in `require` must be present.
+    """
+    return key_manager.verify(cookie, require)
+
+def session_payload(google_id: str, token: str, user_agent: str, client_ip: str) -> dict:
+    """
+    Builds the claims of a session JWT. `exp` bounds the life of the session without a database lookup and
+    `iat` lets the sessions of a user issued before a forced sign-out be told apart.
+    """
+    now = int(time.time())
+    return {
+        "google_id": google_id
+        , "token": token
+        , "user_agent": user_agent
+        , "client_ip": client_ip
+        , "iat": now
+        , "exp": now + SESSION_LIFETIME
+    }
 
 
 # Methods & exceptions
@@ -122,3 +296,11 @@ def generate_session_token(length=64):
     Generates a random key for general use.
     """
     return secrets.token_hex(length//2)
+
+def is_admin_token(token) -> bool:
+    """
+    Compares a token with the ADMIN_TOKEN environment variable in constant time. Always
+    false when no admin token is configured.
+    """
+    # reason: compare_digest rejects str with non-ASCII characters, which any client can send in a header
+    return bool(ADMIN_TOKEN and token) and secrets.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
@@ -1,4 +1,7 @@
 from src.orm import DBManager
+from src.jobs import JobManager
+from src.cache import query_cache
+from src.views import ViewRefresher, MATERIALIZED_VIEWS
 
 import logging.config
 import dotenv
@@ -37,4 +40,22 @@ port = os.getenv('DB_PORT')
 database = os.getenv('DB_DATABASE')
 schema = os.getenv('DB_NAME')
 
-db = DBManager(type, user, password, host, port, database, schema, logger)
\ No newline at end of file
+slow_query_ms = os.getenv('DB_SLOW_QUERY_MS', 200)
+repeat_threshold = os.getenv('DB_REPEAT_THRESHOLD', 10)
+notify_channel = os.getenv('FEED_CHANNEL', 'lmind_changes')
+replicas = [replica.strip() for replica in os.getenv('DB_REPLICA_HOSTS', '').split(',') if replica.strip()]
+
+db = DBManager(
+    type, user, password, host, port, database, schema, logger
+    , slow_query_ms=float(slow_query_ms) if slow_query_ms else None
+    , repeat_threshold=int(repeat_threshold) if repeat_threshold else None
+    , replicas=replicas
+    , replica_policy=os.getenv('DB_REPLICA_POLICY', 'round_robin')
+    , notify_channel=notify_channel or None
+)
+jobs = JobManager(db, logger, max_workers=int(os.getenv('JOB_WORKERS', 2)))
+views = ViewRefresher(db, logger, MATERIALIZED_VIEWS)
+
+db.register_commit_hook(query_cache.invalidate)
+db.register_commit_hook(views.on_commit)
+views.register_refresh_hook(query_cache.invalidate)
@@ -0,0 +1,94 @@
+# This area is meant for keeping worker boot fast. In the lazy startup mode (STARTUP_MODE=lazy), heavy
+# dependencies are only executed when first used and the database pool is warmed in the background once the
+# app starts, so a fresh worker answers /health right away. The time spent on each startup step is recorded,
+# and `python -m src.startup` prints which packages dominate the import time of the app.
+from contextlib import contextmanager
+from collections import defaultdict
+
+import importlib.util
+import subprocess
+import importlib
+import time
+import sys
+import os
+
+
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'eager')
+LAZY_STARTUP = STARTUP_MODE == 'lazy'
+
+steps: dict[str, float] = {}
+
+
+def lazy_import(name: str):
+    """
+    Imports a module. In the lazy startup mode, the module is only executed when one of its attributes is first
+    accessed, so annotations referencing it must be quoted.
+
+    Args:
+        - name (str): The absolute name of the module.
+
+    Returns:
+        - module: The module, possibly not executed yet.
+    """
+    if name in sys.modules:
+        return sys.modules[name] # reason: importing it again would trigger the execution of a lazy module
+
+    if not LAZY_STARTUP:
+        return importlib.import_module(name)
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
+
+
+@contextmanager
+def step(name: str):
+    """
+    Records the wall time of a startup step.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps[name] = round(time.perf_counter() - start, 4)
+
+
+def import_breakdown(module: str = 'src.main', top: int = 20) -> list[tuple[str, float]]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime` and sums the time spent per top-level package.
+
+    Args:
+        - module (str, optional): The module to be imported.
+        - top (int, optional): The amount of packages to be returned.
+
+    Returns:
+        - list[tuple[str, float]]: The slowest packages and their self time in seconds, slowest first.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True)
+
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+
+    ranking = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [(package, round(us / 1_000_000, 4)) for package, us in ranking]
+
+
+if __name__ == '__main__':
+    module = sys.argv[1] if len(sys.argv) > 1 else 'src.main'
+    breakdown = import_breakdown(module)
+
+    print(f"Import time of <{module}> by package ({STARTUP_MODE} mode):")
+    for package, seconds in breakdown:
+        print(f"{package:<24} {seconds * 1000:>9.1f} ms")
+    print(f"{'total (listed)':<24} {sum(seconds for _, seconds in breakdown) * 1000:>9.1f} ms")
@@ -0,0 +1,179 @@
+# This area is meant for validating bulk payloads against the table models. Instead of building one
+# pydantic model per row, the field rules of each model are compiled once and applied column by column,
+# and every invalid row is reported at once instead of failing on the first one.
+from fastapi import HTTPException, status
+
+from src.startup import lazy_import
+
+from collections import namedtuple, defaultdict
+from functools import lru_cache
+from typing import List, Union
+from datetime import datetime
+
+import re
+
+pd = lazy_import('pandas')
+
+
+FieldRule = namedtuple('FieldRule', ['name', 'kind', 'required', 'nullable', 'pattern', 'default'])
+
+BOOL_STRINGS = {'0', '1', 'true', 'false', 't', 'f', 'yes', 'no', 'y', 'n', 'on', 'off'}
+
+
+@lru_cache(maxsize=None)
+def compile_rules(table_cls) -> tuple[FieldRule, ...]:
+    """
+    Compiles the validation rules of a model. Results are cached per model, so patterns are compiled only once.
+
+    Args:
+        - table_cls (class): The model to be compiled.
+
+    Returns:
+        - tuple[FieldRule]: One rule per field of the model.
+    """
+    rules = []
+    for name, field in table_cls.__fields__.items():
+        type_ = field.type_ if isinstance(field.type_, type) else object
+
+        if issubclass(type_, bool): kind = 'bool'
+        elif issubclass(type_, int): kind = 'int'
+        elif issubclass(type_, float): kind = 'float'
+        elif issubclass(type_, datetime): kind = 'datetime'
+        elif issubclass(type_, str): kind = 'str'
+        else: kind = None
+
+        regex = getattr(field.field_info, 'regex', None) or getattr(type_, 'regex', None)
+        pattern = re.compile(regex) if isinstance(regex, str) else regex
+
+        default = field.default_factory
+        if default is None and field.default is not None:
+            default = lambda value=field.default: value
+
+        rules.append(FieldRule(name, kind, field.required, field.allow_none, pattern, default))
+
+    return tuple(rules)
+
+
+def _invalid_values(rule: FieldRule, values: 'pd.Series') -> 'tuple[pd.Series, str]':
+    """
+    Checks the non-null values of a column against a rule.
+
+    Returns:
+        - tuple[pd.Series, str]: A boolean mask of the invalid values and the error message.
+    """
+    if rule.kind == 'bool':
+        invalid = ~values.astype(str).str.lower().isin(BOOL_STRINGS)
+        return invalid, 'value could not be parsed to a boolean'
+
+    if rule.kind in ['int', 'float']:
+        numbers = pd.to_numeric(values, errors='coerce')
+        invalid = numbers.isna()
+        if rule.kind == 'int':
+            invalid |= (numbers % 1 != 0)
+        return invalid, f'value is not a valid {"integer" if rule.kind == "int" else "float"}'
+
+    if rule.kind == 'datetime':
+        invalid = pd.to_datetime(values, errors='coerce', format='mixed').isna()
+        return invalid, 'invalid datetime format'
+
+    if rule.pattern is not None:
+        match = rule.pattern.match
+        invalid = pd.Series([match(value) is None for value in values.astype(str)], index=values.index)
+        return invalid, f'string does not match regex "{rule.pattern.pattern}"'
+
+    return pd.Series(False, index=values.index), None
+
+
+def validate_frame(table_cls, df: 'pd.DataFrame', offset: int = 0, columns: List[str] = None, present: 'dict[str, pd.Series]' = None) -> list[dict]:
+    """
+    Validates every row of a dataframe against the compiled rules of a model.
+
+    Args:
+        - table_cls (class): The model the rows belong to.
+        - df (pd.DataFrame): The rows to be validated.
+        - offset (int, optional): The position of the first row, used when validating chunks of a larger payload.
+        - columns (List[str], optional): Restricts validation to these fields. Defaults to all fields.
+        - present (dict[str, pd.Series], optional): Per column, a boolean mask of the rows that carried the key. Rows
+        without it are reported as missing if the field is required, and are otherwise left to the field's default
+        instead of being taken for an explicit None. Defaults to every row carrying every column of `df`.
+
+    Returns:
+        - list[dict]: The errors of the invalid rows, one entry per row, ordered by row.
+    """
+    row_errors = defaultdict(list)
+
+    def collect(mask: pd.Series, column: str, message: str):
+        for position in mask.to_numpy().nonzero()[0]:
+            row_errors[int(position)].append({'column': column, 'message': message})
+
+    for rule in compile_rules(table_cls):
+        if columns is not None and rule.name not in columns:
+            continue
+
+        if rule.name not in df.columns:
+            if rule.required:
+                collect(pd.Series(True, index=df.index), rule.name, 'field required')
+            continue
+
+        series = df[rule.name]
+        is_null = series.isna()
+        missing = ~present[rule.name] if present and rule.name in present else pd.Series(False, index=df.index)
+
+        if rule.required:
+            collect(missing, rule.name, 'field required')
+
+        if not rule.nullable:
+            collect(is_null & ~missing, rule.name, 'none is not an allowed value')
+
+        if rule.kind is None and rule.pattern is None:
+            continue
+
+        invalid, message = _invalid_values(rule, series[~is_null])
+        collect(invalid.reindex(df.index, fill_value=False), rule.name, message)
+
+    return [{'row': offset + position + 1, 'errors': row_errors[position]} for position in sorted(row_errors)]
+
+
+def fill_defaults(table_cls, data: List[dict], columns: List[str] = None) -> 'dict[str, pd.Series]':
+    """
+    Fills the keys missing from each row with the default of their field, as pydantic would, so that rows with
+    different keys are validated and written alike. Fields whose default is None are left out, for the database
+    to apply its own.
+
+    Returns:
+        - dict[str, pd.Series]: Per field, a boolean mask of the rows that carry it after filling, see `validate_frame`.
+    """
+    present = {}
+    for rule in compile_rules(table_cls):
+        if columns is not None and rule.name not in columns:
+            continue
+
+        if rule.default is not None:
+            for row in data:
+                if rule.name not in row:
+                    row[rule.name] = rule.default()
+
+        present[rule.name] = pd.Series([rule.name in row for row in data])
+
+    return present
+
+
+def validate_records(table_cls, data: 'Union[List[dict], pd.DataFrame]', columns: List[str] = None):
+    """
+    Validates a bulk payload and raises a single `HTTPException` listing every invalid row. Keys missing from
+    rows given as dictionaries are filled with the defaults of their fields, in place.
+
+    Args:
+        - table_cls (class): The model the rows belong to.
+        - data (List[dict] | pd.DataFrame): The rows to be validated.
+        - columns (List[str], optional): Restricts validation to these fields. Defaults to all fields.
+    """
+    present = fill_defaults(table_cls, data, columns) if not isinstance(data, pd.DataFrame) else None
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    errors = validate_frame(table_cls, df, columns=columns, present=present) if not df.empty else []
+
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={'message': 'Incoming data did not pass validation.', 'errors': errors},
+        )
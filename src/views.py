@@ -0,0 +1,129 @@
+# This area is meant for keeping materialized views in sync with the tables they are built from. Views are
+# declared in setup.sql and in a migration for existing databases (see src/migrations.py), each with a
+# unique index so that it can be refreshed CONCURRENTLY, which means
+# reads are never blocked by a refresh. Commits that write to the source tables of a view schedule a refresh
+# in the background, and writes arriving close together are folded into a single refresh. Until it runs,
+# reads of the view return the previous state.
+from sqlalchemy import text
+
+from logging import Logger
+from typing import Callable
+
+import threading
+import time
+import os
+
+
+VIEW_REFRESH_DEBOUNCE = float(os.getenv('VIEW_REFRESH_DEBOUNCE', 1))
+VIEW_REFRESH_MAX_DELAY = float(os.getenv('VIEW_REFRESH_MAX_DELAY', 10))
+
+MATERIALIZED_VIEWS = {
+    'tprod_products_catalog': {'tprod_products', 'tprod_producttags', 'tsys_units'}
+}
+
+
+class ViewRefresher():
+    """
+    Refreshes materialized views after their source tables are written. A refresh runs `debounce` seconds after
+    the last write to its sources, or `max_delay` seconds after the first one, whichever comes first, so that
+    a steady stream of writes cannot postpone it forever.
+
+    Args:
+        - db (DBManager): The manager whose commits are followed. Refreshes run on its primary.
+        - logger (Logger): The logger object for logging.
+        - views (dict[str, set[str]]): The source tables of each view.
+        - debounce (float, optional): Seconds of quiet after a write before refreshing.
+        - max_delay (float, optional): Seconds after the first pending write by which the refresh runs anyway.
+
+    Methods:
+        - on_commit: Schedules the refresh of the views built from the written tables. Meant as a commit hook.
+        - refresh: Refreshes a view right away.
+        - register_refresh_hook: Registers a function called with the name of every refreshed view.
+        - stop: Cancels the scheduled refreshes and runs them right away.
+    """
+
+    def __init__(self, db, logger: Logger, views: dict[str, set[str]], debounce: float = VIEW_REFRESH_DEBOUNCE, max_delay: float = VIEW_REFRESH_MAX_DELAY):
+        self.db = db
+        self.logger = logger
+        self.views = views
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.refresh_hooks: list[Callable[[set[str]], None]] = []
+
+        self.pending: dict[str, tuple[threading.Timer, float]] = {}
+        self.lock = threading.Lock()
+
+
+    def on_commit(self, tables: set[str]):
+        for view, sources in self.views.items():
+            if sources & tables:
+                self._schedule(view)
+
+
+    def _schedule(self, view: str):
+        with self.lock:
+            now = time.monotonic()
+            timer, first_write = self.pending.get(view, (None, now))
+            if timer is not None:
+                timer.cancel()
+
+            delay = min(self.debounce, max(first_write + self.max_delay - now, 0))
+            timer = threading.Timer(delay, self._run, args=(view,))
+            timer.daemon = True
+            self.pending[view] = (timer, first_write)
+            timer.start()
+
+
+    def _run(self, view: str):
+        with self.lock:
+            self.pending.pop(view, None) # reason: writes committed from now on need another refresh
+
+        try:
+            self.refresh(view)
+        except Exception as e: # reason: the view stays at its previous state until the next write schedules another refresh
+            self.logger.error(f"Refreshing the materialized view <{view}> failed: {e}")
+
+
+    def refresh(self, view: str, concurrently: bool = True):
+        """
+        Args:
+            - view (str): The name of the view, which must be one of `views`.
+            - concurrently (bool, optional): Whether reads may continue during the refresh. Views that were never
+            populated must be refreshed without it. Defaults to True.
+        """
+        if view not in self.views:
+            raise ValueError(f"<{view}> is not a known materialized view.")
+
+        start = time.perf_counter()
+        with self.db.engine.connect() as connection:
+            connection = connection.execution_options(isolation_level='AUTOCOMMIT') # reason: CONCURRENTLY cannot run inside a transaction block
+            connection.execute(text(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view}"))
+
+        self.logger.info(f"Materialized view <{view}> refreshed in {time.perf_counter() - start:.3f}s.")
+
+        for hook in self.refresh_hooks:
+            try:
+                hook({view})
+            except Exception as e:
+                self.logger.error(f"Refresh hook <{getattr(hook, '__name__', hook)}> failed for view <{view}>: {e}")
+
+
+    def register_refresh_hook(self, hook: Callable[[set[str]], None]):
+        """
+        Registers a function called with the name of every refreshed view, e.g. to invalidate cached reads of it.
+        """
+        self.refresh_hooks.append(hook)
+
+
+    def stop(self):
+        with self.lock:
+            pending = list(self.pending)
+            for timer, _ in self.pending.values():
+                timer.cancel()
+            self.pending.clear()
+
+        for view in pending:
+            try:
+                self.refresh(view)
+            except Exception as e:
+                self.logger.error(f"Refreshing the materialized view <{view}> on shutdown failed: {e}")
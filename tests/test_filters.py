@@ -0,0 +1,53 @@
+from sqlalchemy.dialects import postgresql
+
+from src.filters import compile_filters, filter_shape
+from src.schemas import WhereConditions
+from src.models import TSysNodes
+
+import pytest
+
+
+def render(conditions: list) -> list[str]:
+    return [str(condition.compile(dialect=postgresql.dialect())) for condition in conditions]
+
+
+def test_membership_lists_are_bound_as_typed_arrays():
+    conditions, params = compile_filters(TSysNodes, WhereConditions(and_={'id_object': [1, 2]}, not_in_={'id': [3]}))
+
+    assert render(conditions) == [
+        'tsys_nodes.id_object = ANY (%(and__id_object)s::INTEGER[])'
+        , 'tsys_nodes.id != ALL (%(not_in__id)s::INTEGER[])'
+    ]
+    assert params == {'and__id_object': ['1', '2'], 'not_in__id': ['3']}
+
+
+def test_or_and_like_clauses():
+    filters = WhereConditions(or_={'uuid': ['a'], 'reference': ['b']}, like_={'uuid': ['a%', 'b%']}, not_like_={'type': ['x%']})
+    conditions, params = compile_filters(TSysNodes, filters)
+
+    assert render(conditions) == [
+        'tsys_nodes.reference = ANY (%(or__reference)s::VARCHAR[]) OR tsys_nodes.uuid = ANY (%(or__uuid)s::VARCHAR[])'
+        , 'tsys_nodes.uuid LIKE %(like__uuid_0)s OR tsys_nodes.uuid LIKE %(like__uuid_1)s'
+        , 'tsys_nodes.type NOT LIKE %(not_like__type_0)s'
+    ]
+    assert params == {
+        'or__uuid': ['a'], 'or__reference': ['b']
+        , 'like__uuid_0': 'a%', 'like__uuid_1': 'b%'
+        , 'not_like__type_0': 'x%'
+    }
+
+
+def test_shape_ignores_values_and_list_lengths():
+    first = WhereConditions(and_={'id': [1]}, like_={'uuid': ['a%']})
+    second = WhereConditions(and_={'id': [2, 3, 4]}, like_={'uuid': ['b%']})
+
+    assert filter_shape(first) == filter_shape(second)
+    assert filter_shape(first) != filter_shape(WhereConditions(and_={'id': [1]}, like_={'uuid': ['a%', 'b%']}))
+
+
+def test_unknown_columns_are_rejected():
+    with pytest.raises(ValueError, match=r"\['missing'\] do not exist in <tsys_nodes>"):
+        compile_filters(TSysNodes, WhereConditions(and_={'id': [1], 'missing': [1]}))
+
+    with pytest.raises(ValueError, match='do not exist'):
+        compile_filters(TSysNodes, WhereConditions(like_={'missing': ['a%']}))
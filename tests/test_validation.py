@@ -0,0 +1,47 @@
+from fastapi import HTTPException
+
+from src.validation import validate_frame, validate_records
+from src.models import TProdTasks
+
+import pandas as pd
+import pytest
+
+
+def task(**values) -> dict:
+    return {'name': 'Cutting', 'description': 'Cut the sheets', 'id_unit': 1, **values}
+
+
+def test_missing_keys_take_the_field_default():
+    rows = [task(interruptible=True, error_margin=0.1), task()]
+
+    validate_records(TProdTasks, rows)
+
+    assert rows[1]['interruptible'] is False
+    assert rows[1]['error_margin'] == 0.0
+
+
+def test_explicit_nulls_are_rejected():
+    with pytest.raises(HTTPException) as error:
+        validate_records(TProdTasks, [task(), task(error_margin=None)])
+
+    assert error.value.status_code == 400
+    assert error.value.detail['errors'] == [
+        {'row': 2, 'errors': [{'column': 'error_margin', 'message': 'none is not an allowed value'}]}
+    ]
+
+
+def test_missing_required_keys_are_reported_per_row():
+    with pytest.raises(HTTPException) as error:
+        validate_records(TProdTasks, [task(), {'name': 'Cutting', 'description': 'Cut the sheets'}])
+
+    assert error.value.detail['errors'] == [
+        {'row': 2, 'errors': [{'column': 'id_unit', 'message': 'field required'}]}
+    ]
+
+
+def test_frames_without_masks_treat_nan_as_null():
+    df = pd.DataFrame([task(error_margin=0.1), task()])
+
+    errors = validate_frame(TProdTasks, df, offset=10, columns=['error_margin'])
+
+    assert errors == [{'row': 12, 'errors': [{'column': 'error_margin', 'message': 'none is not an allowed value'}]}]